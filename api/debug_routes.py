@@ -0,0 +1,89 @@
+"""
+TechCrossIT Marketplace — Debug Routes
+Token-protected profiling surface. Disabled (404) unless DEBUG_TOKEN is set; every call must
+send X-Debug-Token.
+
+  GET /marketplace/debug/profile?seconds=10        collapsed stacks of every thread
+  GET /marketplace/debug/profiles/{profile_id}     stacks of one profiled submit
+
+Per-request profiling: send `X-Debug-Profile: <DEBUG_TOKEN>` with POST /marketplace/submit.
+The response carries X-Profile-Id and X-Profile-Summary (wall/CPU time and hottest frames).
+"""
+
+import hmac
+import json
+import threading
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from marketplace import profiling
+
+router = APIRouter(prefix="/marketplace/debug", tags=["Debug"])
+
+# Endpoints whose requests may be profiled with X-Debug-Profile.
+PROFILED_PATHS = {"/marketplace/submit"}
+# Finer than the window profiler: one request is short.
+REQUEST_INTERVAL = 0.001
+
+
+def _token_ok(token: Optional[str]) -> bool:
+    return bool(profiling.DEBUG_TOKEN and token) and hmac.compare_digest(token, profiling.DEBUG_TOKEN)
+
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)) -> None:
+    if not profiling.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not _token_ok(x_debug_token):
+        raise HTTPException(status_code=403, detail="Debug token required.")
+
+
+@router.get("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_debug_token)])
+def profile(
+    seconds:     float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(5, ge=1, le=100),
+):
+    """Sample all threads for a window; returns flamegraph-compatible collapsed stacks."""
+    sampler = profiling.profile_window(seconds, interval_ms / 1000)
+    if sampler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running.")
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Summary": json.dumps(sampler.summary())})
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse, dependencies=[Depends(require_debug_token)])
+def kept_profile(profile_id: str):
+    stacks = profiling.get_kept(profile_id)
+    if stacks is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found (only the last {profiling.KEEP_PROFILES} are kept).")
+    return PlainTextResponse(stacks)
+
+
+class RequestProfilerMiddleware:
+    """Profiles one request when it carries a valid X-Debug-Profile header. Pure ASGI."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["path"] not in PROFILED_PATHS or not profiling.DEBUG_TOKEN
+                or not _token_ok(dict(scope["headers"]).get(b"x-debug-profile", b"").decode("latin-1"))):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = profiling.Sampler(REQUEST_INTERVAL, thread_ids=[threading.get_ident()]).start()
+        token = profiling.current_profile.set(sampler)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                sampler.stop()           # the body is already rendered when the response starts
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profiling.keep(sampler).encode()))
+                headers.append((b"x-profile-summary", json.dumps(sampler.summary()).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profiling.current_profile.reset(token)
+            sampler.stop()
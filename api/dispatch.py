@@ -0,0 +1,252 @@
+"""
+TechCrossIT Marketplace — Job Dispatcher
+Routes a validated JobIntake to the right company agent.
+Shared by every endpoint that runs jobs (single submit, pipelines, ...).
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Awaitable, Callable, Optional, Set
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from marketplace import metrics, profiling
+from marketplace.admission import Overloaded, admission
+from marketplace.audit import agent_template_hash, audit, job_record
+from marketplace.capture import capture
+from marketplace.context import JobCancelled, JobContext, run_in_context, running_jobs
+from marketplace.idempotency import idempotency
+from marketplace.llm import MODEL
+from marketplace.ledger import ledger
+from marketplace.lifecycle import drain
+from marketplace.models import JobIntake, JobResult, JobStatus
+from marketplace.registry import get_job_types
+from marketplace.rendering import RENDERED_FORMATS, render_async
+from marketplace.store import get_store
+from marketplace.webhooks import WEBHOOK_SECRET, webhooks
+
+# ── Company agents ──────────────────────────────────────────────────────────
+from companies.dev_shop.agent        import run as run_dev_shop
+from companies.marketing_agency.agent import run as run_marketing
+from companies.sales_team.agent      import run as run_sales
+from companies.finance_office.agent  import run as run_finance
+from companies.support_desk.agent    import run as run_support
+from companies.finance_office.engines import validate_extra as validate_finance_extra
+
+logger = logging.getLogger(__name__)
+
+# ── Dispatcher map ────────────────────────────────────────────────────────
+RUNNERS = {
+    "dev_shop":          run_dev_shop,
+    "marketing_agency":  run_marketing,
+    "sales_team":        run_sales,
+    "finance_office":    run_finance,
+    "support_desk":      run_support,
+}
+
+# Companies that take structured input in JobIntake.extra; raise ValueError when it's invalid.
+EXTRA_VALIDATORS = {
+    "finance_office":    validate_finance_extra,
+}
+
+# Jobs run after their submit has returned (callback_url), referenced until they finish.
+_background: Set[asyncio.Task] = set()
+
+
+def validate_intake(intake: JobIntake) -> None:
+    """
+    Raise 404 for an unknown company, and 422 for a job type it doesn't offer, invalid extra
+    fields, or a callback_url when there is no WEBHOOK_SECRET to sign the callback with.
+    """
+    if intake.company_id not in RUNNERS:
+        raise HTTPException(status_code=404, detail=f"Company '{intake.company_id}' not found.")
+    if intake.callback_url and not WEBHOOK_SECRET:
+        raise HTTPException(status_code=422, detail="callback_url is not available: this server has no "
+                                                    "WEBHOOK_SECRET to sign callbacks with.")
+
+    valid_jobs = get_job_types(intake.company_id)
+    if intake.job_type not in valid_jobs:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Job type '{intake.job_type}' not available for '{intake.company_id}'. "
+                   f"Valid types: {valid_jobs}",
+        )
+
+    validator = EXTRA_VALIDATORS.get(intake.company_id)
+    if validator:
+        try:
+            validator(intake.job_type, intake.extra)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+
+async def _render(result: JobResult, fmt: str) -> None:
+    """Convert the output to the requested format in place; on failure keep the raw output."""
+    try:
+        result.output, cache_hit = await render_async(result.output, fmt, result.company_id)
+        result.metadata["output_format"] = fmt
+        metrics.incr("render_cache_hits" if cache_hit else "renders")
+    except Exception as e:
+        logger.exception("Rendering job %s as %s failed", result.job_id, fmt)
+        result.metadata["render_error"] = str(e)
+
+
+def _timed(fn, marks: dict):
+    """fn, noting in marks["started"] when it starts to run (after waiting for an executor thread)."""
+    @functools.wraps(fn)
+    def run(*args):
+        marks["started"] = time.monotonic()
+        return fn(*args)
+    return run
+
+
+def _cancelled_result(intake: JobIntake, ctx: JobContext, reason: str, started: float) -> JobResult:
+    metrics.incr("jobs_cancelled")
+    metrics.incr(f"jobs_cancelled_{reason}")
+    metrics.incr("cancelled_tokens_used", ctx.tokens_used)
+    metrics.incr("tokens_saved", ctx.tokens_saved)
+    return JobResult(
+        job_id=ctx.job_id,
+        company_id=intake.company_id,
+        job_type=intake.job_type,
+        status=JobStatus.CANCELLED,
+        error=f"Job cancelled: {reason}",
+        duration_ms=int((time.monotonic() - started) * 1000),
+        tokens_used=ctx.tokens_used,
+        metadata={"model": MODEL, "cancel_reason": reason, "tokens_saved": ctx.tokens_saved},
+    )
+
+
+async def dispatch(intake: JobIntake, ctx: Optional[JobContext] = None) -> JobResult:
+    """
+    Run the agent for a validated intake and record the result in job history.
+    Agents block, so they run in the default executor.
+    Refused with 503 while the worker is draining for shutdown or when admission control
+    estimates the job can't finish in time, and with 402 when credit checks are on and the
+    client's cached balance is used up.
+    Pass a JobContext to fix the job id up front, to hear when the job starts (on_start) or
+    receive streamed output, or to cancel the job from outside. A cancelled job (deadline,
+    client disconnect, explicit cancel) returns a CANCELLED result billed only for the tokens
+    actually used. 409 if a job with the same id is already running.
+    """
+    ctx = ctx or JobContext()
+    _admit(intake, ctx)
+    return await _execute(intake, ctx)
+
+
+def dispatch_in_background(intake: JobIntake, ctx: JobContext, idempotency_key: Optional[str] = None,
+                           before_claim: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+    """
+    Admit a job now, refusing it as dispatch would (503 / 402), then run it after the caller
+    has responded. Its result goes to intake.callback_url. With an idempotency key, a repeat
+    of an earlier submission runs (and calls back) only once, and before_claim is checked
+    again just before the key is claimed (see IdempotencyStore.run).
+    """
+    _admit(intake, ctx)
+    task = asyncio.create_task(_run_in_background(intake, ctx, idempotency_key, before_claim))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _run_in_background(intake: JobIntake, ctx: JobContext, idempotency_key: Optional[str],
+                             before_claim: Optional[Callable[[], Awaitable[None]]]) -> None:
+    try:
+        if idempotency_key:
+            _, replayed = await idempotency.run(idempotency_key, intake, lambda: _execute(intake, ctx),
+                                                before_claim=before_claim)
+            if replayed:
+                metrics.incr("jobs_idempotent_replays")
+        else:
+            await _execute(intake, ctx)
+    except Exception as e:
+        # Refused after admission (duplicate job id, idempotency conflict): report it to the callback.
+        logger.warning("Background job %s was not run: %s", ctx.job_id, e)
+        webhooks.enqueue(intake.callback_url, JobResult(
+            job_id=ctx.job_id, company_id=intake.company_id, job_type=intake.job_type,
+            status=JobStatus.FAILED, error=getattr(e, "detail", None) or str(e),
+        ))
+
+
+def _admit(intake: JobIntake, ctx: JobContext) -> None:
+    capture.record(intake, ctx.job_id)       # arrivals, including the ones refused below
+
+    if drain.draining:
+        metrics.incr("jobs_refused_draining")
+        raise HTTPException(status_code=503, detail="Server is restarting — please retry shortly.",
+                            headers={"Retry-After": "5"})
+    if not ledger.has_credit(intake.client_name):
+        metrics.incr("jobs_refused_credit")
+        raise HTTPException(status_code=402, detail=f"No credit remaining for '{intake.client_name or 'Anonymous'}'.")
+
+    try:
+        admission.check(intake)
+    except Overloaded as e:
+        metrics.incr("jobs_refused_overload")
+        raise HTTPException(status_code=503, detail=f"Too busy to finish this job in time: {e}",
+                            headers={"Retry-After": str(e.retry_after)})
+
+
+async def _execute(intake: JobIntake, ctx: JobContext) -> JobResult:
+    runner = RUNNERS[intake.company_id]
+    loop = asyncio.get_running_loop()
+    if ctx.deadline is None:
+        ctx.deadline = time.monotonic() + admission.deadline_for(intake)
+    if not running_jobs.register(ctx):
+        raise HTTPException(status_code=409, detail=f"Job '{ctx.job_id}' is already running.")
+    if ctx.on_start:
+        ctx.on_start()
+
+    metrics.incr("jobs_submitted")
+    started = time.monotonic()
+    marks = {}
+    try:
+        with drain.track(), admission.track(intake):
+            result = await loop.run_in_executor(None, run_in_context, ctx, profiling.follow(_timed(runner, marks)), intake)
+    except JobCancelled as e:
+        result = _cancelled_result(intake, ctx, e.reason, started)
+    finally:
+        running_jobs.unregister(ctx)
+    ran = time.monotonic()
+    if result.status != JobStatus.CANCELLED:
+        metrics.incr("jobs_done" if result.status == JobStatus.DONE else "jobs_failed")
+    if result.status == JobStatus.DONE and result.tokens_used:
+        # Jobs answered without a model call (e.g. reused answers) hold no call slot.
+        admission.observe(intake.company_id, intake.job_type, ctx.call_seconds or time.monotonic() - started)
+
+    if result.status == JobStatus.DONE and result.output and intake.output_format in RENDERED_FORMATS:
+        await _render(result, intake.output_format)
+    rendered = time.monotonic()
+    metrics.incr("tokens_used", result.tokens_used or 0)
+    ledger.record(intake.client_name, result.company_id, result.job_type,
+                  result.metadata.get("model"), result.tokens_used)
+
+    try:
+        # AnyIO's thread pool, not the default executor: a finished job's write mustn't
+        # queue behind other jobs' agents.
+        await run_in_threadpool(get_store().save, result, intake)
+    except Exception:
+        # History is best-effort — never fail a paid job because it couldn't be recorded.
+        logger.exception("Failed to store job %s", result.job_id)
+
+    agent_started, finished = marks.get("started"), time.monotonic()
+    audit.record(job_record(
+        ctx, result.company_id, result.job_type, result.status.value,
+        model=result.metadata.get("model"), template=agent_template_hash(runner.__module__, intake.job_type),
+        client_name=intake.client_name, error=result.error,
+        priority=intake.priority, output_format=intake.output_format,
+        brief_chars=len(intake.brief), output_chars=len(result.output or ""),
+        stages={
+            "queue":  None if agent_started is None else agent_started - started,   # waiting for a thread
+            "agent":  None if agent_started is None else ran - agent_started,
+            "model":  ctx.call_seconds,                                               # summed over calls
+            "render": rendered - ran,
+            "store":  finished - rendered,
+            "total":  finished - started,
+        },
+    ))
+
+    if intake.callback_url:
+        webhooks.enqueue(intake.callback_url, result)
+    return result
@@ -0,0 +1,108 @@
+"""
+TechCrossIT Marketplace — Job History Routes
+Browse and re-read past jobs. Listings are paginated with an opaque cursor.
+Running jobs can be cancelled by id.
+
+A client sees only its own jobs (authenticated by API key, see marketplace.clients); jobs
+without a client can be read by id only. X-Admin-Token = ADMIN_TOKEN sees every job.
+"""
+
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import Response
+
+from marketplace.clients import client_of
+from marketplace.context import running_jobs
+from marketplace.models import JobPage, JobResult, JobStatus
+from marketplace.store import decode_blob, get_store
+
+router = APIRouter(prefix="/marketplace/jobs", tags=["Job History"])
+
+
+def _is_admin(x_admin_token: Optional[str]) -> bool:
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    return bool(admin_token and x_admin_token and
+                hmac.compare_digest(x_admin_token.encode(), admin_token.encode()))
+
+
+def _check_readable(job_id: str, request: Request, x_admin_token: Optional[str]) -> None:
+    """404 — not 403, so ids of other clients' jobs aren't confirmed — unless the caller may read it."""
+    owner = get_store().client_name(job_id)
+    if owner is not None and owner != client_of(request) and not _is_admin(x_admin_token):
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+
+
+@router.get("", response_model=JobPage)
+def list_jobs(
+    request: Request,
+    client_name: Optional[str] = Query(None, description="Admin only; clients always see their own jobs"),
+    company_id:  Optional[str] = None,
+    job_type:    Optional[str] = None,
+    status:      Optional[JobStatus] = None,
+    since:       Optional[float] = Query(None, description="Unix seconds, inclusive"),
+    until:       Optional[float] = Query(None, description="Unix seconds, exclusive"),
+    limit:       int = Query(50, ge=1, le=500),
+    cursor:      Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """List stored jobs, newest first, without their output bodies. (Sync: runs in the threadpool.)"""
+    if not _is_admin(x_admin_token):
+        client_name = client_of(request)
+        if client_name is None:
+            raise HTTPException(status_code=401, detail="An API key (or the admin token) is required to list jobs.")
+    filters = {
+        "client_name": client_name,
+        "company_id":  company_id,
+        "job_type":    job_type,
+        "status":      status.value if status else None,
+        "since":       since,
+        "until":       until,
+    }
+    try:
+        return get_store().list(filters, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{job_id}", response_model=JobResult)
+def get_job(job_id: str, request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Return a stored job including its full output."""
+    _check_readable(job_id, request, x_admin_token)
+    result = get_store().get(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return result
+
+
+@router.get("/{job_id}/output")
+def get_job_output(job_id: str, request: Request, x_admin_token: Optional[str] = Header(None)):
+    """
+    Return just the output body as text. Outputs are stored gzip-compressed, so clients that
+    accept gzip get the stored bytes directly — no decompression or re-compression server-side.
+    """
+    _check_readable(job_id, request, x_admin_token)
+    blob = get_store().get_output_blob(job_id)
+    if blob is None:
+        raise HTTPException(status_code=404, detail=f"No output stored for job '{job_id}'.")
+
+    codec, data = blob
+    headers = {"Vary": "Accept-Encoding"}
+    if codec == "gzip" and "gzip" in request.headers.get("accept-encoding", "").lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=data, media_type="text/plain; charset=utf-8", headers=headers)
+    return Response(content=decode_blob(codec, data), media_type="text/plain; charset=utf-8", headers=headers)
+
+
+@router.delete("/{job_id}", status_code=202)
+def cancel_job(job_id: str):
+    """
+    Cancel a running job on whichever worker runs it. Its upstream call is stopped within
+    about a second, and the job is recorded as cancelled, billed only for tokens used.
+    """
+    if running_jobs.cancel(job_id, "cancel_requested"):
+        return {"job_id": job_id, "status": "cancelling"}
+    if get_store().get(job_id) is not None:
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' has already finished.")
+    raise HTTPException(status_code=404, detail=f"Job '{job_id}' is not running.")
@@ -3,32 +3,33 @@ TechCrossIT Marketplace — FastAPI Routes
 All endpoints consumed by the Lovable.ai frontend.
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
 import asyncio
+import functools
+import os
 import uuid
 from typing import Optional
 
+from marketplace import metrics
+from marketplace.admission import admission
+from marketplace.clients import client_of
+from marketplace.context import JobContext
+from marketplace.idempotency import MAX_KEY_LENGTH, IdempotencyConflict, idempotency
+from marketplace.lifecycle import drain
 from marketplace.models import JobIntake, JobResult, JobStatus, CompanyID
 from marketplace.registry import get_all_cards, get_card, get_job_types
-
-# ── Company agents ──────────────────────────────────────────────────────────
-from companies.dev_shop.agent        import run as run_dev_shop
-from companies.marketing_agency.agent import run as run_marketing
-from companies.sales_team.agent      import run as run_sales
-from companies.finance_office.agent  import run as run_finance
-from companies.support_desk.agent    import run as run_support
+from marketplace.store import get_store
+from marketplace.upstream import pool
+from api.dispatch import RUNNERS, dispatch, dispatch_in_background, validate_intake
 
 router = APIRouter(prefix="/marketplace", tags=["Marketplace"])
 
-# ── Dispatcher map ────────────────────────────────────────────────────────
-RUNNERS = {
-    "dev_shop":          run_dev_shop,
-    "marketing_agency":  run_marketing,
-    "sales_team":        run_sales,
-    "finance_office":    run_finance,
-    "support_desk":      run_support,
-}
+# Client-chosen job ids (X-Job-Id), so a job can be cancelled before its response arrives.
+JOB_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+# How often a running submit checks whether its client has gone away.
+DISCONNECT_POLL_SECONDS = 0.5
 
 
 # ── MARKETPLACE LISTING ─────────────────────────────────────────────────────
@@ -60,31 +61,86 @@ async def list_jobs(company_id: str):
 
 # ── JOB SUBMISSION ───────────────────────────────────────────────────────────
 
+async def _cancel_on_disconnect(request: Request, ctx: JobContext) -> None:
+    # Sleep first: is_disconnected() costs a cancel scope per call, and most jobs that
+    # finish within one interval never need the check.
+    while True:
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+        if ctx.cancelled:
+            return
+        if await request.is_disconnected():
+            ctx.cancel("client_disconnected")
+            return
+
+
+async def _refuse_used_job_id(job_id: Optional[str]) -> None:
+    """409 for a client-chosen id already in job history, so its stored result can't be replaced."""
+    if job_id and await run_in_threadpool(get_store().exists, job_id):
+        raise HTTPException(status_code=409, detail=f"Job id '{job_id}' has already been used.")
+
+
 @router.post("/submit", response_model=JobResult)
-async def submit_job(intake: JobIntake):
+async def submit_job(
+    intake: JobIntake,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=MAX_KEY_LENGTH),
+    job_id: Optional[str] = Header(None, alias="X-Job-Id", pattern=JOB_ID_PATTERN),
+):
     """
     Submit a job to a mini company. Returns the result synchronously.
     For production, consider switching to async queue (Celery / Redis).
+
+    Send an Idempotency-Key header to make retries safe: a repeated key never starts a second
+    generation — it waits for, or replays, the original result (Idempotent-Replayed: true).
+
+    The job is cancelled, and its upstream call stopped, if the client disconnects (unless an
+    Idempotency-Key is set, so a retry can collect the result), when its deadline passes
+    (504), or via DELETE /marketplace/jobs/{id} (409) — send X-Job-Id to know the id up front.
+    An X-Job-Id that is already in job history is refused (409) unless the request replays an
+    earlier one through its Idempotency-Key; ids are never reused.
+
+    With a callback_url the job is accepted (202, {"job_id", "status": "queued"}) once it has
+    passed the checks above, and its JobResult is POSTed to the URL when it finishes.
+
+    The job is billed to the client authenticated by the request's API key (client_name in
+    the body is ignored).
     """
-    runner = RUNNERS.get(intake.company_id)
-    if not runner:
-        raise HTTPException(status_code=404, detail=f"Company '{intake.company_id}' not found.")
-
-    # Validate job type
-    valid_jobs = get_job_types(intake.company_id)
-    if intake.job_type not in valid_jobs:
-        raise HTTPException(
-            status_code=422,
-            detail=f"Job type '{intake.job_type}' not available for '{intake.company_id}'. "
-                   f"Valid types: {valid_jobs}",
-        )
-
-    # Run agent (blocking — wrap in executor for production async)
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, runner, intake)
+    intake.client_name = client_of(request)
+    validate_intake(intake)
+    ctx = JobContext(job_id=job_id or "")
+    refuse_used_job_id = functools.partial(_refuse_used_job_id, job_id)   # before any new execution
+
+    if intake.callback_url:
+        if not (idempotency_key and idempotency.claimed(idempotency_key)):
+            await refuse_used_job_id()
+        dispatch_in_background(intake, ctx, idempotency_key, before_claim=refuse_used_job_id)
+        return JSONResponse(status_code=202, content={"job_id": ctx.job_id, "status": JobStatus.QUEUED.value},
+                            headers={"Location": f"/marketplace/jobs/{ctx.job_id}"})
+
+    if idempotency_key:
+        try:
+            result, replayed = await idempotency.run(idempotency_key, intake, lambda: dispatch(intake, ctx),
+                                                     before_claim=refuse_used_job_id)
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except TimeoutError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if replayed:
+            metrics.incr("jobs_idempotent_replays")
+            response.headers["Idempotent-Replayed"] = "true"
+    else:
+        await refuse_used_job_id()
+        watcher = asyncio.create_task(_cancel_on_disconnect(request, ctx))
+        try:
+            result = await dispatch(intake, ctx)
+        finally:
+            watcher.cancel()
 
     if result.status == JobStatus.FAILED:
         raise HTTPException(status_code=500, detail=result.error)
+    if result.status == JobStatus.CANCELLED:
+        raise HTTPException(status_code=504 if ctx.cancel_reason == "deadline" else 409, detail=result.error)
 
     return result
 
@@ -119,6 +175,15 @@ async def demo_job(company_id: str, job_type: str, brief: Optional[str] = None):
     }
 
 
+# ── RENDERING ASSETS ─────────────────────────────────────────────────────────
+
+@router.get("/render/highlight.css", response_class=PlainTextResponse)
+async def highlight_css():
+    """Stylesheet for syntax-highlighted code in output_format='html' results."""
+    from pygments.formatters import HtmlFormatter
+    return PlainTextResponse(HtmlFormatter().get_style_defs(".highlight"), media_type="text/css")
+
+
 # ── HEALTH ───────────────────────────────────────────────────────────────────
 
 @router.get("/health")
@@ -128,3 +193,19 @@ async def health():
         "companies": list(RUNNERS.keys()),
         "total_job_types": sum(len(get_job_types(c)) for c in RUNNERS),
     }
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Counters summed across all workers, plus this worker's own in-flight state."""
+    return {
+        "counters": metrics.snapshot(),
+        "worker": {"pid": os.getpid(), "in_flight": drain.in_flight, "draining": drain.draining,
+                   "admission": admission.snapshot()},
+    }
+
+
+@router.get("/upstreams")
+async def get_upstreams():
+    """This worker's view of each upstream pool member: state, load, latency and outcome counts."""
+    return {"worker": os.getpid(), "members": pool.stats()}
@@ -0,0 +1,60 @@
+"""
+TechCrossIT Marketplace — Pipeline Routes
+Submit multi-step job DAGs (e.g. prospect_research → cold_outreach_email → followup_sequence)
+in one call, inspect them, and re-run from a failed step.
+"""
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+
+from marketplace.clients import client_of
+from marketplace.models import PipelineRequest, PipelineRun
+from marketplace.pipeline import PipelineError, PipelineRunner, plan
+from api.dispatch import dispatch, validate_intake
+
+router = APIRouter(prefix="/marketplace/pipelines", tags=["Pipelines"])
+
+pipelines = PipelineRunner(dispatch)
+
+
+@router.post("", response_model=PipelineRun)
+async def submit_pipeline(request: PipelineRequest, http_request: Request):
+    """
+    Run a DAG of jobs. Steps without a dependency between them run concurrently.
+    Reference an earlier step's output in a brief or context with {{steps.<id>.output}}.
+    Step failures are reported per step rather than failing the whole request.
+    Every step is billed to the client authenticated by the request's API key.
+    """
+    try:
+        plan(request)
+    except PipelineError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    client_name = client_of(http_request)
+    for step in request.steps:
+        step.intake.client_name = client_name
+        validate_intake(step.intake)
+
+    return await pipelines.submit(request)
+
+
+@router.get("/{pipeline_id}", response_model=PipelineRun)
+async def get_pipeline(pipeline_id: str):
+    """Return the latest state of a recent pipeline run."""
+    run = pipelines.get(pipeline_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Pipeline '{pipeline_id}' not found.")
+    return run
+
+
+@router.post("/{pipeline_id}/rerun", response_model=PipelineRun)
+async def rerun_pipeline(pipeline_id: str, http_request: Request, from_step: Optional[str] = None):
+    """
+    Re-run a pipeline from `from_step` and everything downstream of it.
+    Without `from_step`, every failed or skipped step (and its dependants) is re-run.
+    """
+    try:
+        return await pipelines.rerun(pipeline_id, from_step, client_of(http_request))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Pipeline '{pipeline_id}' not found.")
+    except PipelineError as e:
+        raise HTTPException(status_code=422, detail=str(e))
@@ -0,0 +1,112 @@
+"""
+TechCrossIT Marketplace — Sales Team Bulk Routes
+Enrich a whole CRM export in one request. Rows are batched into shared model calls,
+and the enriched rows stream back while the rest are still being processed.
+"""
+
+import tempfile
+import time
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from marketplace import llm, metrics
+from marketplace.audit import audit, job_record, template_hash
+from marketplace.clients import client_of
+from marketplace.context import JobContext, running_jobs
+from marketplace.ledger import ledger
+from marketplace.lifecycle import drain
+from companies.sales_team.enrichment import (
+    BATCH_PROMPT, ENRICH_MAX_UPLOAD_BYTES, JOB_TYPE, SPOOL_MEMORY_BYTES, SYSTEM_PROMPT,
+    CsvWriter, as_json, enrich, file_chunks, read_csv, read_jsonl,
+)
+
+router = APIRouter(prefix="/marketplace/sales", tags=["Sales Team"])
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+@router.post("/enrich")
+async def enrich_upload(
+    request: Request,
+    input_format:  Optional[Literal["csv", "jsonl"]]  = Query(None, alias="input", description="Default: from Content-Type"),
+    output_format: Optional[Literal["csv", "ndjson"]] = Query(None, alias="output", description="Default: same as the input"),
+    context:       Optional[str] = Query(None, max_length=4000, description="Shared context for every row"),
+):
+    """
+    Bulk crm_enrichment. Send the CSV (with a header row) or JSONL file as the raw request body.
+    Each output row carries the input fields, a `row` number, the enrichment fields and
+    `enrichment_error` (empty when enriched). Rows come back in completion order. The run is
+    billed to the client authenticated by the request's API key. Credit is
+    checked again before each batch's model call; once it runs out, the remaining rows come
+    back with enrichment_error "no credit remaining".
+    The X-Job-Id response header can be used to cancel the run (DELETE /marketplace/jobs/{id}).
+    """
+    if drain.draining:
+        raise HTTPException(status_code=503, detail="Server is restarting — please retry shortly.",
+                            headers={"Retry-After": "5"})
+    client_name = client_of(request)
+    if not ledger.has_credit(client_name):
+        raise HTTPException(status_code=402, detail=f"No credit remaining for '{client_name or 'Anonymous'}'.")
+
+    content_type = request.headers.get("content-type", "")
+    input_format = input_format or ("jsonl" if "json" in content_type else "csv")
+    output_format = output_format or ("csv" if input_format == "csv" else "ndjson")
+
+    started = time.monotonic()
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    try:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > ENRICH_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload is larger than {ENRICH_MAX_UPLOAD_BYTES} bytes.")
+            await run_in_threadpool(spool.write, chunk)
+        if not size:
+            raise HTTPException(status_code=422, detail="Empty upload.")
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+
+    ctx = JobContext()
+    if not running_jobs.register(ctx):
+        spool.close()
+        raise HTTPException(status_code=409, detail=f"Job '{ctx.job_id}' is already running.")
+    metrics.incr("enrich_uploads")
+
+    reader = read_csv if input_format == "csv" else read_jsonl
+    csv_writer = CsvWriter() if output_format == "csv" else None
+    write = csv_writer.write if csv_writer else as_json
+
+    uploaded = time.monotonic()
+
+    async def body():
+        rows, failed, status, error = 0, 0, "cancelled", None     # unless it runs to the end
+        try:
+            with drain.track():
+                async for row in enrich(reader(file_chunks(spool)), ctx, context, client_name):
+                    rows, failed = rows + 1, failed + bool(row.error)
+                    text = write(row)
+                    if text:
+                        yield text
+                if csv_writer:
+                    text = csv_writer.finish()
+                    if text:
+                        yield text
+            status = "cancelled" if ctx.cancelled else "done"
+        except Exception as e:
+            status, error = "failed", str(e)
+            raise
+        finally:
+            running_jobs.unregister(ctx)
+            spool.close()
+            audit.record(job_record(
+                ctx, "sales_team", JOB_TYPE, status, model=llm.MODEL,
+                template=template_hash(SYSTEM_PROMPT, BATCH_PROMPT), client_name=client_name, error=error,
+                upload_bytes=size, rows=rows, rows_failed=failed,
+                stages={"upload": uploaded - started, "model": ctx.call_seconds, "total": time.monotonic() - started},
+            ))
+
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[output_format], headers={"X-Job-Id": ctx.job_id})
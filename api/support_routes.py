@@ -0,0 +1,75 @@
+"""
+TechCrossIT Marketplace — Support Desk Routes
+Upload help-centre documents for The Support Desk to draw on, inspect its retrieval index,
+and check the local triage classifier.
+All routes require X-Admin-Token = ADMIN_TOKEN (the index holds clients' deliverables).
+"""
+
+import hmac
+import os
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+
+from companies.support_desk import triage
+from companies.support_desk.retrieval import knowledge, split_passages
+from marketplace import metrics
+
+router = APIRouter(prefix="/marketplace/support", tags=["Support Desk"])
+
+
+class KBDocument(BaseModel):
+    title: str = Field(..., min_length=1, max_length=300)
+    text:  str = Field(..., min_length=1, max_length=500_000, description="Plain text or markdown; blank lines separate passages")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token or not x_admin_token or \
+            not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+
+@router.post("/kb", status_code=201, dependencies=[Depends(require_admin)])
+async def upload_document(document: KBDocument):
+    """Add a document to the index. Re-uploading identical content returns the existing id."""
+    doc_id, created = await run_in_threadpool(knowledge.add, document.title, document.text)
+    return {"id": doc_id, "created": created, "passages": len(split_passages(document.text))}
+
+
+@router.get("/kb", dependencies=[Depends(require_admin)])
+async def index_stats():
+    """Documents, passages and distinct terms in this worker's index."""
+    return await run_in_threadpool(knowledge.stats)
+
+
+@router.get("/kb/search", dependencies=[Depends(require_admin)])
+async def search(q: str = Query(..., min_length=1), k: int = Query(5, ge=1, le=50),
+                 client_name: Optional[str] = Query(None, description="Include this client's past outputs")):
+    """The passages a job with this brief (from this client) would be given, with BM25 score and confidence."""
+    await run_in_threadpool(knowledge.refresh)
+    started = time.perf_counter()
+    hits = knowledge.search(q, k, client=client_name)
+    return {"took_ms": round((time.perf_counter() - started) * 1000, 3), "hits": [vars(h) for h in hits]}
+
+
+@router.get("/triage", dependencies=[Depends(require_admin)])
+async def triage_status():
+    """The loaded classifier's training report, and how triages have been answered since."""
+    model = await run_in_threadpool(triage.classifier.current)
+    counters = {k: v for k, v in metrics.snapshot().items() if k.startswith("triage_")}
+    audit = {}
+    for field in triage.FIELDS:
+        checked = counters.get(f"triage_audit_{field}_checked", 0)
+        if checked:
+            audit[field] = round(counters.get(f"triage_audit_{field}_agreed", 0) / checked, 4)
+    return {
+        "enabled":        triage.TRIAGE_CLASSIFIER,
+        "min_confidence": triage.TRIAGE_MIN_CONFIDENCE,
+        "audit_rate":     triage.TRIAGE_AUDIT_RATE,
+        "model":          model.meta if model else None,
+        "counters":       counters,
+        "audit_agreement": audit,
+    }
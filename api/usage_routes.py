@@ -0,0 +1,64 @@
+"""
+TechCrossIT Marketplace — Usage & Credit Routes
+Token and job-count summaries from the ledger, plus admin credit top-ups.
+"""
+
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from pydantic import BaseModel, Field
+
+from marketplace.ledger import GROUP_COLUMNS, ledger
+
+router = APIRouter(prefix="/marketplace/usage", tags=["Usage"])
+
+_DAY = r"^\d{4}-\d{2}-\d{2}$"
+
+
+class CreditGrant(BaseModel):
+    tokens: int = Field(..., description="Tokens to add (negative to debit)")
+
+
+@router.get("")
+def usage_summary(
+    client_name: Optional[str] = None,
+    company_id:  Optional[str] = None,
+    job_type:    Optional[str] = None,
+    model:       Optional[str] = None,
+    since:       Optional[str] = Query(None, pattern=_DAY, description="UTC day, inclusive (YYYY-MM-DD)"),
+    until:       Optional[str] = Query(None, pattern=_DAY, description="UTC day, inclusive (YYYY-MM-DD)"),
+    group_by:    str = Query("client_name,company_id", description=f"Comma-separated: {', '.join(GROUP_COLUMNS)}"),
+):
+    """Jobs and tokens, grouped as requested, including this worker's not-yet-flushed usage."""
+    columns = [c.strip() for c in group_by.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Cannot group by {unknown}. Choose from {list(GROUP_COLUMNS)}")
+
+    filters = {"client_name": client_name, "company_id": company_id, "job_type": job_type,
+               "model": model, "since": since, "until": until}
+    return {"group_by": columns, "rows": ledger.summary(filters, columns)}
+
+
+@router.get("/{client_name}")
+def client_usage(client_name: str):
+    """Totals per company for one client, with their remaining credit (null = no credit account)."""
+    rows = ledger.summary({"client_name": client_name}, ["company_id"])
+    return {
+        "client_name": client_name,
+        "jobs":        sum(r["jobs"] for r in rows),
+        "tokens":      sum(r["tokens"] for r in rows),
+        "by_company":  rows,
+        "credit_balance": ledger.balance(client_name),
+    }
+
+
+@router.post("/{client_name}/credits")
+def grant_credits(client_name: str, grant: CreditGrant, x_admin_token: Optional[str] = Header(None)):
+    """Top up (or debit) a client's credit in tokens. Requires X-Admin-Token = ADMIN_TOKEN."""
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token or not x_admin_token or \
+            not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+    return {"client_name": client_name, "credit_balance": ledger.grant(client_name, grant.tokens)}
@@ -0,0 +1,221 @@
+"""
+TechCrossIT Marketplace — WebSocket Job Channel
+One connection carries many jobs and their progress events, instead of one long HTTP
+request per job plus polling.
+
+Client → server (JSON text frames):
+  {"type": "submit", "ref": "<your id>", "intake": {...JobIntake...}}
+  {"type": "cancel", "job_id": "..."}
+  {"type": "ping"}
+
+Server → client:
+  {"type": "queued",  "job_id": "...", "ref": "..."}
+  {"type": "running", "job_id": "..."}
+  {"type": "delta",   "job_id": "...", "text": "..."}        streamed output
+  {"type": "done",    "job_id": "...", "result": {...JobResult...}}
+  {"type": "failed",  "job_id": "...", "status_code": 500, "error": "..."}
+  {"type": "cancelled", "job_id": "...", "result": {...JobResult...}}
+  {"type": "error",   "ref": "...", "message": "..."}        bad frame / limit reached / rate limited
+  {"type": "pong"}
+
+Backpressure: when the client reads slowly, pending deltas for a job are merged into one
+larger frame instead of queueing without bound, and job status events are never dropped.
+Replies to the client's own frames are capped: a ping gets no second pong while one is still
+unsent, and error frames beyond WS_MAX_PENDING_REPLIES unsent ones are dropped.
+
+Each submit frame counts against the POST /marketplace/submit rate limit (RATE_LIMITS), in
+the same bucket as the client's HTTP submits. Jobs are billed to the client authenticated by
+the API key the connection was opened with.
+
+"running" is sent once a job has been admitted; a refused job goes straight from "queued"
+to "failed" (503 overloaded / draining, 402 out of credit).
+
+Closing the connection, however it ends, cancels the jobs it still has running.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from marketplace import metrics
+from marketplace.clients import client_of
+from marketplace.context import JobContext
+from marketplace.models import JobIntake, JobStatus
+from marketplace.ratelimit import check_websocket
+from api.dispatch import dispatch, validate_intake
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/marketplace", tags=["WebSocket"])
+
+# Jobs one connection may have running at once.
+WS_MAX_JOBS = int(os.environ.get("WS_MAX_JOBS_PER_CONNECTION", "10"))
+# Largest accepted client frame (bytes) — briefs with pasted code can be big.
+WS_MAX_FRAME = 2 * 1024 * 1024
+# Unsent error replies kept per connection; a client that floods bad frames loses the rest.
+WS_MAX_PENDING_REPLIES = 32
+
+
+class Channel:
+    """
+    Outbox for one connection. Status events are queued in order; deltas are buffered per job
+    and represented in the outbox by a single marker, so a slow reader gets fewer, larger
+    delta frames. A job's marker always precedes its terminal event, keeping order intact.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.loop = asyncio.get_running_loop()
+        self._outbox: Deque[Union[Dict[str, Any], str]] = deque()   # event dict, or job_id delta marker
+        self._deltas: Dict[str, List[str]] = {}
+        self._pending_errors = 0
+        self._pong_pending = False
+        self._wake = asyncio.Event()
+        self.jobs: Dict[str, Tuple[JobContext, asyncio.Task]] = {}
+
+    def send(self, event: Dict[str, Any]) -> None:
+        self._outbox.append(event)
+        self._wake.set()
+
+    def reply(self, event: Dict[str, Any]) -> None:
+        """Queue a pong or error reply to a client frame, unless too many are still unsent."""
+        if event["type"] == "pong":
+            if self._pong_pending:
+                return
+            self._pong_pending = True
+        elif self._pending_errors >= WS_MAX_PENDING_REPLIES:
+            metrics.incr("ws_replies_dropped")
+            return
+        else:
+            self._pending_errors += 1
+        self.send(event)
+
+    def add_delta(self, job_id: str, text: str) -> None:
+        buffer = self._deltas.get(job_id)
+        if buffer is None:
+            self._deltas[job_id] = [text]
+            self._outbox.append(job_id)
+            self._wake.set()
+        else:
+            buffer.append(text)
+
+    def delta_listener(self, job_id: str):
+        """Thread-safe callback for the agent thread."""
+        return lambda text: self.loop.call_soon_threadsafe(self.add_delta, job_id, text)
+
+    async def sender(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._outbox:
+                item = self._outbox.popleft()
+                if isinstance(item, str):
+                    item = {"type": "delta", "job_id": item, "text": "".join(self._deltas.pop(item, []))}
+                elif item["type"] == "pong":
+                    self._pong_pending = False
+                elif item["type"] == "error":
+                    self._pending_errors -= 1
+                await self.websocket.send_text(json.dumps(item))
+
+
+async def _run_job(channel: Channel, ctx: JobContext, intake: JobIntake) -> None:
+    job_id = ctx.job_id
+    try:
+        result = await dispatch(intake, ctx)
+    except HTTPException as e:
+        channel.send({"type": "failed", "job_id": job_id, "status_code": e.status_code, "error": e.detail})
+        return
+    except Exception as e:
+        logger.exception("WebSocket job %s crashed", job_id)
+        channel.send({"type": "failed", "job_id": job_id, "status_code": 500, "error": str(e)})
+        return
+    finally:
+        channel.jobs.pop(job_id, None)
+
+    if result.status == JobStatus.DONE:
+        channel.send({"type": "done", "job_id": job_id, "result": result.model_dump(mode="json")})
+    elif result.status == JobStatus.CANCELLED:
+        channel.send({"type": "cancelled", "job_id": job_id, "result": result.model_dump(mode="json")})
+    else:
+        channel.send({"type": "failed", "job_id": job_id, "status_code": 500, "error": result.error})
+
+
+async def _submit(channel: Channel, message: Dict[str, Any]) -> None:
+    ref: Optional[str] = message.get("ref")
+    if len(channel.jobs) >= WS_MAX_JOBS:
+        channel.reply({"type": "error", "ref": ref, "message": f"At most {WS_MAX_JOBS} jobs may run per connection."})
+        return
+    refusal = await check_websocket(channel.websocket.scope, "POST", "/marketplace/submit")
+    if refusal:
+        channel.reply({"type": "error", "ref": ref, "message": refusal})
+        return
+    try:
+        intake = JobIntake.model_validate(message.get("intake") or {})
+        intake.client_name = client_of(channel.websocket)
+        validate_intake(intake)
+    except ValidationError as e:
+        channel.reply({"type": "error", "ref": ref, "message": json.loads(e.json(include_url=False))})
+        return
+    except HTTPException as e:
+        channel.reply({"type": "error", "ref": ref, "message": e.detail})
+        return
+
+    job_ctx = JobContext()
+    job_ctx.on_delta = channel.delta_listener(job_ctx.job_id)
+    job_ctx.on_start = lambda: channel.send({"type": "running", "job_id": job_ctx.job_id})
+    channel.send({"type": "queued", "job_id": job_ctx.job_id, "ref": ref})
+    channel.jobs[job_ctx.job_id] = (job_ctx, asyncio.create_task(_run_job(channel, job_ctx, intake)))
+
+
+def _cancel(channel: Channel, message: Dict[str, Any]) -> None:
+    job_id = message.get("job_id")
+    if not isinstance(job_id, str):
+        channel.reply({"type": "error", "message": "A cancel frame needs a string job_id."})
+        return
+    job = channel.jobs.get(job_id)
+    if job is None:
+        channel.reply({"type": "error", "message": f"No running job {job_id!r:.100} on this connection."})
+        return
+    job[0].cancel("cancel_requested")
+
+
+@router.websocket("/ws")
+async def job_channel(websocket: WebSocket):
+    await websocket.accept()
+    metrics.incr("ws_connections")
+    channel = Channel(websocket)
+    sender = asyncio.create_task(channel.sender())
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            if len(raw) > WS_MAX_FRAME:
+                channel.reply({"type": "error", "message": "Frame too large."})
+                continue
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                channel.reply({"type": "error", "message": "Frames must be JSON."})
+                continue
+
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "submit":
+                await _submit(channel, message)
+            elif kind == "cancel":
+                _cancel(channel, message)
+            elif kind == "ping":
+                channel.reply({"type": "pong"})
+            else:
+                channel.reply({"type": "error", "message": f"Unknown frame type: {kind!r:.100}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Nobody is left to receive the output — stop paying for it.
+        for job_ctx, _ in list(channel.jobs.values()):
+            job_ctx.cancel("client_disconnected")
+        sender.cancel()
@@ -3,11 +3,11 @@ TechCrossIT — The Dev Shop
 AI development team: builds code, fixes bugs, writes tests, reviews code, writes docs.
 """
 
-import os
 import time
-import uuid
-from anthropic import Anthropic
+from marketplace import llm
+from marketplace.context import new_job_id
 from marketplace.models import JobIntake, JobResult, JobStatus
+from companies.dev_shop.chunking import needs_map_reduce, run_map_reduce
 
 
 SYSTEM_PROMPT = """You are The Dev Shop — TechCrossIT's elite AI development team.
@@ -88,7 +88,7 @@ Context: {context}""",
 
 def run(intake: JobIntake) -> JobResult:
     start = time.time()
-    job_id = str(uuid.uuid4())[:12]
+    job_id = new_job_id()
 
     try:
         prompt_template = JOB_PROMPTS.get(intake.job_type)
@@ -101,26 +101,25 @@ def run(intake: JobIntake) -> JobResult:
                 error=f"Unknown job type: {intake.job_type}",
             )
 
-        prompt = prompt_template.format(
-            brief=intake.brief,
-            context=intake.context or "No additional context provided.",
-        )
-
+        tone_suffix = ""
         if intake.tone == "casual":
-            prompt += "\n\nKeep comments conversational — this is an internal team project."
+            tone_suffix = "\n\nKeep comments conversational — this is an internal team project."
         elif intake.tone == "technical":
-            prompt += "\n\nMaximise technical depth — the audience are senior engineers."
-
-        client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-        response = client.messages.create(
-            model="claude-sonnet-4-6",
-            max_tokens=4096,
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": prompt}],
-        )
+            tone_suffix = "\n\nMaximise technical depth — the audience are senior engineers."
+
+        chunks = 1
+        if needs_map_reduce(intake.job_type, intake.brief, intake.context):
+            # Large codebase: review/refactor/document chunks in parallel, then merge.
+            output, tokens, chunks = run_map_reduce(
+                intake.job_type, SYSTEM_PROMPT, intake.brief, intake.context, suffix=tone_suffix,
+            )
+        else:
+            prompt = prompt_template.format(
+                brief=intake.brief,
+                context=intake.context or "No additional context provided.",
+            ) + tone_suffix
+            output, tokens = llm.complete(SYSTEM_PROMPT, prompt, job_type=intake.job_type)
 
-        output = response.content[0].text
-        tokens = response.usage.input_tokens + response.usage.output_tokens
         duration = int((time.time() - start) * 1000)
 
         return JobResult(
@@ -132,7 +131,8 @@ def run(intake: JobIntake) -> JobResult:
             metadata={
                 "client": intake.client_name or "Anonymous",
                 "tone": intake.tone,
-                "model": "claude-sonnet-4-6",
+                "model": llm.MODEL,
+                "chunks": chunks,
             },
             duration_ms=duration,
             tokens_used=tokens,
@@ -0,0 +1,290 @@
+"""
+TechCrossIT — The Dev Shop
+Map-reduce pipeline for large code inputs (code_review, refactor_code, write_docs).
+
+Large codebases are split along file, class and function boundaries, each chunk is
+processed in parallel (under the shared upstream concurrency limit), and a final
+reduce pass merges the partial results into the normal output layout.
+"""
+
+import functools
+import os
+import re
+from typing import List, Optional, Tuple
+
+from marketplace import llm
+from marketplace.context import run_concurrently
+from marketplace.upstream import pool
+
+
+# Inputs above this many characters (brief + context) go through map-reduce.
+CHUNK_THRESHOLD_CHARS = int(os.environ.get("DEV_SHOP_CHUNK_THRESHOLD_CHARS", "24000"))
+# Target size of a single chunk sent to the model.
+CHUNK_TARGET_CHARS = int(os.environ.get("DEV_SHOP_CHUNK_TARGET_CHARS", "12000"))
+# Context up to this size is shared with every chunk; anything larger is chunked too.
+SHARED_CONTEXT_CHARS = 4000
+
+MAP_REDUCE_JOBS = {"code_review", "refactor_code", "write_docs"}
+
+
+# ── SPLITTING ───────────────────────────────────────────────────────────────
+
+# "# File: app/main.py", "### app/main.py", "// src/index.ts", "==> a.py <==", "--- a/app.py"
+_FILE_HEADER = re.compile(
+    r"^(?:(?:#{1,6}|//|--|\*\*|==>|\+\+\+|---)\s*)?(?:file:\s*)?(?:[ab]/)?"
+    r"[\w.\-/\\]+\.[A-Za-z0-9]{1,8}\s*(?:<==|\*\*)?\s*$",
+    re.IGNORECASE,
+)
+_FENCE = re.compile(r"^```")
+# Top-level definitions in the languages we usually see (Python, JS/TS, Go, Rust, Java, SQL).
+_TOP_LEVEL_DEF = re.compile(
+    r"^(?:async\s+def|def|class|function|export|interface|type|enum|func|fn|pub\s|impl|"
+    r"public|private|protected|module|CREATE\s)\b",
+    re.IGNORECASE,
+)
+_DECORATOR = re.compile(r"^@")
+
+
+def _split_files(text: str) -> List[str]:
+    """Split text at file headers and opening code fences."""
+    segments, current, in_fence = [], [], False
+    for line in text.splitlines(keepends=True):
+        stripped = line.rstrip("\n")
+        opens_fence = _FENCE.match(stripped) and not in_fence
+        if current and not in_fence and (opens_fence or _FILE_HEADER.match(stripped)):
+            segments.append("".join(current))
+            current = []
+        if _FENCE.match(stripped):
+            in_fence = not in_fence
+        current.append(line)
+    if current:
+        segments.append("".join(current))
+    return segments
+
+
+def _split_definitions(text: str) -> List[str]:
+    """Split one file at top-level class/function definitions (decorators stay attached)."""
+    units, current = [], []
+    for line in text.splitlines(keepends=True):
+        starts_def = _TOP_LEVEL_DEF.match(line) or _DECORATOR.match(line)
+        attached = current and _DECORATOR.match(current[-1])
+        if current and starts_def and not attached:
+            units.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        units.append("".join(current))
+    return units
+
+
+def _split_lines(text: str, limit: int) -> List[str]:
+    """Last resort for oversized units: cut at blank lines, then at line ends."""
+    pieces, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        if size + len(line) > limit and current:
+            cut = max((i for i, l in enumerate(current) if not l.strip()), default=None)
+            if cut:
+                pieces.append("".join(current[:cut + 1]))
+                current = current[cut + 1:]
+            else:
+                pieces.append("".join(current))
+                current = []
+            size = sum(len(l) for l in current)
+        current.append(line)
+        size += len(line)
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+
+def _file_label(segment: str) -> Optional[str]:
+    first = segment.lstrip("\n").split("\n", 1)[0].strip()
+    return first if _FILE_HEADER.match(first) or _FENCE.match(first) else None
+
+
+def split_code(text: str, target: int = CHUNK_TARGET_CHARS) -> List[str]:
+    """
+    Split a codebase into chunks of roughly `target` characters.
+    Boundaries are preferred in order: file, top-level definition, blank line, line.
+    Units are packed greedily so small files share a chunk.
+    """
+    units: List[str] = []
+    for segment in _split_files(text):
+        if len(segment) <= target:
+            units.append(segment)
+            continue
+        label = _file_label(segment)
+        for i, unit in enumerate(_split_definitions(segment)):
+            parts = _split_lines(unit, target) if len(unit) > target else [unit]
+            for j, part in enumerate(parts):
+                # Keep the file name on every piece of a split file so findings stay locatable.
+                if label and (i or j):
+                    part = f"{label} (continued)\n{part}"
+                units.append(part)
+
+    chunks, current, size = [], [], 0
+    for unit in units:
+        if current and size + len(unit) > target:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += len(unit)
+    if current:
+        chunks.append("".join(current))
+    return [c for c in chunks if c.strip()]
+
+
+def needs_map_reduce(job_type: str, brief: str, context: Optional[str]) -> bool:
+    return job_type in MAP_REDUCE_JOBS and len(brief) + len(context or "") > CHUNK_THRESHOLD_CHARS
+
+
+# ── PROMPTS ─────────────────────────────────────────────────────────────────
+
+MAP_PROMPTS = {
+
+    "code_review": """You are reviewing part {index} of {total} of a larger codebase.
+Review ONLY the code below. Cover: correctness, security, performance, readability, naming, error handling, and test coverage.
+Reference file names and function/class names for every finding.
+Format as:
+- CRITICAL issues (must fix before shipping)
+- WARNINGS (should fix)
+- SUGGESTIONS (nice to have)
+- APPROVED checks (things done well)
+Write "None" under a heading with no findings.
+
+Code (part {index}/{total}):
+{chunk}
+
+Context: {context}""",
+
+    "refactor_code": """You are refactoring part {index} of {total} of a larger codebase.
+Goals: improve readability, performance, and maintainability. Keep every public name and signature
+used by other parts unchanged.
+Output the fully working refactored code for this part only, then a line containing exactly
+CHANGELOG:
+followed by bullet points of what was improved and why.
+
+Code (part {index}/{total}):
+{chunk}
+
+Context: {context}""",
+
+    "write_docs": """You are documenting part {index} of {total} of a larger codebase.
+Write the API reference entries (Markdown) for the modules, classes and functions in this part only:
+signature, purpose, parameters, return values, raised errors and a short usage example where useful.
+Do not write an overview, installation or FAQ section.
+
+Code (part {index}/{total}):
+{chunk}
+
+Context: {context}""",
+}
+
+REDUCE_PROMPTS = {
+
+    "code_review": """Merge the following partial code reviews of one codebase ({total} parts) into a single review.
+Deduplicate repeated findings, keep file/function references, and order each section by severity.
+Format as:
+- CRITICAL issues (must fix before shipping)
+- WARNINGS (should fix)
+- SUGGESTIONS (nice to have)
+- APPROVED checks (things done well)
+
+Partial reviews:
+{partials}
+
+Original brief: {brief}""",
+
+    "refactor_code": """The following changelogs come from refactoring {total} parts of one codebase.
+Provide:
+1. A single deduplicated bullet-point changelog of what was improved and why
+2. Performance impact estimate if applicable
+
+Changelogs:
+{partials}
+
+Original brief: {brief}""",
+
+    "write_docs": """The API reference for a codebase ({total} parts) has already been written; its outline (the entry headings) follows.
+Write the remaining documentation in Markdown: overview, installation/setup, usage examples, and FAQ.
+Do not repeat the API reference. Assume the reader is a developer but not familiar with the codebase.
+
+API reference outline:
+{partials}
+
+Original brief: {brief}""",
+}
+
+
+# ── MAP-REDUCE ──────────────────────────────────────────────────────────────
+
+def _split_refactor(output: str) -> Tuple[str, str]:
+    code, sep, changelog = output.partition("CHANGELOG:")
+    return code.strip(), changelog.strip() if sep else ""
+
+
+def _outline(reference: str, limit: int = SHARED_CONTEXT_CHARS) -> str:
+    """The Markdown headings of the written API reference, capped at `limit` characters."""
+    headings, in_fence = [], False
+    for line in reference.splitlines():
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        elif line.startswith("#") and not in_fence:
+            headings.append(line)
+    outline = "\n".join(headings) or reference
+    return outline if len(outline) <= limit else outline[:limit] + "\n[...]"
+
+
+def run_map_reduce(job_type: str, system: str, brief: str, context: Optional[str],
+                   suffix: str = "") -> Tuple[str, int, int]:
+    """
+    Process a large input chunk by chunk. Returns (output, tokens_used, chunk_count).
+    Map calls run concurrently; wall-clock time tracks the slowest chunk plus one reduce call.
+    """
+    source = brief
+    shared_context = context or "No additional context provided."
+    if context and len(context) > SHARED_CONTEXT_CHARS:
+        source = f"{brief}\n\n{context}"
+        shared_context = "The context was large and has been merged into the code parts."
+
+    chunks = split_code(source)
+    total = len(chunks)
+    prompts = [
+        MAP_PROMPTS[job_type].format(index=i, total=total, chunk=chunk, context=shared_context) + suffix
+        for i, chunk in enumerate(chunks, start=1)
+    ]
+
+    # Each map call belongs to the same job: a cancel or deadline stops every chunk, their usage
+    # is counted against the job, and when one chunk fails the others are stopped at once.
+    mapped = run_concurrently([functools.partial(llm.complete, system, p, job_type=job_type) for p in prompts],
+                              int(pool.capacity()))
+    tokens = sum(t for _, t in mapped)
+    partial_outputs = [text for text, _ in mapped]
+
+    # Keep the brief in the reduce prompt short: it may itself be the codebase.
+    brief_summary = brief if len(brief) <= SHARED_CONTEXT_CHARS else brief[:SHARED_CONTEXT_CHARS] + "\n[...]"
+
+    if job_type == "refactor_code":
+        split = [_split_refactor(text) for text in partial_outputs]
+        partials = "\n\n".join(f"Part {i}:\n{log or '(none)'}" for i, (_, log) in enumerate(split, start=1))
+        summary, reduce_tokens = llm.complete(
+            system, REDUCE_PROMPTS[job_type].format(total=total, partials=partials, brief=brief_summary) + suffix,
+            job_type=job_type,
+        )
+        code = "\n\n".join(code for code, _ in split)
+        output = f"## 1. Refactored code\n\n{code}\n\n## 2. Changelog\n\n{summary}"
+    elif job_type == "write_docs":
+        reference = "\n\n".join(partial_outputs)
+        overview, reduce_tokens = llm.complete(
+            system, REDUCE_PROMPTS[job_type].format(total=total, partials=_outline(reference), brief=brief_summary) + suffix,
+            job_type=job_type,
+        )
+        output = f"{overview}\n\n## API Reference\n\n{reference}"
+    else:
+        partials = "\n\n".join(f"### Part {i}\n{text}" for i, text in enumerate(partial_outputs, start=1))
+        output, reduce_tokens = llm.complete(
+            system, REDUCE_PROMPTS[job_type].format(total=total, partials=partials, brief=brief_summary) + suffix,
+            job_type=job_type,
+        )
+
+    return output, tokens + reduce_tokens, total
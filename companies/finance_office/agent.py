@@ -1,13 +1,19 @@
 """
 TechCrossIT — The Finance Office
 AI bookkeeping and finance team: invoices, expense reports, budgets, cash flow, VAT.
+
+Invoices, VAT returns, P&L statements, cash-flow projections and budgets with structured
+figures in JobIntake.extra are computed locally (see engines.py); the model only writes
+the commentary. Payment reminder sequences are written level by level in parallel
+(see marketplace/parts.py).
 """
 
-import os
 import time
-import uuid
-from anthropic import Anthropic
+from marketplace import llm
+from marketplace.context import new_job_id
 from marketplace.models import JobIntake, JobResult, JobStatus
+from marketplace.parts import PARALLEL_PARTS, Part, complete_parts
+from companies.finance_office import engines
 
 
 SYSTEM_PROMPT = """You are The Finance Office — TechCrossIT's AI accounting and finance team.
@@ -123,9 +129,40 @@ Context: {context}""",
 }
 
 
+NARRATIVE_PROMPT = """Write {request}, based on the figures below.
+The figures are final and exact: quote them exactly as written, do not recalculate them or
+introduce new numbers. Plain prose, no headings, no tables. Tone: {tone}.
+
+Client brief: {brief}
+
+{document}"""
+
+
+def run_structured(intake: JobIntake, job_id: str) -> tuple:
+    """(output, tokens, model, figures) for a job whose figures are in intake.extra."""
+    doc = engines.build(intake.job_type, intake.extra, job_id)
+    if not intake.extra.get("narrative", doc.narrative_by_default):
+        return doc.markdown, 0, "calc", doc.figures
+
+    prompt = NARRATIVE_PROMPT.format(request=doc.narrative_request, tone=intake.tone or "professional",
+                                     brief=intake.brief, document=doc.summary or doc.markdown)
+    narrative, tokens = llm.complete(SYSTEM_PROMPT, prompt, max_tokens=600, job_type=intake.job_type)
+    return f"{doc.markdown}\n\n## {doc.narrative_heading}\n{narrative.strip()}", tokens, llm.MODEL, doc.figures
+
+
+# Independent pieces of a deliverable, generated concurrently and assembled in this order.
+JOB_PARTS = {
+    "payment_reminder": [
+        Part("Level 1 — Due date", "Level 1 (due date), a polite reminder: subject line, full body, and action required."),
+        Part("Level 2 — 7 days overdue", "Level 2 (7 days overdue), firm but friendly: subject line, full body, and action required."),
+        Part("Level 3 — 14 days overdue", "Level 3 (14 days overdue), a formal final notice: subject line, full body, and action required."),
+    ],
+}
+
+
 def run(intake: JobIntake) -> JobResult:
     start = time.time()
-    job_id = str(uuid.uuid4())[:12]
+    job_id = new_job_id()
 
     try:
         prompt_template = JOB_PROMPTS.get(intake.job_type)
@@ -144,29 +181,34 @@ def run(intake: JobIntake) -> JobResult:
             tone=intake.tone or "professional",
         )
 
-        client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-        response = client.messages.create(
-            model="claude-sonnet-4-6",
-            max_tokens=4096,
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": prompt}],
-        )
-
-        output = response.content[0].text
-        tokens = response.usage.input_tokens + response.usage.output_tokens
+        figures = None
+        parts = JOB_PARTS.get(intake.job_type) if PARALLEL_PARTS else None
+        if engines.is_structured(intake.job_type, intake.extra):
+            output, tokens, model, figures = run_structured(intake, job_id)
+        elif parts:
+            output, tokens = complete_parts(SYSTEM_PROMPT, prompt, parts, job_type=intake.job_type)
+            model = llm.MODEL
+        else:
+            output, tokens = llm.complete(SYSTEM_PROMPT, prompt, job_type=intake.job_type)
+            model = llm.MODEL
         duration = int((time.time() - start) * 1000)
 
+        metadata = {
+            "client": intake.client_name or "Anonymous",
+            "tone": intake.tone,
+            "model": model,
+        }
+        if figures is not None:
+            metadata["figures"] = figures
+        if parts:
+            metadata["parts"] = len(parts)
         return JobResult(
             job_id=job_id,
             company_id="finance_office",
             job_type=intake.job_type,
             status=JobStatus.DONE,
             output=output,
-            metadata={
-                "client": intake.client_name or "Anonymous",
-                "tone": intake.tone,
-                "model": "claude-sonnet-4-6",
-            },
+            metadata=metadata,
             duration_ms=duration,
             tokens_used=tokens,
         )
@@ -0,0 +1,385 @@
+"""
+TechCrossIT — The Finance Office
+Deterministic calculation engine for invoices, VAT returns and P&L statements.
+
+When a generate_invoice, vat_calculation or profit_loss job carries structured figures in
+JobIntake.extra, every number is computed here with Decimal arithmetic (pence rounded
+half-up) and the document is rendered from a template — no model call, exact and
+repeatable. Set extra["narrative"] = true to have the model add a short commentary; it is
+given the finished document and may not change the figures.
+
+extra layouts (amounts as JSON numbers or strings; rates in percent):
+
+  generate_invoice  {"lines": [{"description": "Consulting", "quantity": 3, "unit_price": 450,
+                                "vat_rate": 20}],
+                     "seller": {"name": ..., "address": ..., "vat_number": ...}, "buyer": {...},
+                     "number": "INV-...", "issue_date": "2026-10-19", "due_days": 30,
+                     "vat_rate": 20, "currency": "GBP", "payment_details": ..., "notes": ...}
+  vat_calculation   {"sales": [{"description": ..., "net": 1200, "vat_rate": 20}],
+                     "purchases": [{"net": 300, "vat": 60}],
+                     "period": "Q3 2026", "scheme": "standard" | "flat_rate",
+                     "flat_rate_percent": 12.5, "turnover_12m": 85000}
+  profit_loss       {"revenue": {"Subscriptions": 120000}, "cost_of_sales": {...},
+                     "operating_expenses": {"Salaries": 45000}, "interest": 1200,
+                     "corporation_tax_rate": 25, "period": "FY 2025/26", "prior": {...same...}}
+"""
+
+import datetime
+import hashlib
+from dataclasses import dataclass
+from decimal import ROUND_DOWN, ROUND_HALF_UP, Decimal
+from typing import Annotated, Any, Callable, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field, model_validator
+
+PENNY = Decimal("0.01")
+HUNDRED = Decimal(100)
+
+STANDARD_VAT_RATE = Decimal(20)
+CORPORATION_TAX_RATE = Decimal(25)
+VAT_REGISTRATION_THRESHOLD = Decimal(90000)
+
+CURRENCY_SYMBOLS = {"GBP": "£", "EUR": "€", "USD": "$"}
+
+# Input bounds that keep every total, in pence, within Decimal's 28 significant digits
+# (beyond them quantize raises InvalidOperation): amounts × quantities × entries ≤ 10^22.
+MAX_AMOUNT = Decimal(10) ** 12
+MAX_QUANTITY = Decimal(10) ** 6
+MAX_ENTRIES = 10_000
+
+Amount = Annotated[Decimal, Field(ge=-MAX_AMOUNT, le=MAX_AMOUNT)]
+
+
+def money(value: Decimal) -> Decimal:
+    return value.quantize(PENNY, rounding=ROUND_HALF_UP)
+
+
+def fmt(value: Decimal, currency: str = "GBP") -> str:
+    """£12,500.00 / -£40.00 (unknown currencies are prefixed with their code)."""
+    symbol = CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+    sign = "-" if value < 0 else ""
+    return f"{sign}{symbol}{abs(money(value)):,.2f}"
+
+
+def fmt_price(value: Decimal, currency: str = "GBP") -> str:
+    """Like fmt, but keeps sub-penny unit prices (£0.335) as given."""
+    if value == money(value):
+        return fmt(value, currency)
+    symbol = CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+    return f"{'-' if value < 0 else ''}{symbol}{abs(value).normalize():,f}"
+
+
+def whole_pounds(value: Decimal, currency: str = "GBP") -> str:
+    """VAT return boxes 6-9: whole pounds, pence dropped."""
+    symbol = CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+    return f"{symbol}{value.quantize(Decimal(1), rounding=ROUND_DOWN):,}"
+
+
+def pct(value: Optional[Decimal]) -> str:
+    return "n/a" if value is None else f"{value.quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)}%"
+
+
+def ratio(part: Decimal, whole: Decimal) -> Optional[Decimal]:
+    return part / whole * HUNDRED if whole else None
+
+
+def _rate(value: Decimal) -> str:
+    return f"{value.normalize():f}%"
+
+
+@dataclass
+class Document:
+    """A rendered document, its figures (as exact strings) and what to ask the model for."""
+    markdown: str
+    figures: Dict[str, Any]
+    narrative_heading: str
+    narrative_request: str
+    summary: Optional[str] = None          # shown to the model instead of the full document
+    narrative_by_default: bool = False
+
+
+# ── INVOICE ─────────────────────────────────────────────────────────────────
+
+class Party(BaseModel):
+    name:       str
+    address:    Optional[str] = None
+    vat_number: Optional[str] = None
+    email:      Optional[str] = None
+
+
+class InvoiceLine(BaseModel):
+    description: str
+    quantity:    Decimal = Field(Decimal(1), ge=-MAX_QUANTITY, le=MAX_QUANTITY)
+    unit_price:  Amount
+    vat_rate:    Optional[Decimal] = Field(None, ge=0, le=100)
+
+
+class InvoiceInput(BaseModel):
+    lines:           List[InvoiceLine] = Field(..., min_length=1, max_length=MAX_ENTRIES)
+    seller:          Optional[Party] = None
+    buyer:           Optional[Party] = None
+    number:          Optional[str] = None
+    issue_date:      Optional[datetime.date] = None
+    due_days:        int = Field(30, ge=0)
+    vat_rate:        Decimal = Field(STANDARD_VAT_RATE, ge=0, le=100)
+    currency:        str = "GBP"
+    payment_details: Optional[str] = None
+    notes:           Optional[str] = None
+
+
+def _party(label: str, party: Optional[Party]) -> List[str]:
+    if party is None:
+        return [f"**{label}:** [{label.upper()} DETAILS]"]
+    lines = [f"**{label}:** {party.name}"]
+    if party.address:
+        lines.append(party.address.replace("\n", ", "))
+    if party.vat_number:
+        lines.append(f"VAT No: {party.vat_number}")
+    if party.email:
+        lines.append(party.email)
+    return ["  \n".join(lines)]
+
+
+def invoice(data: InvoiceInput, job_id: str, today: datetime.date) -> Document:
+    cur = data.currency
+    issued = data.issue_date or today
+    due = issued + datetime.timedelta(days=data.due_days)
+    number = data.number or f"INV-{issued:%Y%m%d}-{hashlib.sha256(job_id.encode()).hexdigest()[:4].upper()}"
+
+    rows, net_by_rate = [], {}
+    for line in data.lines:
+        rate = line.vat_rate if line.vat_rate is not None else data.vat_rate
+        total = money(line.quantity * line.unit_price)
+        net_by_rate[rate] = net_by_rate.get(rate, Decimal(0)) + total
+        rows.append(f"| {line.description} | {line.quantity.normalize():f} | {fmt_price(line.unit_price, cur)} "
+                    f"| {_rate(rate)} | {fmt(total, cur)} |")
+    # VAT is worked out per rate on the invoice totals, as HMRC allows.
+    vat_by_rate = {rate: money(net * rate / HUNDRED) for rate, net in net_by_rate.items()}
+    subtotal = sum(net_by_rate.values(), Decimal(0))
+    vat = sum(vat_by_rate.values(), Decimal(0))
+    total = subtotal + vat
+
+    out = [
+        f"# INVOICE {number}",
+        "",
+        f"**Invoice date:** {issued:%d %b %Y}  ",
+        f"**Payment due:** {due:%d %b %Y} ({data.due_days} days)",
+        "",
+        *_party("From", data.seller),
+        "",
+        *_party("Bill to", data.buyer),
+        "",
+        "| Description | Qty | Unit price | VAT rate | Line total |",
+        "|---|---:|---:|---:|---:|",
+        *rows,
+        "",
+        "| | Amount |",
+        "|---|---:|",
+        f"| Subtotal (net) | {fmt(subtotal, cur)} |",
+        *(f"| VAT @ {_rate(rate)} on {fmt(net_by_rate[rate], cur)} | {fmt(amount, cur)} |"
+          for rate, amount in sorted(vat_by_rate.items(), reverse=True)),
+        f"| **TOTAL DUE** | **{fmt(total, cur)}** |",
+        "",
+        "## Payment",
+        f"Payment terms: {data.due_days} days from invoice date. Please quote {number} as the reference.  ",
+        data.payment_details or "Bank: [BANK NAME] · Sort code: [SORT CODE] · Account: [ACCOUNT NUMBER]",
+    ]
+    if data.notes:
+        out += ["", f"*{data.notes}*"]
+    figures = {
+        "number": number, "issue_date": issued.isoformat(), "due_date": due.isoformat(), "currency": cur,
+        "subtotal": str(subtotal), "vat": str(vat), "total": str(total),
+        "vat_by_rate": {_rate(r): str(v) for r, v in vat_by_rate.items()},
+    }
+    return Document("\n".join(out), figures, "Notes",
+                    "a brief, friendly cover note to accompany this invoice (2-3 sentences)")
+
+
+# ── VAT RETURN ──────────────────────────────────────────────────────────────
+
+class VatEntry(BaseModel):
+    description: Optional[str] = None
+    net:         Amount
+    vat_rate:    Decimal = Field(STANDARD_VAT_RATE, ge=0, le=100)
+    vat:         Optional[Amount] = Field(None, description="VAT actually charged, if known (else net × rate)")
+
+    def tax(self) -> Decimal:
+        return money(self.vat) if self.vat is not None else money(self.net * self.vat_rate / HUNDRED)
+
+
+class VatInput(BaseModel):
+    sales:             List[VatEntry] = Field([], max_length=MAX_ENTRIES)
+    purchases:         List[VatEntry] = Field([], max_length=MAX_ENTRIES)
+    period:            Optional[str] = None
+    scheme:            Literal["standard", "flat_rate"] = "standard"
+    flat_rate_percent: Optional[Decimal] = Field(None, gt=0, le=100)
+    turnover_12m:      Optional[Amount] = None
+    currency:          str = "GBP"
+
+    @model_validator(mode="after")
+    def _flat_rate_percent(self):
+        if self.scheme == "flat_rate" and self.flat_rate_percent is None:
+            raise ValueError("flat_rate_percent is required for the flat_rate scheme")
+        return self
+
+
+def vat_return(data: VatInput, job_id: str, today: datetime.date) -> Document:
+    cur = data.currency
+    sales_net = sum((e.net for e in data.sales), Decimal(0))
+    output_tax = sum((e.tax() for e in data.sales), Decimal(0))
+    purchases_net = sum((e.net for e in data.purchases), Decimal(0))
+
+    if data.scheme == "flat_rate":
+        # Flat Rate Scheme: a fixed % of VAT-inclusive turnover; input tax isn't reclaimed.
+        box1 = money((sales_net + output_tax) * data.flat_rate_percent / HUNDRED)
+        box4 = Decimal("0.00")
+    else:
+        box1 = output_tax
+        box4 = sum((e.tax() for e in data.purchases), Decimal(0))
+    box5 = box1 - box4
+
+    def entries(rows: List[VatEntry]) -> List[str]:
+        return [f"| {e.description or '—'} | {fmt(e.net, cur)} | {_rate(e.vat_rate)} | {fmt(e.tax(), cur)} |"
+                for e in rows]
+
+    out = [f"# VAT Return Summary{f' — {data.period}' if data.period else ''}", ""]
+    if data.sales:
+        out += ["## Sales (output tax)", "| Supply | Net | Rate | VAT |", "|---|---:|---:|---:|",
+                *entries(data.sales), f"| **Total** | **{fmt(sales_net, cur)}** | | **{fmt(output_tax, cur)}** |", ""]
+    if data.purchases:
+        out += ["## Purchases (input tax)", "| Purchase | Net | Rate | VAT |", "|---|---:|---:|---:|",
+                *entries(data.purchases), f"| **Total** | **{fmt(purchases_net, cur)}** | | "
+                f"**{fmt(sum((e.tax() for e in data.purchases), Decimal(0)), cur)}** |", ""]
+    out += [
+        "## Return (9-box)",
+        "| Box | Description | Amount |",
+        "|---|---|---:|",
+        f"| 1 | VAT due on sales and other outputs | {fmt(box1, cur)} |",
+        f"| 2 | VAT due on acquisitions | {fmt(Decimal(0), cur)} |",
+        f"| 3 | Total VAT due (1 + 2) | {fmt(box1, cur)} |",
+        f"| 4 | VAT reclaimed on purchases | {fmt(box4, cur)} |",
+        f"| 5 | **Net VAT {'payable' if box5 >= 0 else 'reclaimable'}** | **{fmt(abs(box5), cur)}** |",
+        f"| 6 | Total sales excluding VAT | {whole_pounds(sales_net, cur)} |",
+        f"| 7 | Total purchases excluding VAT | {whole_pounds(purchases_net, cur)} |",
+        f"| 8 | Supplies to EU (goods) | {whole_pounds(Decimal(0), cur)} |",
+        f"| 9 | Acquisitions from EU (goods) | {whole_pounds(Decimal(0), cur)} |",
+        "",
+        "## Notes",
+        f"- Scheme: {'Flat Rate (' + _rate(data.flat_rate_percent) + ' of gross turnover)' if data.scheme == 'flat_rate' else 'Standard accounting'}.",
+        f"- Registration threshold: {fmt(VAT_REGISTRATION_THRESHOLD, cur)} taxable turnover in any rolling 12 months.",
+    ]
+    if data.turnover_12m is not None:
+        over = data.turnover_12m > VAT_REGISTRATION_THRESHOLD
+        out.append(f"- Rolling 12-month turnover {fmt(data.turnover_12m, cur)} is "
+                   f"{'**above** the threshold — registration is mandatory' if over else 'below the threshold'}.")
+    figures = {
+        "period": data.period, "scheme": data.scheme, "currency": cur,
+        "box1": str(box1), "box4": str(box4), "box5": str(box5),
+        "box6": str(sales_net.quantize(Decimal(1), rounding=ROUND_DOWN)),
+        "box7": str(purchases_net.quantize(Decimal(1), rounding=ROUND_DOWN)),
+    }
+    return Document("\n".join(out), figures, "Commentary",
+                    "a short commentary on this VAT return: what drives the balance and anything to check before filing")
+
+
+# ── PROFIT & LOSS ───────────────────────────────────────────────────────────
+
+class ProfitLossInput(BaseModel):
+    revenue:              Dict[str, Amount] = Field(..., min_length=1, max_length=MAX_ENTRIES)
+    cost_of_sales:        Dict[str, Amount] = Field({}, max_length=MAX_ENTRIES)
+    operating_expenses:   Dict[str, Amount] = Field({}, max_length=MAX_ENTRIES)
+    interest:             Amount = Decimal(0)
+    corporation_tax_rate: Decimal = Field(CORPORATION_TAX_RATE, ge=0, le=100)
+    period:               Optional[str] = None
+    currency:             str = "GBP"
+    prior:                Optional["ProfitLossInput"] = None
+
+
+def _pnl_figures(data: ProfitLossInput) -> Dict[str, Any]:
+    revenue = sum(data.revenue.values(), Decimal(0))
+    cost_of_sales = sum(data.cost_of_sales.values(), Decimal(0))
+    gross = revenue - cost_of_sales
+    opex = sum(data.operating_expenses.values(), Decimal(0))
+    ebit = gross - opex
+    pbt = ebit - data.interest
+    tax = money(pbt * data.corporation_tax_rate / HUNDRED) if pbt > 0 else Decimal("0.00")
+    net = pbt - tax
+    return {"revenue": revenue, "cost_of_sales": cost_of_sales, "gross_profit": gross,
+            "gross_margin": ratio(gross, revenue), "operating_expenses": opex, "ebit": ebit,
+            "interest": data.interest, "profit_before_tax": pbt, "tax": tax, "net_profit": net,
+            "net_margin": ratio(net, revenue)}
+
+
+def _exact(figures: Dict[str, Optional[Decimal]]) -> Dict[str, Optional[str]]:
+    """Amounts to the penny and margins to two decimals, as strings."""
+    return {k: None if v is None else str(v.quantize(PENNY, rounding=ROUND_HALF_UP)) for k, v in figures.items()}
+
+
+def profit_loss(data: ProfitLossInput, job_id: str, today: datetime.date) -> Document:
+    cur = data.currency
+    now = _pnl_figures(data)
+    prior = _pnl_figures(data.prior) if data.prior else None
+
+    def row(label: str, key: Optional[str] = None, value: Optional[Decimal] = None,
+            prior_value: Optional[Decimal] = None, bold: bool = False) -> str:
+        current = now[key] if key else value
+        before = prior[key] if (key and prior) else prior_value
+        cells = [label, fmt(current, cur)]
+        if prior is not None:
+            change = ratio(current - before, abs(before)) if before is not None else None
+            cells += [fmt(before, cur) if before is not None else "—", pct(change)]
+        if bold:
+            cells = [f"**{c}**" for c in cells]
+        return "| " + " | ".join(cells) + " |"
+
+    def items(current: Dict[str, Decimal], previous: Optional[Dict[str, Decimal]]) -> List[str]:
+        return [row(f"  {name}", value=amount, prior_value=(previous or {}).get(name))
+                for name, amount in current.items()]
+
+    p = data.prior
+    header = "| | Current |" + (" Prior | Change |" if prior else "")
+    align = "|---|---:|" + ("---:|---:|" if prior else "")
+    out = [
+        f"# Profit & Loss Statement{f' — {data.period}' if data.period else ''}",
+        "",
+        header, align,
+        "| **Revenue** | |" + (" | |" if prior else ""),
+        *items(data.revenue, p.revenue if p else None),
+        row("Total revenue", "revenue", bold=True),
+    ]
+    if data.cost_of_sales:
+        out += ["| **Cost of sales** | |" + (" | |" if prior else ""),
+                *items(data.cost_of_sales, p.cost_of_sales if p else None),
+                row("Total cost of sales", "cost_of_sales")]
+    out += [row("Gross profit", "gross_profit", bold=True)]
+    if data.operating_expenses:
+        out += ["| **Operating expenses** | |" + (" | |" if prior else ""),
+                *items(data.operating_expenses, p.operating_expenses if p else None),
+                row("Total operating expenses", "operating_expenses")]
+    out += [
+        row("Operating profit (EBIT)", "ebit", bold=True),
+        row("Interest / finance costs", "interest"),
+        row("Profit before tax", "profit_before_tax", bold=True),
+        row(f"Corporation Tax @ {_rate(data.corporation_tax_rate)}", "tax"),
+        row("Net profit", "net_profit", bold=True),
+        "",
+        f"- Gross margin: {pct(now['gross_margin'])}" + (f" (prior {pct(prior['gross_margin'])})" if prior else ""),
+        f"- Net margin: {pct(now['net_margin'])}" + (f" (prior {pct(prior['net_margin'])})" if prior else ""),
+        f"- Tax is an estimate at the {_rate(data.corporation_tax_rate)} main rate; no tax is charged on a loss.",
+    ]
+    figures = _exact(now)
+    if prior:
+        figures["prior"] = _exact(prior)
+    return Document("\n".join(out), figures | {"period": data.period, "currency": cur}, "Commentary",
+                    "a board-ready commentary on this P&L: 3 key observations and, where a prior period "
+                    "is shown, what changed")
+
+
+# ── ENGINES ─────────────────────────────────────────────────────────────────
+
+# job type -> (input model, builder, extra keys that mark structured input); see engines.py
+ENGINES: Dict[str, Tuple[type, Callable[..., Document], Tuple[str, ...]]] = {
+    "generate_invoice": (InvoiceInput, invoice, ("lines",)),
+    "vat_calculation":  (VatInput, vat_return, ("sales", "purchases")),
+    "profit_loss":      (ProfitLossInput, profit_loss, ("revenue",)),
+}
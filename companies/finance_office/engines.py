@@ -0,0 +1,41 @@
+"""
+TechCrossIT — The Finance Office
+Local engines for jobs whose figures arrive structured in JobIntake.extra:
+calc.py (invoices, VAT returns, P&L) and modelling.py (cash flow, budgets).
+"""
+
+import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, ValidationError
+
+from companies.finance_office import calc, modelling
+from companies.finance_office.calc import Document
+
+ENGINES = {**calc.ENGINES, **modelling.ENGINES}
+
+
+def is_structured(job_type: str, extra: Optional[Dict[str, Any]]) -> bool:
+    engine = ENGINES.get(job_type)
+    return bool(engine and extra and any(key in extra for key in engine[2]))
+
+
+def parse(job_type: str, extra: Dict[str, Any]) -> BaseModel:
+    """The job's structured input, validated. ValueError listing every problem."""
+    model = ENGINES[job_type][0]
+    try:
+        return model.model_validate(extra)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'extra'}: {err['msg']}" for err in e.errors())
+        raise ValueError(f"Invalid extra for {job_type}: {problems}") from None
+
+
+def validate_extra(job_type: str, extra: Optional[Dict[str, Any]]) -> None:
+    """Up-front check used by the dispatcher, so bad figures are a 422 rather than a failed job."""
+    if is_structured(job_type, extra):
+        parse(job_type, extra)
+
+
+def build(job_type: str, extra: Dict[str, Any], job_id: str, today: Optional[datetime.date] = None) -> Document:
+    """Compute and render the document for structured input."""
+    return ENGINES[job_type][1](parse(job_type, extra), job_id, today or datetime.date.today())
@@ -0,0 +1,433 @@
+"""
+TechCrossIT — The Finance Office
+Vectorised cash-flow and budget modelling for cashflow_projection and budget_template.
+
+Revenue streams and cost lines from JobIntake.extra become a (lines × months) NumPy grid.
+Totals, net cash flow, closing balances, EBITDA and below-minimum months are whole-array
+operations. Scenario sweeps scale the revenue and cost grids by every requested
+combination at once, (scenarios × months), so thousands of scenarios cost about the same
+as one. The grid and tables are rendered from templates. Only the commentary (cash flow,
+on by default) is written by the model, and it sees a short summary, not the grid.
+
+Projections are computed in float64 and shown in whole pounds. Exact, to-the-penny
+documents are calc.py's job.
+
+extra layout (amounts per month; growth in % per month; changes in %):
+
+  {"opening_balance": 25000, "months": 12, "start_month": "2026-11", "min_balance": 0,
+   "revenue": [{"name": "Subscriptions", "monthly": 10000, "growth": 3},
+               {"name": "Consulting", "amounts": [5000, 0, 8000, ...]}],
+   "costs":   [{"name": "Salaries", "monthly": 12000, "category": "HR"},
+               {"name": "Hosting", "monthly": 900, "growth": 2, "kind": "cost_of_sales"},
+               {"name": "New hire", "monthly": 4000, "start": 4, "category": "HR"},
+               {"name": "Laptops", "amounts": [6000], "kind": "capex"}],
+   "scenarios": {"revenue_change": {"from": -30, "to": 30, "step": 1}, "cost_change": [0, 10]}}
+
+Cost kinds: operating (default), cost_of_sales, capex, financing, tax. EBITDA counts revenue
+less cost of sales and operating costs. Cash flow counts every line.
+"""
+
+import datetime
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+from companies.finance_office.calc import CURRENCY_SYMBOLS, Document
+
+MAX_MONTHS = 60
+# Upper bound on revenue × cost combinations in one sweep.
+MAX_SCENARIOS = 100_000
+# Scenario rows shown in the document; the rest are summarised.
+SCENARIO_ROWS = 15
+# Larger sweeps return percentiles in metadata.figures instead of every scenario.
+SCENARIO_FIGURES_MAX = 2000
+
+BELOW_EBITDA = {"capex", "financing", "tax"}
+
+
+# ── INPUT ───────────────────────────────────────────────────────────────────
+
+class Line(BaseModel):
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    name:     str
+    monthly:  Optional[float] = Field(None, description="Amount in the first month it applies")
+    growth:   float = Field(0.0, gt=-100, description="% change per month, compounding")
+    amounts:  Optional[List[float]] = Field(None, description="Explicit amounts from `start`; missing months are 0")
+    start:    int = Field(1, ge=1, description="First month (1-based) the line applies")
+    kind:     Literal["operating", "cost_of_sales", "capex", "financing", "tax"] = "operating"
+    category: Optional[str] = Field(None, description="Budget grouping, e.g. HR, Marketing")
+
+    @model_validator(mode="after")
+    def _one_source(self):
+        if (self.monthly is None) == (self.amounts is None):
+            raise ValueError("give exactly one of monthly / amounts")
+        return self
+
+
+class Sweep(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, allow_inf_nan=False)
+
+    start: float = Field(..., alias="from")
+    to:    float
+    step:  float = Field(..., gt=0)
+
+    @model_validator(mode="after")
+    def _ordered(self):
+        if self.to < self.start:
+            raise ValueError("'to' must not be below 'from'")
+        return self
+
+    def count(self) -> int:
+        return int((self.to - self.start) / self.step + 0.5) + 1
+
+    def values(self) -> np.ndarray:
+        return self.start + self.step * np.arange(self.count())
+
+
+Changes = Union[List[float], Sweep]
+
+
+class Scenarios(BaseModel):
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    revenue_change: Changes = [0.0]
+    cost_change:    Changes = [0.0]
+
+
+class ModelInput(BaseModel):
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    revenue:         List[Line] = Field(..., min_length=1)
+    costs:           List[Line] = []
+    months:          int = Field(12, ge=1, le=MAX_MONTHS)
+    start_month:     Optional[str] = Field(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
+    opening_balance: float = 0.0
+    min_balance:     float = 0.0
+    scenarios:       Optional[Scenarios] = None
+    currency:        str = "GBP"
+
+    @model_validator(mode="after")
+    def _scenario_count(self):
+        if self.scenarios:
+            count = _count(self.scenarios.revenue_change) * _count(self.scenarios.cost_change)
+            if count > MAX_SCENARIOS:
+                raise ValueError(f"{count} scenarios requested; the limit is {MAX_SCENARIOS}")
+        return self
+
+    @model_validator(mode="after")
+    def _finite(self):
+        # Every balance, total and scenario value is bounded by this sum, so if it is finite
+        # nothing overflows float64 once lines are grown, swept and summed.
+        scale = 1.0
+        if self.scenarios:
+            scale += max(float(np.abs(_changes(c)).max(initial=0))
+                         for c in (self.scenarios.revenue_change, self.scenarios.cost_change)) / 100
+        with np.errstate(over="ignore", invalid="ignore"):
+            bound = abs(self.opening_balance) + abs(self.min_balance) + scale * (
+                np.abs(grid(self.revenue, self.months)).sum() + np.abs(grid(self.costs, self.months)).sum())
+        if not np.isfinite(bound):
+            raise ValueError("amounts, growth or scenario changes are too large to model")
+        return self
+
+
+def _count(changes: Changes) -> int:
+    return changes.count() if isinstance(changes, Sweep) else len(changes)
+
+
+def _changes(changes: Changes) -> np.ndarray:
+    return changes.values() if isinstance(changes, Sweep) else np.asarray(changes, dtype=float)
+
+
+# ── ENGINE ──────────────────────────────────────────────────────────────────
+
+def grid(lines: List[Line], months: int) -> np.ndarray:
+    """(lines × months) amounts: growth curves and explicit series, shifted to their start month."""
+    out = np.zeros((len(lines), months))
+    steps = np.arange(months)
+    for i, line in enumerate(lines):
+        offset = min(line.start - 1, months)
+        if line.amounts is not None:
+            values = np.asarray(line.amounts[:months - offset], dtype=float)
+            out[i, offset:offset + len(values)] = values
+        else:
+            out[i, offset:] = line.monthly * (1 + line.growth / 100) ** steps[:months - offset]
+    return out
+
+
+@dataclass
+class Projection:
+    months:    List[str]
+    revenue:   np.ndarray     # (streams × months)
+    costs:     np.ndarray     # (cost lines × months)
+    income:    np.ndarray     # (months,)
+    outgoings: np.ndarray
+    net:       np.ndarray
+    opening:   np.ndarray
+    closing:   np.ndarray
+    ebitda:    np.ndarray
+    cost_of_sales: np.ndarray
+
+
+def month_labels(start_month: Optional[str], months: int, today: datetime.date) -> List[str]:
+    if start_month:
+        year, month = map(int, start_month.split("-"))
+    else:
+        year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+    labels = []
+    for i in range(months):
+        y, m = divmod(month - 1 + i, 12)
+        labels.append(datetime.date(year + y, m + 1, 1).strftime("%b %y"))
+    return labels
+
+
+def project(data: ModelInput, today: datetime.date) -> Projection:
+    revenue = grid(data.revenue, data.months)
+    costs = grid(data.costs, data.months)
+    kinds = np.array([line.kind for line in data.costs], dtype=object)
+    income = revenue.sum(axis=0)
+    outgoings = costs.sum(axis=0)
+    net = income - outgoings
+    closing = data.opening_balance + np.cumsum(net)
+    opening = np.concatenate(([data.opening_balance], closing[:-1]))
+    cost_of_sales = costs[kinds == "cost_of_sales"].sum(axis=0) if len(kinds) else np.zeros(data.months)
+    above = np.isin(kinds, list(BELOW_EBITDA), invert=True) if len(kinds) else np.zeros(0, dtype=bool)
+    ebitda = income - (costs[above].sum(axis=0) if len(kinds) else 0.0)
+    return Projection(month_labels(data.start_month, data.months, today), revenue, costs, income,
+                      outgoings, net, opening, closing, ebitda, cost_of_sales)
+
+
+@dataclass
+class SweepResult:
+    revenue_change: np.ndarray    # (scenarios,) in %
+    cost_change:    np.ndarray
+    closing:        np.ndarray    # (scenarios × months)
+    ebitda:         np.ndarray    # (scenarios,) whole-period EBITDA
+
+
+def sweep(data: ModelInput, p: Projection) -> SweepResult:
+    """Every revenue × cost change combination, evaluated in one broadcast."""
+    r, c = np.meshgrid(_changes(data.scenarios.revenue_change), _changes(data.scenarios.cost_change), indexing="ij")
+    r, c = r.ravel(), c.ravel()
+    rf, cf = 1 + r[:, None] / 100, 1 + c[:, None] / 100
+    net = rf * p.income - cf * p.outgoings
+    closing = data.opening_balance + np.cumsum(net, axis=1)
+    ebitda = (rf * p.income - cf * (p.income - p.ebitda)).sum(axis=1)
+    return SweepResult(r, c, closing, ebitda)
+
+
+def revenue_cushion(data: ModelInput, p: Projection) -> Optional[float]:
+    """
+    % revenue could fall (negative: must rise) before any month closes below min_balance,
+    costs unchanged; 100 if the balance stays above it with no revenue at all. None if
+    revenue can't fix it (no revenue before the problem month).
+    """
+    cum_income, cum_out = np.cumsum(p.income), np.cumsum(p.outgoings)
+    need = data.min_balance - data.opening_balance + cum_out       # cumulative income required
+    if np.any((cum_income <= 0) & (need > 0)):
+        return None
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factors = np.where(cum_income > 0, need / cum_income, -np.inf)
+    cushion = min(1 - factors.max(), 1.0) * 100
+    return float(cushion) if np.isfinite(cushion) else None
+
+
+# ── RENDERING ───────────────────────────────────────────────────────────────
+
+def _money(value: float, currency: str) -> str:
+    symbol = CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+    rounded = round(float(value))
+    return f"{'-' if rounded < 0 else ''}{symbol}{abs(rounded):,}"
+
+
+def _row(label: str, values: np.ndarray, currency: str, total: Optional[float] = None,
+         bold: bool = False, extra_cells: int = 0) -> str:
+    cells = [label, *(_money(v, currency) for v in values)]
+    if total is not None:
+        cells.append(_money(total, currency))
+    if bold:
+        cells = [f"**{c}**" for c in cells]
+    return "| " + " | ".join(cells + [""] * extra_cells) + " |"
+
+
+def _header(months: List[str], *tail: str) -> List[str]:
+    columns = ["", *months, *tail]
+    return ["| " + " | ".join(columns) + " |", "|---|" + "---:|" * (len(columns) - 1)]
+
+
+def _scenario_table(data: ModelInput, s: SweepResult, p: Projection) -> List[str]:
+    cur = data.currency
+    lowest = s.closing.min(axis=1)
+    short = (s.closing < data.min_balance).sum(axis=1)
+    order = np.lexsort((s.cost_change, s.revenue_change))
+    shown = order if len(order) <= SCENARIO_ROWS else order[np.unique(np.linspace(0, len(order) - 1, SCENARIO_ROWS).round().astype(int))]
+    out = [
+        f"## Scenarios ({len(order)} evaluated)",
+        f"{int((short > 0).sum())} of {len(order)} scenarios have at least one month below {_money(data.min_balance, cur)}.",
+        "",
+        "| Revenue change | Cost change | Lowest balance | Months below minimum | Closing balance | EBITDA |",
+        "|---:|---:|---:|---:|---:|---:|",
+    ]
+    for i in shown:
+        out.append(f"| {s.revenue_change[i]:+g}% | {s.cost_change[i]:+g}% | {_money(lowest[i], cur)} "
+                   f"({p.months[int(s.closing[i].argmin())]}) | {int(short[i])} | {_money(s.closing[i, -1], cur)} "
+                   f"| {_money(s.ebitda[i], cur)} |")
+    if len(shown) < len(order):
+        where = "every scenario is" if len(order) <= SCENARIO_FIGURES_MAX else "percentiles are"
+        out.append(f"\n*{len(shown)} of {len(order)} scenarios shown, evenly spaced; {where} in metadata.figures.*")
+    return out
+
+
+def _flags(data: ModelInput, p: Projection) -> Tuple[List[str], Dict[str, Any]]:
+    cur = data.currency
+    below = np.flatnonzero(p.closing < data.min_balance)
+    cushion = revenue_cushion(data, p)
+    lines = []
+    if len(below):
+        lines.append(f"- ⚠️ Closing balance below {_money(data.min_balance, cur)} in {len(below)} month(s): "
+                     + ", ".join(f"{p.months[i]} ({_money(p.closing[i], cur)})" for i in below))
+    else:
+        lines.append(f"- No month closes below {_money(data.min_balance, cur)}.")
+    lowest = int(p.closing.argmin())
+    lines.append(f"- Lowest closing balance: {_money(p.closing[lowest], cur)} in {p.months[lowest]}.")
+    if cushion is None:
+        lines.append("- Revenue alone can't keep the balance above the minimum (costs fall due before any income).")
+    elif cushion >= 100:
+        lines.append("- The balance stays above the minimum even with no revenue.")
+    elif cushion >= 0:
+        lines.append(f"- Revenue could fall {cushion:.1f}% across the board before any month drops below the minimum.")
+    else:
+        lines.append(f"- Revenue would need to be {-cushion:.1f}% higher across the board to stay above the minimum.")
+    flags = {"months_below_minimum": [p.months[i] for i in below], "lowest_balance": round(float(p.closing[lowest]), 2),
+             "lowest_month": p.months[lowest], "revenue_cushion_pct": None if cushion is None else round(cushion, 2)}
+    return lines, flags
+
+
+def _figures(data: ModelInput, p: Projection) -> Dict[str, Any]:
+    return {
+        "currency": data.currency, "months": p.months,
+        "income": np.round(p.income, 2).tolist(), "outgoings": np.round(p.outgoings, 2).tolist(),
+        "net": np.round(p.net, 2).tolist(), "closing": np.round(p.closing, 2).tolist(),
+        "ebitda": np.round(p.ebitda, 2).tolist(), "total_ebitda": round(float(p.ebitda.sum()), 2),
+    }
+
+
+def _sweep_figures(s: SweepResult, min_balance: float) -> Dict[str, Any]:
+    lowest, closing = s.closing.min(axis=1), s.closing[:, -1]
+    below = (s.closing < min_balance).sum(axis=1)
+    if len(lowest) <= SCENARIO_FIGURES_MAX:
+        return {
+            "revenue_change": s.revenue_change.tolist(), "cost_change": s.cost_change.tolist(),
+            "lowest_balance": np.round(lowest, 2).tolist(), "months_below_minimum": below.tolist(),
+            "closing_balance": np.round(closing, 2).tolist(), "ebitda": np.round(s.ebitda, 2).tolist(),
+        }
+    quantiles = [0, 5, 25, 50, 75, 95, 100]
+    return {
+        "count": len(lowest), "share_below_minimum": round(float((below > 0).mean()), 4),
+        "percentiles": quantiles,
+        "lowest_balance": np.round(np.percentile(lowest, quantiles), 2).tolist(),
+        "closing_balance": np.round(np.percentile(closing, quantiles), 2).tolist(),
+        "ebitda": np.round(np.percentile(s.ebitda, quantiles), 2).tolist(),
+    }
+
+
+def cashflow(data: ModelInput, job_id: str, today: datetime.date) -> Document:
+    cur = data.currency
+    p = project(data, today)
+    out = [f"# {len(p.months)}-Month Cash Flow Projection ({p.months[0]} – {p.months[-1]})", "",
+           *_header(p.months, "Total"),
+           _row("Opening balance", p.opening, cur, bold=True, extra_cells=1),
+           "| **Income** |" + " |" * (len(p.months) + 1)]
+    out += [_row(f"  {line.name}", p.revenue[i], cur, p.revenue[i].sum()) for i, line in enumerate(data.revenue)]
+    out += [_row("Total income", p.income, cur, p.income.sum(), bold=True),
+            "| **Outgoings** |" + " |" * (len(p.months) + 1)]
+    out += [_row(f"  {line.name}", p.costs[i], cur, p.costs[i].sum()) for i, line in enumerate(data.costs)]
+    out += [_row("Total outgoings", p.outgoings, cur, p.outgoings.sum(), bold=True),
+            _row("Net cash flow", p.net, cur, p.net.sum(), bold=True),
+            _row("Closing balance", p.closing, cur, bold=True, extra_cells=1),
+            _row("EBITDA", p.ebitda, cur, p.ebitda.sum()),
+            "", "## Risk flags"]
+    flag_lines, flags = _flags(data, p)
+    out += flag_lines
+    figures = _figures(data, p) | flags
+    if data.scenarios:
+        s = sweep(data, p)
+        out += ["", *_scenario_table(data, s, p)]
+        figures["scenarios"] = _sweep_figures(s, data.min_balance)
+
+    summary = "\n".join([
+        f"Cash flow projection {p.months[0]} – {p.months[-1]}, opening balance {_money(data.opening_balance, cur)}.",
+        f"Total income {_money(p.income.sum(), cur)}, total outgoings {_money(p.outgoings.sum(), cur)}, "
+        f"closing balance {_money(p.closing[-1], cur)}, EBITDA {_money(p.ebitda.sum(), cur)}.",
+        "Income streams: " + ", ".join(f"{l.name} {_money(p.revenue[i].sum(), cur)}" for i, l in enumerate(data.revenue)),
+        "Largest costs: " + (", ".join(f"{data.costs[i].name} {_money(p.costs[i].sum(), cur)}"
+                                        for i in np.argsort(-p.costs.sum(axis=1))[:5]) or "none"),
+        *flag_lines,
+    ])
+    return Document("\n".join(out), figures, "Commentary",
+                    "a commentary on this cash flow projection: 3 key observations and what to watch",
+                    summary=summary, narrative_by_default=True)
+
+
+def budget(data: ModelInput, job_id: str, today: datetime.date) -> Document:
+    cur = data.currency
+    p = project(data, today)
+    n = len(p.months)
+    blank = "| {} |" + " |" * (n + 2)
+    gross = p.income - p.cost_of_sales
+    out = [f"# Annual Budget ({p.months[0]} – {p.months[-1]})", "",
+           *_header(p.months, "Budget total", "YTD actual"),
+           blank.format("**Revenue**")]
+    out += [_row(f"  {line.name}", p.revenue[i], cur, p.revenue[i].sum(), extra_cells=1)
+            for i, line in enumerate(data.revenue)]
+    out.append(_row("Total revenue", p.income, cur, p.income.sum(), bold=True, extra_cells=1))
+
+    def section(title: str, indexes: List[int]) -> None:
+        if indexes:
+            out.append(blank.format(f"**{title}**"))
+            out.extend(_row(f"  {data.costs[i].name}", p.costs[i], cur, p.costs[i].sum(), extra_cells=1)
+                       for i in indexes)
+
+    section("Cost of sales", [i for i, l in enumerate(data.costs) if l.kind == "cost_of_sales"])
+    out.append(_row("Gross profit", gross, cur, gross.sum(), bold=True, extra_cells=1))
+    margin = gross.sum() / p.income.sum() * 100 if p.income.sum() else None
+
+    operating = [i for i, l in enumerate(data.costs) if l.kind == "operating"]
+    categories: Dict[str, List[int]] = {}
+    for i in operating:
+        categories.setdefault(data.costs[i].category or "Other", []).append(i)
+    for category, indexes in categories.items():
+        section(f"Operating — {category}", indexes)
+        subtotal = p.costs[indexes].sum(axis=0)
+        out.append(_row(f"Total {category}", subtotal, cur, subtotal.sum(), extra_cells=1))
+    opex = p.costs[operating].sum(axis=0) if operating else np.zeros(n)
+    out.append(_row("Total operating expenses", opex, cur, opex.sum(), bold=True, extra_cells=1))
+    out.append(_row("EBITDA", p.ebitda, cur, p.ebitda.sum(), bold=True, extra_cells=1))
+    section("Below EBITDA (capex, financing, tax)", [i for i, l in enumerate(data.costs) if l.kind in BELOW_EBITDA])
+    out += ["", f"- Gross margin: {'n/a' if margin is None else f'{margin:.1f}%'}",
+            f"- EBITDA margin: {'n/a' if not p.income.sum() else f'{p.ebitda.sum() / p.income.sum() * 100:.1f}%'}",
+            "- Fill the YTD actual column as the year progresses."]
+    figures = _figures(data, p) | {"gross_profit": round(float(gross.sum()), 2),
+                                   "operating_expenses": round(float(opex.sum()), 2)}
+    if data.scenarios:
+        s = sweep(data, p)
+        out += ["", *_scenario_table(data, s, p)]
+        figures["scenarios"] = _sweep_figures(s, data.min_balance)
+    summary = (f"Budget {p.months[0]} – {p.months[-1]}: revenue {_money(p.income.sum(), cur)}, gross profit "
+               f"{_money(gross.sum(), cur)}, operating expenses {_money(opex.sum(), cur)}, "
+               f"EBITDA {_money(p.ebitda.sum(), cur)}. Operating cost by category: "
+               + ", ".join(f"{k} {_money(p.costs[v].sum(), cur)}" for k, v in categories.items()))
+    return Document("\n".join(out), figures, "Commentary",
+                    "a short commentary on this budget: where the money goes and the main assumptions to test",
+                    summary=summary)
+
+
+# ── ENGINES ─────────────────────────────────────────────────────────────────
+
+# job type -> (input model, builder, extra keys that mark structured input); see engines.py
+ENGINES: Dict[str, Tuple[type, Callable[..., Document], Tuple[str, ...]]] = {
+    "cashflow_projection": (ModelInput, cashflow, ("revenue",)),
+    "budget_template":     (ModelInput, budget, ("revenue",)),
+}
@@ -1,13 +1,16 @@
 """
 TechCrossIT — The Marketing Agency
 AI content and copywriting team: blogs, email campaigns, social media, SEO, ad copy.
+
+Social packs, email campaigns and product descriptions are written part by part in
+parallel (see marketplace/parts.py).
 """
 
-import os
 import time
-import uuid
-from anthropic import Anthropic
+from marketplace import llm
+from marketplace.context import new_job_id
 from marketplace.models import JobIntake, JobResult, JobStatus
+from marketplace.parts import PARALLEL_PARTS, Part, complete_parts
 
 
 SYSTEM_PROMPT = """You are The Marketing Agency — TechCrossIT's AI content and copywriting team.
@@ -84,9 +87,35 @@ Context: {context}""",
 }
 
 
+# Independent pieces of a deliverable, generated concurrently and assembled in this order.
+_DESCRIPTION_ANGLES = ["the core benefit", "the time or money it saves", "how easy it is to start",
+                       "quality and trust", "the outcome the customer ends up with"]
+
+JOB_PARTS = {
+    "social_media_pack": [
+        Part("LinkedIn", "the LinkedIn post — professional, insight-led, 1-3 short paragraphs, 3-5 hashtags."),
+        Part("X (Twitter)", "the X (Twitter) post — under 280 characters including 1-2 hashtags."),
+        Part("Instagram", "the Instagram caption — hook first line, emoji where natural, up to 10 hashtags."),
+        Part("Facebook", "the Facebook post — conversational, 2-4 sentences, a question or CTA, 1-3 hashtags."),
+        Part("TikTok", "the TikTok caption — punchy, under 150 characters, with trending-style hashtags."),
+    ],
+    "email_campaign": [
+        Part("Email 1 — Welcome / Introduction (day 1)", "Email 1 — Welcome/Introduction (day 1): subject line, preview text, full body copy, and CTA button text."),
+        Part("Email 2 — Value / Education (day 3)", "Email 2 — Value/Education (day 3): subject line, preview text, full body copy, and CTA button text."),
+        Part("Email 3 — Soft CTA / Offer (day 7)", "Email 3 — Soft CTA / Offer (day 7): subject line, preview text, full body copy, and CTA button text."),
+    ],
+    "product_description": [
+        Part(f"Description {i}",
+             f"description {i} of 5, with its SEO-friendly title. If the brief lists several products or services, "
+             f"describe the {ordinal} one; otherwise lead with {angle}, so it differs from the other four.")
+        for i, (ordinal, angle) in enumerate(zip(["first", "second", "third", "fourth", "fifth"], _DESCRIPTION_ANGLES), start=1)
+    ],
+}
+
+
 def run(intake: JobIntake) -> JobResult:
     start = time.time()
-    job_id = str(uuid.uuid4())[:12]
+    job_id = new_job_id()
 
     try:
         prompt_template = JOB_PROMPTS.get(intake.job_type)
@@ -105,16 +134,11 @@ def run(intake: JobIntake) -> JobResult:
             tone=intake.tone or "professional",
         )
 
-        client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-        response = client.messages.create(
-            model="claude-sonnet-4-6",
-            max_tokens=4096,
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": prompt}],
-        )
-
-        output = response.content[0].text
-        tokens = response.usage.input_tokens + response.usage.output_tokens
+        parts = JOB_PARTS.get(intake.job_type) if PARALLEL_PARTS else None
+        if parts:
+            output, tokens = complete_parts(SYSTEM_PROMPT, prompt, parts, job_type=intake.job_type)
+        else:
+            output, tokens = llm.complete(SYSTEM_PROMPT, prompt, job_type=intake.job_type)
         duration = int((time.time() - start) * 1000)
 
         return JobResult(
@@ -126,7 +150,8 @@ def run(intake: JobIntake) -> JobResult:
             metadata={
                 "client": intake.client_name or "Anonymous",
                 "tone": intake.tone,
-                "model": "claude-sonnet-4-6",
+                "model": llm.MODEL,
+                **({"parts": len(parts)} if parts else {}),
             },
             duration_ms=duration,
             tokens_used=tokens,
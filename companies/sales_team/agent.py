@@ -1,13 +1,15 @@
 """
 TechCrossIT — The Sales Team
 AI B2B sales support: prospect research, outreach emails, pitch decks, proposals, competitive analysis.
+
+Follow-up sequences are written email by email in parallel (see marketplace/parts.py).
 """
 
-import os
 import time
-import uuid
-from anthropic import Anthropic
+from marketplace import llm
+from marketplace.context import new_job_id
 from marketplace.models import JobIntake, JobResult, JobStatus
+from marketplace.parts import PARALLEL_PARTS, Part, complete_parts
 
 
 SYSTEM_PROMPT = """You are The Sales Team — TechCrossIT's AI-powered B2B sales unit.
@@ -88,9 +90,19 @@ Context: {context}""",
 }
 
 
+# Independent pieces of a deliverable, generated concurrently and assembled in this order.
+JOB_PARTS = {
+    "followup_sequence": [
+        Part(f"Email {i} (day {day}): {purpose}", f"Email {i} (day {day}) — {purpose}: subject line + full body copy (max 120 words).")
+        for i, (day, purpose) in enumerate([(3, "soft bump"), (7, "add new value / insight"), (14, "different angle / case study"),
+                                            (21, "social proof / urgency"), (30, "graceful breakup")], start=1)
+    ],
+}
+
+
 def run(intake: JobIntake) -> JobResult:
     start = time.time()
-    job_id = str(uuid.uuid4())[:12]
+    job_id = new_job_id()
 
     try:
         prompt_template = JOB_PROMPTS.get(intake.job_type)
@@ -109,16 +121,11 @@ def run(intake: JobIntake) -> JobResult:
             tone=intake.tone or "professional",
         )
 
-        client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-        response = client.messages.create(
-            model="claude-sonnet-4-6",
-            max_tokens=4096,
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": prompt}],
-        )
-
-        output = response.content[0].text
-        tokens = response.usage.input_tokens + response.usage.output_tokens
+        parts = JOB_PARTS.get(intake.job_type) if PARALLEL_PARTS else None
+        if parts:
+            output, tokens = complete_parts(SYSTEM_PROMPT, prompt, parts, job_type=intake.job_type)
+        else:
+            output, tokens = llm.complete(SYSTEM_PROMPT, prompt, job_type=intake.job_type)
         duration = int((time.time() - start) * 1000)
 
         return JobResult(
@@ -130,7 +137,8 @@ def run(intake: JobIntake) -> JobResult:
             metadata={
                 "client": intake.client_name or "Anonymous",
                 "tone": intake.tone,
-                "model": "claude-sonnet-4-6",
+                "model": llm.MODEL,
+                **({"parts": len(parts)} if parts else {}),
             },
             duration_ms=duration,
             tokens_used=tokens,
@@ -0,0 +1,408 @@
+"""
+TechCrossIT — The Sales Team
+Bulk crm_enrichment: enrich a whole CRM export (CSV or JSONL) in one streamed request.
+
+The upload is spooled to a temporary file as it arrives (in memory up to a few MB, then
+on disk). Rows are read back from it incrementally and packed into batches, several rows
+per model call, under a token budget. Batches run concurrently (up to the upstream pool's
+call slots). Each call returns a JSON array with one object per row, and every object is
+checked against the Enrichment schema. A row whose object is missing or invalid is retried
+on its own. Enriched rows are written out as soon as their batch finishes, in completion
+order, with `row` holding the input row number. Reading rows pauses while every slot is
+busy and the client hasn't read the finished rows. Memory stays flat whatever the file
+size.
+
+Config:
+  ENRICH_BATCH_TOKENS=8000        # estimated prompt + output tokens per call
+  ENRICH_BATCH_ROWS=20
+  ENRICH_OUTPUT_TOKENS_PER_ROW=300
+  ENRICH_CONCURRENCY=0            # 0 = the upstream pool's call slots
+  ENRICH_MAX_ROWS=100000
+  ENRICH_MAX_UPLOAD_MB=200
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import IO, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from marketplace import llm, metrics
+from marketplace.context import JobContext, run_in_context
+from marketplace.ledger import ledger
+from marketplace.upstream import pool
+from companies.sales_team.agent import SYSTEM_PROMPT
+
+logger = logging.getLogger(__name__)
+
+ENRICH_BATCH_TOKENS = int(os.environ.get("ENRICH_BATCH_TOKENS", "8000"))
+ENRICH_BATCH_ROWS = int(os.environ.get("ENRICH_BATCH_ROWS", "20"))
+ENRICH_OUTPUT_TOKENS_PER_ROW = int(os.environ.get("ENRICH_OUTPUT_TOKENS_PER_ROW", "300"))
+ENRICH_CONCURRENCY = int(os.environ.get("ENRICH_CONCURRENCY", "0"))
+ENRICH_MAX_ROWS = int(os.environ.get("ENRICH_MAX_ROWS", "100000"))
+ENRICH_MAX_UPLOAD_BYTES = int(float(os.environ.get("ENRICH_MAX_UPLOAD_MB", "200")) * 1024 * 1024)
+
+# Rows longer than this (as JSON) are reported as errors rather than sent.
+MAX_ROW_CHARS = 4000
+# Output tokens per call never exceed this, however many rows are packed.
+MAX_OUTPUT_TOKENS = 8192
+# Uploads are held in memory up to this size while spooling, then moved to disk.
+SPOOL_MEMORY_BYTES = 4 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+
+JOB_TYPE = "crm_enrichment"
+NO_CREDIT = "no credit remaining"
+
+
+# ── SCHEMA ──────────────────────────────────────────────────────────────────
+
+class Enrichment(BaseModel):
+    """What the model must return for each row."""
+    company_profile:   str       = Field(..., min_length=1)
+    employee_estimate: str       = Field(..., min_length=1)
+    sic_code:          str       = Field(..., pattern=r"^\d{4,5}$")
+    tech_stack:        List[str] = Field(default_factory=list)
+    linkedin_url:      str       = Field(..., pattern=r"^https://(www\.)?linkedin\.com/company/[\w\-%.]+/?$")
+    revenue_band:      str       = Field(..., min_length=1)
+    call_notes:        List[str] = Field(..., min_length=3, max_length=3)
+
+    @field_validator("sic_code", mode="before")
+    @classmethod
+    def _sic_as_text(cls, value: Any) -> Any:
+        return str(value) if isinstance(value, int) else value
+
+
+ENRICHED_COLUMNS = list(Enrichment.model_fields)
+ERROR_COLUMN = "enrichment_error"
+
+BATCH_PROMPT = """Enrich each of the following CRM records with research-based data.
+For every record return an object with these keys:
+  "row" (the record's row number), "company_profile" (2-3 sentences), "employee_estimate" (e.g. "50-200"),
+  "sic_code" (UK SIC 2007, digits only), "tech_stack" (list of signals), "linkedin_url"
+  (https://www.linkedin.com/company/<slug>), "revenue_band" (e.g. "£1m-£5m"), "call_notes" (exactly 3 strings
+  a sales rep should know before calling).
+Reply with only a JSON array containing one object per record, no prose.
+Context: {context}
+
+Records (one JSON object per line):
+{records}"""
+
+
+@dataclass
+class Row:
+    number:  int
+    record:  Dict[str, Any]
+    error:   Optional[str] = None       # set when the input row itself is unusable
+
+
+@dataclass
+class EnrichedRow:
+    number:     int
+    record:     Dict[str, Any]
+    enrichment: Optional[Enrichment] = None
+    error:      Optional[str] = None
+    retried:    bool = False
+
+
+# ── INPUT ───────────────────────────────────────────────────────────────────
+
+async def file_chunks(f: IO[bytes]) -> AsyncIterator[bytes]:
+    """Read a spooled upload back in chunks without blocking the event loop."""
+    while True:
+        chunk = await run_in_threadpool(f.read, READ_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode an upload incrementally and yield its lines (with line endings)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def read_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """Rows of a CSV upload keyed by its header. Quoted fields may span lines."""
+    header: Optional[List[str]] = None
+    record, number = "", 0
+    async for line in _lines(chunks):
+        record += line
+        if record.count('"') % 2:
+            continue                    # inside a quoted field
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not any(v.strip() for v in values):
+            continue
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        number += 1
+        row = Row(number, dict(zip(header, values)))
+        if len(values) > len(header):
+            row.error = f"{len(values)} fields but the header has {len(header)}"
+        yield row
+    if record.strip():
+        yield Row(number + 1, {}, "unterminated quoted field")
+
+
+async def read_jsonl(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """One JSON object per line."""
+    number = 0
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield Row(number, {}, f"invalid JSON: {e.msg}")
+            continue
+        if isinstance(record, dict):
+            yield Row(number, record)
+        else:
+            yield Row(number, {}, "each line must be a JSON object")
+
+
+# ── BATCHING ────────────────────────────────────────────────────────────────
+
+def _line(row: Row) -> str:
+    return json.dumps({"row": row.number, "record": row.record}, ensure_ascii=False, default=str)
+
+
+def row_tokens(row: Row) -> int:
+    """Estimated prompt + output tokens the row adds to a call."""
+    return len(_line(row)) // llm.CHARS_PER_TOKEN + ENRICH_OUTPUT_TOKENS_PER_ROW
+
+
+async def batches(rows: AsyncIterator[Row], rejected: asyncio.Queue) -> AsyncIterator[List[Row]]:
+    """
+    Pack rows into batches of at most ENRICH_BATCH_ROWS rows and ENRICH_BATCH_TOKENS
+    estimated tokens. Unusable rows go straight to `rejected`.
+    """
+    batch: List[Row] = []
+    budget = 0
+    async for row in rows:
+        if row.number > ENRICH_MAX_ROWS:
+            await rejected.put(EnrichedRow(row.number, row.record, error=f"beyond the {ENRICH_MAX_ROWS}-row limit"))
+            break
+        if not row.error and len(_line(row)) > MAX_ROW_CHARS:
+            row.error = f"row is longer than {MAX_ROW_CHARS} characters"
+        if row.error:
+            await rejected.put(EnrichedRow(row.number, row.record, error=row.error))
+            continue
+        cost = row_tokens(row)
+        if batch and (len(batch) >= ENRICH_BATCH_ROWS or budget + cost > ENRICH_BATCH_TOKENS):
+            yield batch
+            batch, budget = [], 0
+        batch.append(row)
+        budget += cost
+    if batch:
+        yield batch
+
+
+# ── MODEL CALLS ─────────────────────────────────────────────────────────────
+
+def parse_output(output: str) -> Dict[int, Any]:
+    """Objects in the model's JSON array, by row number. Empty if the array can't be read."""
+    start, end = output.find("["), output.rfind("]")
+    if start < 0 or end < start:
+        return {}
+    try:
+        items = json.loads(output[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    found = {}
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and isinstance(item.get("row"), int):
+            found[item.pop("row")] = item
+    return found
+
+
+def _validate(item: Any) -> Tuple[Optional[Enrichment], Optional[str]]:
+    if item is None:
+        return None, "missing from the model's output"
+    try:
+        return Enrichment.model_validate(item), None
+    except ValidationError as e:
+        first = e.errors()[0]
+        return None, f"{'.'.join(str(p) for p in first['loc']) or 'row'}: {first['msg']}"
+
+
+def _call(rows: List[Row], context: str, client_name: Optional[str]) -> Dict[int, Any]:
+    prompt = BATCH_PROMPT.format(context=context, records="\n".join(_line(r) for r in rows))
+    max_tokens = min(MAX_OUTPUT_TOKENS, 512 + 2 * ENRICH_OUTPUT_TOKENS_PER_ROW * len(rows))
+    output, tokens = llm.complete(SYSTEM_PROMPT, prompt, max_tokens=max_tokens, job_type=JOB_TYPE)
+    ledger.record(client_name, "sales_team", JOB_TYPE, llm.MODEL, tokens)
+    metrics.incr("enrich_calls")
+    return parse_output(output)
+
+
+def enrich_batch(rows: List[Row], context: str, client_name: Optional[str]) -> List[EnrichedRow]:
+    """
+    One call for the batch, then one call per row it didn't answer validly. Credit is checked
+    before every call, so a long upload stops spending once the client's balance runs out.
+    """
+    if not ledger.has_credit(client_name):
+        metrics.incr("enrich_refused_credit")
+        return [EnrichedRow(row.number, row.record, error=NO_CREDIT) for row in rows]
+    try:
+        found = _call(rows, context, client_name)
+    except Exception as e:
+        logger.warning("Enrichment batch of %d rows failed: %s", len(rows), e)
+        found = {}
+    done = []
+    for row in rows:
+        enrichment, error = _validate(found.get(row.number))
+        retried = False
+        if error and len(rows) > 1 and not ledger.has_credit(client_name):
+            error = NO_CREDIT
+        elif error and len(rows) > 1:
+            retried = True
+            metrics.incr("enrich_row_retries")
+            try:
+                enrichment, error = _validate(_call([row], context, client_name).get(row.number))
+            except Exception as e:
+                error = f"model call failed: {e}"
+        done.append(EnrichedRow(row.number, row.record, enrichment, error, retried))
+    return done
+
+
+# ── ORCHESTRATION ───────────────────────────────────────────────────────────
+
+_DONE = object()
+
+
+async def enrich(rows: AsyncIterator[Row], ctx: JobContext, context: Optional[str] = None,
+                 client_name: Optional[str] = None) -> AsyncIterator[EnrichedRow]:
+    """
+    Enrich rows as they are read, yielding each as soon as its batch finishes.
+    At most `concurrency` batches are in flight, and finished rows wait in a bounded
+    queue, so a slow reader pauses the upload rather than growing memory. Closing the
+    iterator cancels the outstanding model calls through `ctx`.
+    """
+    concurrency = ENRICH_CONCURRENCY or max(1, int(pool.capacity()))
+    context = context or "No additional context provided."
+    finished: asyncio.Queue = asyncio.Queue(maxsize=concurrency * ENRICH_BATCH_ROWS)
+    slots = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    running = set()
+
+    async def run(batch: List[Row]) -> None:
+        try:
+            done = await loop.run_in_executor(None, run_in_context, ctx, enrich_batch, batch, context, client_name)
+            for row in done:
+                await finished.put(row)
+        finally:
+            slots.release()
+
+    async def produce() -> None:
+        try:
+            async for batch in batches(rows, finished):
+                await slots.acquire()
+                if ctx.cancelled:
+                    slots.release()
+                    break
+                task = asyncio.create_task(run(batch))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            await finished.put(_DONE)
+            raise
+        await finished.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            row = await finished.get()
+            if row is _DONE:
+                break
+            metrics.incr("enrich_rows_failed" if row.error else "enrich_rows")
+            yield row
+        await producer          # surfaces a failure reading the upload
+    finally:
+        if not producer.done():
+            ctx.cancel("client_disconnected")
+            producer.cancel()
+            for task in list(running):
+                task.cancel()
+
+
+# ── OUTPUT ──────────────────────────────────────────────────────────────────
+
+def flatten(row: EnrichedRow) -> Dict[str, Any]:
+    """Input fields plus enrichment fields, with lists joined for CSV."""
+    out = dict(row.record)
+    out["row"] = row.number
+    if row.enrichment:
+        for key, value in row.enrichment.model_dump().items():
+            out[key] = "; ".join(value) if isinstance(value, list) else value
+    out[ERROR_COLUMN] = row.error or ""
+    return out
+
+
+def as_json(row: EnrichedRow) -> str:
+    return json.dumps({"row": row.number, "record": row.record,
+                       "enrichment": row.enrichment.model_dump() if row.enrichment else None,
+                       "error": row.error, "retried": row.retried}, ensure_ascii=False, default=str) + "\n"
+
+
+class CsvWriter:
+    """
+    Formats rows as CSV. Columns are fixed by the first row that has input fields: those
+    fields, then the enrichment. Rows without any (unreadable input lines) are held back
+    until then, so they can't leave every later row without its input columns; finish()
+    writes out any still held when the upload had no readable row.
+    """
+
+    def __init__(self):
+        self.columns: Optional[List[str]] = None
+        self._held: List[EnrichedRow] = []
+
+    def write(self, row: EnrichedRow) -> str:
+        if self.columns is None and not row.record:
+            self._held.append(row)
+            return ""
+        buffer = io.StringIO()
+        if self.columns is None:
+            inputs = [k for k in row.record if k not in ENRICHED_COLUMNS and k not in ("row", ERROR_COLUMN)]
+            self._start(buffer, inputs)
+        writer = csv.DictWriter(buffer, self.columns, extrasaction="ignore")
+        for held in self._held:
+            writer.writerow(flatten(held))
+        self._held = []
+        writer.writerow(flatten(row))
+        return buffer.getvalue()
+
+    def finish(self) -> str:
+        if self.columns is not None:
+            return ""
+        buffer = io.StringIO()
+        self._start(buffer, [])
+        writer = csv.DictWriter(buffer, self.columns, extrasaction="ignore")
+        for held in self._held:
+            writer.writerow(flatten(held))
+        self._held = []
+        return buffer.getvalue()
+
+    def _start(self, buffer: io.StringIO, inputs: List[str]) -> None:
+        self.columns = ["row"] + inputs + ENRICHED_COLUMNS + [ERROR_COLUMN]
+        csv.writer(buffer).writerow(self.columns)
@@ -1,13 +1,24 @@
 """
 TechCrossIT — The Support Desk
 AI customer support team: ticket triage, responses, FAQs, knowledge base, reports.
+
+Responses, FAQs and KB entries draw on past deliverables and uploaded KB documents
+(see retrieval.py). Send extra={"fresh": true} to skip reusing a previous answer.
+Confident ticket triages are answered by a local classifier (see triage.py).
 """
 
-import os
+import logging
+import random
 import time
-import uuid
-from anthropic import Anthropic
+from typing import Any, Dict, Optional, Tuple
+
+from marketplace import llm, metrics
+from marketplace.context import new_job_id
 from marketplace.models import JobIntake, JobResult, JobStatus
+from companies.support_desk import retrieval, triage
+from companies.support_desk.retrieval import knowledge
+
+logger = logging.getLogger(__name__)
 
 
 SYSTEM_PROMPT = """You are The Support Desk — TechCrossIT's AI customer support team.
@@ -113,9 +124,61 @@ Context: {context}""",
 }
 
 
+REFERENCE_INTRO = """
+
+Relevant material from our existing help content. Reuse its wording and facts where they
+answer this request, correct anything that doesn't fit, and don't pad the response:
+
+"""
+
+
+def _retrieve(intake: JobIntake, prompt: str) -> Tuple[str, Optional[retrieval.Hit], Dict[str, Any]]:
+    """(prompt with reference material, reusable previous answer or None, retrieval metadata)."""
+    request = f"{intake.brief}\n{intake.context or ''}"
+    if not (intake.extra or {}).get("fresh"):
+        reused = knowledge.reuse(intake.client_name, intake.job_type, intake.tone, request)
+        if reused:
+            return prompt, reused, {"mode": "direct", "source": reused.doc_id, "confidence": reused.confidence}
+
+    hits = knowledge.search(request, min_confidence=retrieval.SUPPORT_RETRIEVAL_MIN_CONFIDENCE,
+                            client=intake.client_name)
+    if not hits:
+        return prompt, None, {"mode": "none"}
+    return (prompt + REFERENCE_INTRO + retrieval.reference_block(hits), None,
+            {"mode": "augmented", "sources": [h.doc_id for h in hits],
+             "confidence": [h.confidence for h in hits]})
+
+
+def _triage(intake: JobIntake, job_id: str, prompt: str) -> Tuple[str, int, str, Dict[str, Any]]:
+    """(output, tokens, model, triage metadata): the classifier when confident, else the model."""
+    text = triage.ticket_text(intake.brief, intake.context)
+    labels, confidence = triage.classifier.classify(text)
+    rounded = {field: round(p, 3) for field, p in confidence.items()}
+    if labels and random.random() >= triage.TRIAGE_AUDIT_RATE:
+        metrics.incr("triage_local")
+        return triage.render(labels, intake.brief), 0, "triage-classifier", {"mode": "local", "confidence": rounded}
+
+    output, tokens = llm.complete(SYSTEM_PROMPT, prompt, job_type=intake.job_type)
+    parsed = triage.parse_labels(output)
+    try:
+        triage.examples.record(job_id, text, parsed)
+    except Exception:
+        logger.exception("Recording triage example %s failed", job_id)
+    if labels:
+        # Audit of a confident prediction: the model's answer is returned and compared.
+        metrics.incr("triage_audited")
+        for field, label in labels.items():
+            if parsed.get(field):
+                metrics.incr(f"triage_audit_{field}_checked")
+                metrics.incr(f"triage_audit_{field}_agreed", int(parsed[field] == label))
+        return output, tokens, llm.MODEL, {"mode": "audited", "confidence": rounded}
+    metrics.incr("triage_model")
+    return output, tokens, llm.MODEL, {"mode": "model", "confidence": rounded}
+
+
 def run(intake: JobIntake) -> JobResult:
     start = time.time()
-    job_id = str(uuid.uuid4())[:12]
+    job_id = new_job_id()
 
     try:
         prompt_template = JOB_PROMPTS.get(intake.job_type)
@@ -134,29 +197,40 @@ def run(intake: JobIntake) -> JobResult:
             tone=intake.tone or "friendly",
         )
 
-        client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-        response = client.messages.create(
-            model="claude-sonnet-4-6",
-            max_tokens=4096,
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": prompt}],
-        )
-
-        output = response.content[0].text
-        tokens = response.usage.input_tokens + response.usage.output_tokens
+        uses_retrieval = retrieval.SUPPORT_RETRIEVAL and intake.job_type in retrieval.RETRIEVAL_JOBS
+        reused, found = None, None
+        if uses_retrieval:
+            prompt, reused, found = _retrieve(intake, prompt)
+
+        if reused:
+            output, tokens, model = reused.text, 0, "retrieval"
+        elif intake.job_type == "triage_ticket" and triage.TRIAGE_CLASSIFIER:
+            output, tokens, model, found = _triage(intake, job_id, prompt)
+        else:
+            output, tokens = llm.complete(SYSTEM_PROMPT, prompt, job_type=intake.job_type)
+            model = llm.MODEL
+            if uses_retrieval and intake.client_name:
+                try:
+                    knowledge.add_output(intake.client_name, intake.job_type, intake.tone,
+                                         intake.brief, intake.context, output)
+                except Exception:
+                    logger.exception("Indexing support output %s failed", job_id)
         duration = int((time.time() - start) * 1000)
 
+        metadata = {
+            "client": intake.client_name or "Anonymous",
+            "tone": intake.tone,
+            "model": model,
+        }
+        if found:
+            metadata["triage" if intake.job_type == "triage_ticket" else "retrieval"] = found
         return JobResult(
             job_id=job_id,
             company_id="support_desk",
             job_type=intake.job_type,
             status=JobStatus.DONE,
             output=output,
-            metadata={
-                "client": intake.client_name or "Anonymous",
-                "tone": intake.tone,
-                "model": "claude-sonnet-4-6",
-            },
+            metadata=metadata,
             duration_ms=duration,
             tokens_used=tokens,
         )
@@ -0,0 +1,409 @@
+"""
+TechCrossIT — The Support Desk
+Local retrieval over past support deliverables and uploaded KB documents.
+
+Completed draft_response / write_faq / knowledge_base_entry outputs and documents uploaded
+through POST /marketplace/support/kb are split into passages and kept in an in-memory BM25
+inverted index. Adding a document only touches the postings of its own terms, so updates
+are incremental and queries score just the postings of the query's terms (well under a
+millisecond for ~10,000 passages).
+
+Two uses before a job is sent to the model:
+  - direct answer: a previous job of the same type and tone whose request (brief + context)
+    is near-identical to this one is returned as-is, with no model call;
+  - augmentation: otherwise the best-matching passages are added to the prompt as reference
+    material, so the model adapts existing wording instead of writing from scratch.
+
+Past outputs belong to the client that ordered them: they are only reused or retrieved for
+that same client_name, and outputs of jobs without one are not indexed. Uploaded KB
+documents are shared by every client.
+
+Confidence is the IDF-weighted share of query terms a passage contains (0-1). A direct
+answer needs that share in both directions — this request covers the old one and vice versa.
+
+Documents are persisted in SQLite. Every worker tails the table (rows with a higher id than
+it has seen, at most once per SUPPORT_KB_REFRESH_SECONDS), so documents added by one worker
+reach the others without a rebuild.
+
+Config:
+  SUPPORT_RETRIEVAL=on | off
+  SUPPORT_KB_PATH=data/support_kb.db
+  SUPPORT_RETRIEVAL_DIRECT=0.9           (confidence for a direct answer; above 1 = never)
+  SUPPORT_RETRIEVAL_MIN_CONFIDENCE=0.35  (confidence for a passage to be injected)
+  SUPPORT_RETRIEVAL_PASSAGES=3
+  SUPPORT_KB_MAX_DOCS=20000              (newest documents kept in memory)
+"""
+
+import hashlib
+import heapq
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUPPORT_RETRIEVAL = os.environ.get("SUPPORT_RETRIEVAL", "on").lower() == "on"
+SUPPORT_KB_PATH = os.environ.get("SUPPORT_KB_PATH", "data/support_kb.db")
+SUPPORT_RETRIEVAL_DIRECT = float(os.environ.get("SUPPORT_RETRIEVAL_DIRECT", "0.9"))
+SUPPORT_RETRIEVAL_MIN_CONFIDENCE = float(os.environ.get("SUPPORT_RETRIEVAL_MIN_CONFIDENCE", "0.35"))
+SUPPORT_RETRIEVAL_PASSAGES = int(os.environ.get("SUPPORT_RETRIEVAL_PASSAGES", "3"))
+SUPPORT_KB_MAX_DOCS = int(os.environ.get("SUPPORT_KB_MAX_DOCS", "20000"))
+SUPPORT_KB_REFRESH_SECONDS = float(os.environ.get("SUPPORT_KB_REFRESH_SECONDS", "1"))
+
+# Job types whose outputs are indexed and which use retrieval.
+RETRIEVAL_JOBS = {"draft_response", "write_faq", "knowledge_base_entry"}
+
+# Passages are whole paragraphs, merged up to about this size.
+PASSAGE_CHARS = 800
+# Upper bound on reference material added to one prompt.
+MAX_INJECTED_CHARS = 2400
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Terms in more than this share of passages don't make a passage a candidate on their own.
+COMMON_TERM_SHARE = 0.01
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a about an and are as at be but by can do does for from has have how i if in is it its me my
+no not of on or our so that the their them then there they this to was we what when where
+which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens without stopwords; a trailing plural "s" is dropped."""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if len(token) < 2 or token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def split_passages(text: str, size: int = PASSAGE_CHARS) -> List[str]:
+    """Paragraphs, merged while they fit in `size` (a longer paragraph is its own passage)."""
+    passages, current = [], ""
+    for paragraph in (p.strip() for p in re.split(r"\n\s*\n", text)):
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > size:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+# ── INDEX ───────────────────────────────────────────────────────────────────
+
+class BM25Index:
+    """Inverted index with incremental add / remove. Not thread-safe on its own."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}     # term -> {entry id: term frequency}
+        self.lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, entry_id: int, terms: List[str]) -> None:
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, {})[entry_id] = tf
+        self.lengths[entry_id] = len(terms)
+        self.total_length += len(terms)
+
+    def remove(self, entry_id: int, terms: Iterable[str]) -> None:
+        for term in set(terms):
+            entries = self.postings.get(term)
+            if entries is not None:
+                entries.pop(entry_id, None)
+                if not entries:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(entry_id, 0)
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.lengths) - df + 0.5) / (df + 0.5))
+
+    def search(self, terms: Iterable[str], k: int,
+               accept: Optional[Callable[[int], bool]] = None) -> List[Tuple[float, int]]:
+        """
+        Top k (score, entry id) for the query terms, among the entries `accept` allows. Only
+        entries containing at least one of the query's rarer terms are candidates; terms found
+        in more than COMMON_TERM_SHARE of all entries just add to candidates' scores instead of
+        walking their long postings.
+        """
+        if not self.lengths:
+            return []
+        avg_length = self.total_length / len(self.lengths) or 1.0
+        base, per_token = BM25_K1 * (1 - BM25_B), BM25_K1 * BM25_B / avg_length
+        lengths = self.lengths
+        found = sorted((len(self.postings[t]), t) for t in set(terms) if t in self.postings)
+        if not found:
+            return []
+        common = len(lengths) * COMMON_TERM_SHARE
+        scores: Dict[int, float] = {}
+        for df, term in found:
+            entries = self.postings[term]
+            weight = self.idf(term) * (BM25_K1 + 1)
+            if df <= common or not scores:
+                for entry_id, tf in entries.items():
+                    scores[entry_id] = scores.get(entry_id, 0.0) + weight * tf / (tf + base + per_token * lengths[entry_id])
+            else:
+                for entry_id in scores:
+                    tf = entries.get(entry_id)
+                    if tf:
+                        scores[entry_id] += weight * tf / (tf + base + per_token * lengths[entry_id])
+        return heapq.nlargest(k, ((s, e) for e, s in scores.items() if accept is None or accept(e)))
+
+
+@dataclass
+class Passage:
+    doc_id: int
+    title: str
+    text: str
+    terms: FrozenSet[str]
+
+
+@dataclass
+class Document:
+    doc_id: int
+    source: str                    # "output" | "kb"
+    client: Optional[str]          # client whose job produced it (outputs only)
+    job_type: Optional[str]
+    tone: Optional[str]
+    title: str
+    body: str
+    request_terms: List[str]       # brief + context of the job that produced it (outputs only)
+    passage_ids: List[int]
+
+
+@dataclass
+class Hit:
+    doc_id: int
+    title: str
+    text: str
+    score: float
+    confidence: float
+
+
+# ── KNOWLEDGE BASE ──────────────────────────────────────────────────────────
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kb_docs (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    source     TEXT NOT NULL,
+    job_type   TEXT,
+    tone       TEXT,
+    title      TEXT NOT NULL,
+    request    TEXT,
+    body       TEXT NOT NULL,
+    sha256     TEXT NOT NULL UNIQUE
+);
+"""
+# Added after the first release; outputs stored before it have no owner and are never served.
+_MIGRATIONS = ["ALTER TABLE kb_docs ADD COLUMN client TEXT"]
+
+
+def _coverage(index: BM25Index, query: Iterable[str], terms: Iterable[str], indexed_only: bool = False) -> float:
+    """
+    IDF-weighted share of the query's distinct terms that appear in `terms`. With
+    indexed_only, terms no document contains are left out (they can't match anything).
+    """
+    query, present = set(query), set(terms)
+    if indexed_only:
+        query = {t for t in query if t in index.postings}
+    total = sum(index.idf(t) for t in query)
+    return sum(index.idf(t) for t in query & present) / total if total else 0.0
+
+
+class SupportKnowledge:
+    """Persisted documents plus the in-memory passage and request indexes built from them."""
+
+    def __init__(self, path: str = SUPPORT_KB_PATH, max_docs: int = SUPPORT_KB_MAX_DOCS):
+        self.path = path
+        self.max_docs = max_docs
+        self.passages = BM25Index()
+        self.requests = BM25Index()           # request text of past outputs, for direct answers
+        self._docs: "OrderedDict[int, Document]" = OrderedDict()
+        self._passages: Dict[int, Passage] = {}
+        self._next_passage = 0
+        self._last_id = 0
+        self._refreshed = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(kb_docs)")}
+            if "client" not in columns:
+                for statement in _MIGRATIONS:
+                    conn.execute(statement)
+            self._local.conn = conn
+        return conn
+
+    # ── loading ──
+
+    def _index(self, row: tuple) -> None:
+        doc_id, source, client, job_type, tone, title, request, body = row
+        passage_ids = []
+        for text in split_passages(body):
+            terms = tokenize(f"{title}\n{text}")
+            if not terms:
+                continue
+            passage_id, self._next_passage = self._next_passage, self._next_passage + 1
+            self._passages[passage_id] = Passage(doc_id, title, text, frozenset(terms))
+            self.passages.add(passage_id, terms)
+            passage_ids.append(passage_id)
+        request_terms = tokenize(request) if request else []
+        if request_terms:
+            self.requests.add(doc_id, request_terms)
+        self._docs[doc_id] = Document(doc_id, source, client, job_type, tone, title, body, request_terms, passage_ids)
+        self._last_id = max(self._last_id, doc_id)
+        while len(self._docs) > self.max_docs:
+            self._evict(next(iter(self._docs)))
+
+    def _evict(self, doc_id: int) -> None:
+        doc = self._docs.pop(doc_id)
+        for passage_id in doc.passage_ids:
+            self.passages.remove(passage_id, self._passages.pop(passage_id).terms)
+        if doc.request_terms:
+            self.requests.remove(doc_id, doc.request_terms)
+
+    def refresh(self, force: bool = False) -> None:
+        """Index rows added since the last refresh (by any worker)."""
+        now = time.monotonic()
+        if not force and self._ready and now - self._refreshed < SUPPORT_KB_REFRESH_SECONDS:
+            return
+        with self._lock:
+            self._refreshed = now
+            if not self._ready:
+                # Cold start: only the newest max_docs rows are ever kept.
+                floor = self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM kb_docs").fetchone()[0]
+                self._last_id = max(0, floor - self.max_docs)
+                self._ready = True
+            rows = self._conn().execute(
+                "SELECT id, source, client, job_type, tone, title, request, body FROM kb_docs WHERE id > ? ORDER BY id",
+                (self._last_id,),
+            ).fetchall()
+            for row in rows:
+                self._index(row)
+
+    # ── writing ──
+
+    def add(self, title: str, body: str, source: str = "kb", job_type: Optional[str] = None,
+            tone: Optional[str] = None, request: Optional[str] = None,
+            client: Optional[str] = None) -> Tuple[int, bool]:
+        """Persist and index a document. Returns (id, created); identical content is stored once."""
+        digest = hashlib.sha256(
+            f"{source}\0{client}\0{job_type}\0{tone}\0{title}\0{request}\0{body}".encode()).hexdigest()
+        conn = self._conn()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO kb_docs (created_at, source, client, job_type, tone, title, request, body, sha256) "
+            "VALUES (?,?,?,?,?,?,?,?,?)",
+            (time.time(), source, client, job_type, tone, title, request, body, digest),
+        )
+        created = cursor.rowcount == 1
+        doc_id = cursor.lastrowid if created else \
+            conn.execute("SELECT id FROM kb_docs WHERE sha256 = ?", (digest,)).fetchone()[0]
+        self.refresh(force=True)
+        return doc_id, created
+
+    def add_output(self, client: str, job_type: str, tone: Optional[str], brief: str, context: Optional[str],
+                   output: str) -> int:
+        """Index a finished job's output, visible only to `client` (required: see the module notes)."""
+        if not client:
+            raise ValueError("Outputs are only indexed for a named client.")
+        doc_id, _ = self.add(title=brief.strip().splitlines()[0][:120] if brief.strip() else job_type,
+                             body=output, source="output", job_type=job_type, tone=tone,
+                             request=f"{brief}\n{context or ''}", client=client)
+        return doc_id
+
+    # ── querying ──
+
+    def _visible(self, doc_id: int, client: Optional[str]) -> bool:
+        """KB documents are shared; an output only to the client it was written for."""
+        doc = self._docs[doc_id]
+        return doc.source == "kb" or (client is not None and doc.client == client)
+
+    def search(self, query: str, k: int = SUPPORT_RETRIEVAL_PASSAGES, min_confidence: float = 0.0,
+               client: Optional[str] = None) -> List[Hit]:
+        """Best passages for the query that `client` may see, at most one per document."""
+        self.refresh()
+        terms = tokenize(query)
+        hits, seen = [], set()
+        with self._lock:
+            accept = lambda passage_id: self._visible(self._passages[passage_id].doc_id, client)
+            for score, passage_id in self.passages.search(terms, k * 4, accept):
+                passage = self._passages[passage_id]
+                if passage.doc_id in seen:
+                    continue
+                confidence = _coverage(self.passages, terms, passage.terms, indexed_only=True)
+                if confidence < min_confidence:
+                    continue
+                seen.add(passage.doc_id)
+                hits.append(Hit(passage.doc_id, passage.title, passage.text, round(score, 3), round(confidence, 3)))
+                if len(hits) == k:
+                    break
+        return hits
+
+    def reuse(self, client: Optional[str], job_type: str, tone: Optional[str], request: str,
+              threshold: float = SUPPORT_RETRIEVAL_DIRECT) -> Optional[Hit]:
+        """The client's own previous output for a near-identical request of the same job type and tone."""
+        if threshold > 1 or not client:
+            return None
+        self.refresh()
+        terms = tokenize(request)
+        with self._lock:
+            for score, doc_id in self.requests.search(terms, 5, lambda d: self._docs[d].client == client):
+                doc = self._docs[doc_id]
+                if doc.job_type != job_type or doc.tone != tone:
+                    continue
+                confidence = min(_coverage(self.requests, terms, doc.request_terms),
+                                 _coverage(self.requests, doc.request_terms, terms))
+                if confidence >= threshold:
+                    return Hit(doc_id, doc.title, doc.body, round(score, 3), round(confidence, 3))
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        self.refresh()
+        with self._lock:
+            sources = Counter(doc.source for doc in self._docs.values())
+            return {"documents": len(self._docs), "passages": len(self.passages),
+                    "terms": len(self.passages.postings), "outputs": sources["output"], "kb": sources["kb"]}
+
+
+knowledge = SupportKnowledge()
+
+
+def reference_block(hits: List[Hit], budget: int = MAX_INJECTED_CHARS) -> str:
+    """Passages formatted for the prompt, cut to `budget` characters in total."""
+    parts = []
+    for i, hit in enumerate(hits, 1):
+        text = hit.text[:budget]
+        budget -= len(text)
+        parts.append(f"[{i}] {hit.title}\n{text}")
+        if budget <= 0:
+            break
+    return "\n\n".join(parts)
@@ -0,0 +1,298 @@
+"""
+TechCrossIT — The Support Desk
+Local fast path for triage_ticket: a linear classifier over hashed word n-grams.
+
+Every triage the model performs is kept as a training example: the ticket text plus the
+priority, category, sentiment and team parsed from the model's output. These live in
+SQLite, not the job store, which doesn't keep briefs. `python -m tools.train_triage`
+fits one softmax regression per field on those examples. It reports holdout accuracy
+and coverage at a range of thresholds, then writes the model file that workers load
+(and reload when it changes).
+
+At request time the ticket is hashed into the same features. If every field's top
+probability clears TRIAGE_MIN_CONFIDENCE, the triage is rendered locally in about a
+millisecond: SLA and resolution path from the predicted labels, summary from the ticket's
+opening sentences. Anything less confident goes to the model as before. TRIAGE_AUDIT_RATE
+of confident tickets go to the model anyway, and the agreement is counted, so live
+accuracy shows in /marketplace/metrics (triage_audit_*).
+
+Config:
+  TRIAGE_CLASSIFIER=on | off
+  TRIAGE_MODEL_PATH=data/triage_model.npz
+  TRIAGE_EXAMPLES_PATH=data/triage_examples.db
+  TRIAGE_MIN_CONFIDENCE=0.85
+  TRIAGE_AUDIT_RATE=0.02
+"""
+
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRIAGE_CLASSIFIER = os.environ.get("TRIAGE_CLASSIFIER", "on").lower() == "on"
+TRIAGE_MODEL_PATH = os.environ.get("TRIAGE_MODEL_PATH", "data/triage_model.npz")
+TRIAGE_EXAMPLES_PATH = os.environ.get("TRIAGE_EXAMPLES_PATH", "data/triage_examples.db")
+TRIAGE_MIN_CONFIDENCE = float(os.environ.get("TRIAGE_MIN_CONFIDENCE", "0.85"))
+TRIAGE_AUDIT_RATE = float(os.environ.get("TRIAGE_AUDIT_RATE", "0.02"))
+
+# Hash buckets = 2 ** HASH_BITS (weights: buckets × classes float32 per field).
+HASH_BITS = 17
+# Check the model file for a newer version at most this often.
+RELOAD_CHECK_SECONDS = 30
+
+# Label sets, in the order the triage prompt lists them.
+FIELDS: Dict[str, List[str]] = {
+    "priority":  ["P1", "P2", "P3", "P4"],
+    "category":  ["Bug", "Billing", "Account", "Feature Request", "How-To", "Complaint", "Other"],
+    "sentiment": ["Angry", "Frustrated", "Neutral", "Happy"],
+    "team":      ["Technical", "Billing", "Customer Success", "Management"],
+}
+
+SLA_HOURS = {"P1": 1, "P2": 4, "P3": 24, "P4": 72}
+
+RESOLUTION_PATHS = {
+    "Bug":             "Reproduce the issue, collect logs / steps, and raise it with engineering; update the customer with the fix or workaround.",
+    "Billing":         "Check the account's invoices and payment history, correct any error, and confirm the outcome (refund / credit) in writing.",
+    "Account":         "Verify the customer's identity, make the account change or restore access, and confirm once complete.",
+    "Feature Request": "Log the request with product, share any existing workaround, and tell the customer how requests are prioritised.",
+    "How-To":          "Send step-by-step instructions or the relevant help article, and confirm the customer can complete the task.",
+    "Complaint":       "Acknowledge the experience, investigate what went wrong, and agree a remedy with the customer.",
+    "Other":           "Clarify the request with the customer and route it to the right team.",
+}
+
+
+# ── FEATURES ────────────────────────────────────────────────────────────────
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def features(text: str, bits: int = HASH_BITS) -> Tuple[np.ndarray, np.ndarray]:
+    """(bucket indexes, values): word unigrams and bigrams plus tone cues, L2-normalised."""
+    words = _WORD.findall(text.lower())
+    grams = {f"w:{w}" for w in words}
+    grams.update(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+    if "!" in text:
+        grams.add(f"f:excl{min(text.count('!'), 3)}")
+    if sum(1 for w in text.split() if len(w) > 2 and w.isupper()) >= 2:
+        grams.add("f:caps")
+    grams.add(f"f:len{min(len(words) // 25, 8)}")
+    mask = (1 << bits) - 1
+    index = np.unique(np.fromiter((zlib.crc32(g.encode()) & mask for g in grams), dtype=np.int64, count=len(grams)))
+    return index, np.full(len(index), 1 / np.sqrt(len(index)), dtype=np.float32)
+
+
+def parse_labels(output: str) -> Dict[str, Optional[str]]:
+    """Triage fields from the model's output; None where a field can't be read."""
+    labels: Dict[str, Optional[str]] = {field: None for field in FIELDS}
+    for line in output.splitlines():
+        lower = line.lower()
+        if labels["priority"] is None and "priority" in lower:
+            match = re.search(r"\bP([1-4])\b", line)
+            labels["priority"] = f"P{match.group(1)}" if match else None
+        for field, key in (("category", "category"), ("sentiment", "sentiment"), ("team", "assignee")):
+            if labels[field] is None and key in lower:
+                value = lower.split(":", 1)[-1]
+                labels[field] = next((c for c in sorted(FIELDS[field], key=len, reverse=True)
+                                      if c.lower() in value), None)
+    return labels
+
+
+def summarise(text: str, sentences: int = 2, limit: int = 300) -> str:
+    """The ticket's opening sentences — the fast path doesn't paraphrase."""
+    parts = re.split(r"(?<=[.!?])\s+", " ".join(text.split()))
+    summary = " ".join(parts[:sentences])
+    return summary if len(summary) <= limit else summary[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def render(labels: Dict[str, str], ticket: str) -> str:
+    """Triage in the layout the model uses."""
+    hours = SLA_HOURS[labels["priority"]]
+    return "\n".join([
+        f"- **Priority:** {labels['priority']}",
+        f"- **Category:** {labels['category']}",
+        f"- **Sentiment:** {labels['sentiment']}",
+        f"- **Suggested assignee team:** {labels['team']}",
+        f"- **Suggested SLA:** response within {hours} hour{'s' if hours != 1 else ''}",
+        f"- **Summary:** {summarise(ticket)}",
+        f"- **Suggested resolution path:** {RESOLUTION_PATHS[labels['category']]}",
+    ])
+
+
+# ── MODEL ───────────────────────────────────────────────────────────────────
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+class TriageModel:
+    """One softmax regression per field over the shared hashed features."""
+
+    def __init__(self, bits: int = HASH_BITS, meta: Optional[Dict] = None):
+        self.bits = bits
+        self.weights = {f: np.zeros((1 << bits, len(c)), dtype=np.float32) for f, c in FIELDS.items()}
+        self.bias = {f: np.zeros(len(c), dtype=np.float32) for f, c in FIELDS.items()}
+        self.meta = meta or {}
+
+    def probabilities(self, text: str) -> Dict[str, np.ndarray]:
+        index, values = features(text, self.bits)
+        return {f: _softmax(values @ self.weights[f][index] + self.bias[f]) for f in FIELDS}
+
+    def predict(self, text: str) -> Tuple[Dict[str, str], Dict[str, float]]:
+        """(label per field, confidence per field)."""
+        labels, confidence = {}, {}
+        for field, p in self.probabilities(text).items():
+            best = int(p.argmax())
+            labels[field], confidence[field] = FIELDS[field][best], float(p[best])
+        return labels, confidence
+
+    def fit(self, texts: Sequence[str], labels: Sequence[Dict[str, Optional[str]]],
+            epochs: int = 10, rate: float = 0.5, l2: float = 1e-6, seed: int = 0) -> None:
+        """SGD on the cross-entropy; examples missing a field don't train that field."""
+        rng = np.random.default_rng(seed)
+        encoded = [features(t, self.bits) for t in texts]
+        targets = {f: np.array([FIELDS[f].index(l[f]) if l.get(f) in FIELDS[f] else -1 for l in labels])
+                   for f in FIELDS}
+        for epoch in range(epochs):
+            step = rate / (1 + epoch)
+            for i in rng.permutation(len(encoded)):
+                index, values = encoded[i]
+                for field in FIELDS:
+                    y = targets[field][i]
+                    if y < 0:
+                        continue
+                    w = self.weights[field]
+                    gradient = _softmax(values @ w[index] + self.bias[field])
+                    gradient[y] -= 1
+                    w[index] -= step * (np.outer(values, gradient) + l2 * w[index])
+                    self.bias[field] -= step * gradient
+
+    def save(self, path: str) -> None:
+        arrays = {f"{f}_w": w for f, w in self.weights.items()} | {f"{f}_b": b for f, b in self.bias.items()}
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, meta=np.array(json.dumps(self.meta | {"bits": self.bits})), **arrays)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, path)       # workers never see a half-written file
+
+    @classmethod
+    def load(cls, path: str) -> "TriageModel":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            model = cls(meta["bits"], meta)
+            for field in FIELDS:
+                model.weights[field] = data[f"{field}_w"]
+                model.bias[field] = data[f"{field}_b"]
+        return model
+
+
+class Classifier:
+    """The trained model, loaded lazily and reloaded when the file is replaced."""
+
+    def __init__(self, path: str = TRIAGE_MODEL_PATH):
+        self.path = path
+        self.model: Optional[TriageModel] = None
+        self._mtime = 0.0
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[TriageModel]:
+        now = time.monotonic()
+        if now - self._checked < RELOAD_CHECK_SECONDS and self._checked:
+            return self.model
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                return self.model
+            if mtime != self._mtime:
+                try:
+                    self.model, self._mtime = TriageModel.load(self.path), mtime
+                    logger.info("Loaded triage model %s (%s examples)", self.path, self.model.meta.get("examples"))
+                except Exception:
+                    logger.exception("Could not load triage model %s", self.path)
+        return self.model
+
+    def classify(self, text: str, threshold: float = TRIAGE_MIN_CONFIDENCE) -> Tuple[Optional[Dict[str, str]], Dict[str, float]]:
+        """(labels, confidence): labels is None when there's no model or any field is below threshold."""
+        model = self.current()
+        if model is None:
+            return None, {}
+        labels, confidence = model.predict(text)
+        return (labels if min(confidence.values()) >= threshold else None), confidence
+
+
+classifier = Classifier()
+
+
+# ── TRAINING EXAMPLES ───────────────────────────────────────────────────────
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS triage_examples (
+    job_id     TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    text       TEXT NOT NULL,
+    priority   TEXT,
+    category   TEXT,
+    sentiment  TEXT,
+    team       TEXT
+);
+"""
+
+
+class ExampleStore:
+    def __init__(self, path: str = TRIAGE_EXAMPLES_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def record(self, job_id: str, text: str, labels: Dict[str, Optional[str]]) -> bool:
+        """Keep a model triage as a training example; skipped when no field could be parsed."""
+        if not any(labels.values()):
+            return False
+        self._conn().execute(
+            "INSERT OR REPLACE INTO triage_examples (job_id, created_at, text, priority, category, sentiment, team) "
+            "VALUES (?,?,?,?,?,?,?)",
+            (job_id, time.time(), text, labels["priority"], labels["category"], labels["sentiment"], labels["team"]),
+        )
+        return True
+
+    def load(self, limit: Optional[int] = None) -> Tuple[List[str], List[Dict[str, Optional[str]]]]:
+        """Newest `limit` examples, oldest first."""
+        rows = self._conn().execute(
+            "SELECT text, priority, category, sentiment, team FROM triage_examples "
+            "ORDER BY created_at DESC LIMIT ?", (limit or -1,),
+        ).fetchall()[::-1]
+        return [r[0] for r in rows], [dict(zip(FIELDS, r[1:])) for r in rows]
+
+
+examples = ExampleStore()
+
+
+def ticket_text(brief: str, context: Optional[str]) -> str:
+    return f"{brief}\n{context}" if context else brief
@@ -6,12 +6,63 @@ Usage:
   pip install -r requirements.txt
   export ANTHROPIC_API_KEY=sk-ant-...
   python main.py
+
+Production serving:
+  ENVIRONMENT=production python main.py        # one worker per CPU core
+  WEB_CONCURRENCY=4 python main.py             # explicit worker count
+On SIGTERM each worker stops taking jobs and waits up to SHUTDOWN_DRAIN_SECONDS for
+in-flight jobs to finish before exiting.
 """
 
 import os
+import signal
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from api.marketplace_routes import router
+from api.pipeline_routes import router as pipeline_router
+from api.job_routes import router as job_router
+from api.usage_routes import router as usage_router
+from api.ws_routes import router as ws_router
+from api.debug_routes import RequestProfilerMiddleware, router as debug_router
+from api.support_routes import router as support_router
+from api.sales_routes import router as sales_router
+from marketplace.ledger import ledger
+from marketplace.lifecycle import SHUTDOWN_DRAIN_SECONDS, drain
+from marketplace import rendering
+from marketplace.capture import capture
+from marketplace.audit import audit
+from marketplace.webhooks import webhooks
+from marketplace.ratelimit import RateLimitMiddleware
+
+
+def _drain_on_signal():
+    """Start draining as soon as the termination signal arrives, then let uvicorn handle it."""
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            drain.begin()
+            previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _drain_on_signal()
+    yield
+    drain.begin()
+    await drain.wait_idle(SHUTDOWN_DRAIN_SECONDS)
+    webhooks.close()
+    ledger.flush()
+    rendering.shutdown()
+    capture.close()
+    audit.close()
+
 
 app = FastAPI(
     title="AgentHire Marketplace API",
@@ -19,8 +70,13 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
+# Per-client request limits (RATE_LIMITS). Added first so it runs inside CORS, and 429s
+# carry the CORS headers a browser needs to read them.
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -36,7 +92,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request profiling (X-Debug-Profile); a no-op unless DEBUG_TOKEN is set.
+app.add_middleware(RequestProfilerMiddleware)
+
+# Job outputs are often several KB of markdown/code; compress when the client accepts gzip.
+# Streamed responses are compressed chunk by chunk, so streaming still works.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+
 app.include_router(router)
+app.include_router(pipeline_router)
+app.include_router(job_router)
+app.include_router(usage_router)
+app.include_router(ws_router)
+app.include_router(debug_router)
+app.include_router(support_router)
+app.include_router(sales_router)
 
 @app.get("/")
 async def root():
@@ -55,7 +125,23 @@ async def health():
         "api_key_set": bool(os.environ.get("ANTHROPIC_API_KEY")),
     }
 
+def worker_count() -> int:
+    if os.environ.get("WEB_CONCURRENCY"):
+        return max(1, int(os.environ["WEB_CONCURRENCY"]))
+    return (os.cpu_count() or 1) if os.environ.get("ENVIRONMENT") == "production" else 1
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
+    workers = worker_count()
+    # Workers read WEB_CONCURRENCY to pick a cross-process shared-state backend.
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        reload=False,
+        workers=workers,
+        timeout_graceful_shutdown=int(SHUTDOWN_DRAIN_SECONDS),
+    )
@@ -0,0 +1,150 @@
+"""
+TechCrossIT Marketplace — Admission Control
+Sheds load up front instead of letting jobs queue until their clients give up.
+
+Before a job starts, its completion time is estimated from this worker's in-flight jobs,
+its share of the upstream call budget, and the observed time each job type holds a call
+slot (an EWMA, seeded from the registry's "~90s" hints):
+
+    wait      = 0 while fewer jobs are in flight than there are slots, else
+                (jobs queued ahead + 1) × mean slot time of in-flight jobs ÷ slots
+    estimate  = wait + expected slot time of this job
+
+A job is refused (503 + Retry-After) when it would have to queue and the estimate exceeds
+its deadline_seconds or ADMISSION_MAX_WAIT_SECONDS. The queue drains at roughly one second
+of wait per second, so Retry-After is the amount by which the estimate is over the limit.
+A job that would overrun its deadline even on an idle worker is still admitted — retrying
+cannot help it.
+
+Each worker judges its own share of the upstream pool's call slots (slots ÷ workers), so the
+check costs no I/O. Jobs run on the event loop's default thread pool, so a worker never has
+more slots than that pool has threads, however large the upstream pool is.
+
+Jobs without a deadline_seconds get a default one of JOB_DEADLINE_FACTOR × the registry hint,
+after which they are cancelled rather than left running for a client that has given up.
+
+Config:
+  ADMISSION_CONTROL=on | off
+  ADMISSION_MAX_WAIT_SECONDS=300
+  ADMISSION_EWMA_ALPHA=0.2
+  JOB_DEADLINE_FACTOR=10
+"""
+
+import math
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from marketplace.models import JobIntake
+from marketplace.registry import COMPANY_CARDS
+from marketplace.shared import get_shared_state, worker_count
+from marketplace.upstream import pool
+
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "on").lower() == "on"
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get("ADMISSION_MAX_WAIT_SECONDS", "300"))
+ADMISSION_EWMA_ALPHA = float(os.environ.get("ADMISSION_EWMA_ALPHA", "0.2"))
+JOB_DEADLINE_FACTOR = float(os.environ.get("JOB_DEADLINE_FACTOR", "10"))
+
+# Used for job types without a registry hint.
+DEFAULT_JOB_SECONDS = 60.0
+
+# Threads in the event loop's default executor, which runs the jobs (asyncio's own sizing).
+EXECUTOR_THREADS = min(32, (os.cpu_count() or 1) + 4)
+
+
+class Overloaded(Exception):
+    def __init__(self, estimate: float, limit: float):
+        self.estimate = estimate
+        self.limit = limit
+        self.retry_after = max(1, math.ceil(estimate - limit))
+        super().__init__(f"Estimated completion in {estimate:.0f}s exceeds the {limit:.0f}s limit.")
+
+
+def _registry_hints() -> Dict[Tuple[str, str], float]:
+    hints = {}
+    for company_id, card in COMPANY_CARDS.items():
+        for job in card.jobs:
+            match = re.search(r"\d+", job.get("time", ""))
+            if match:
+                hints[(company_id, job["key"])] = float(match.group())
+    return hints
+
+
+class Admission:
+    def __init__(self, max_wait: float = ADMISSION_MAX_WAIT_SECONDS, alpha: float = ADMISSION_EWMA_ALPHA):
+        self.max_wait = max_wait
+        self.alpha = alpha
+        self.in_flight = 0
+        self._work = 0.0                      # expected slot-seconds of the jobs in flight
+        self._hints = _registry_hints()
+        self._durations = dict(self._hints)   # (company, job_type) -> EWMA slot-seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def capacity() -> float:
+        slots = pool.capacity()
+        if get_shared_state().cross_process:
+            slots = max(1.0, slots / worker_count())
+        return min(slots, float(EXECUTOR_THREADS))
+
+    def expected(self, company_id: str, job_type: str) -> float:
+        return self._durations.get((company_id, job_type), DEFAULT_JOB_SECONDS)
+
+    def deadline_for(self, intake: JobIntake) -> float:
+        """Seconds the job may run: the client's deadline, else a multiple of its typical time."""
+        if intake.deadline_seconds:
+            return float(intake.deadline_seconds)
+        return JOB_DEADLINE_FACTOR * self._hints.get((intake.company_id, intake.job_type), DEFAULT_JOB_SECONDS)
+
+    def estimate(self, intake: JobIntake) -> Tuple[float, float]:
+        """(queueing wait, estimated completion) in seconds for a job submitted now."""
+        slots = self.capacity()
+        with self._lock:
+            n, work = self.in_flight, self._work
+        wait = 0.0
+        if n >= slots:
+            wait = (n - slots + 1) * (work / n) / slots
+        return wait, wait + self.expected(intake.company_id, intake.job_type)
+
+    def check(self, intake: JobIntake) -> None:
+        """Raise Overloaded if the job would queue past its deadline or the ceiling."""
+        if not ADMISSION_CONTROL:
+            return
+        limit = self.max_wait
+        if intake.deadline_seconds:
+            limit = min(limit, float(intake.deadline_seconds))
+        wait, estimate = self.estimate(intake)
+        if wait > 0 and estimate > limit:
+            raise Overloaded(estimate, limit)
+
+    @contextmanager
+    def track(self, intake: JobIntake):
+        expected = self.expected(intake.company_id, intake.job_type)
+        with self._lock:
+            self.in_flight += 1
+            self._work += expected
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._work = max(0.0, self._work - expected) if self.in_flight else 0.0
+
+    def observe(self, company_id: str, job_type: str, seconds: float) -> None:
+        """Fold a finished job's slot time into its job type's EWMA."""
+        if seconds <= 0:
+            return
+        key = (company_id, job_type)
+        with self._lock:
+            previous = self._durations.get(key)
+            self._durations[key] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"in_flight": self.in_flight, "queued_work_seconds": round(self._work, 1),
+                    "slots": self.capacity()}
+
+
+admission = Admission()
@@ -0,0 +1,265 @@
+"""
+TechCrossIT Marketplace — Job Audit Log
+One structured record per finished job, the raw data for capacity and cost analysis
+(query with tools/audit_query.py): job id, company, job type, client, outcome, model,
+prompt-template hash, input / output / cached tokens, model calls and stage timings.
+No brief, context or output text is written.
+
+Records are handed to a background thread through a bounded queue (QueueHandler →
+QueueListener), so the request path does no file I/O. When the queue is full the
+record is dropped and counted (audit_records_dropped) rather than blocking the job.
+
+Each worker appends to its own data/audit/audit-<pid>.jsonl. When that file reaches
+AUDIT_LOG_MAX_BYTES, or its first record is AUDIT_LOG_ROTATE_SECONDS old (checked as
+records are written), it is gzipped into an append-only segment named after the UTC
+times of its first and last records:
+
+    audit-<pid>-20261019T080000Z-20261019T235959Z.jsonl.gz
+
+so a query over a time window opens only the segments that overlap it. The open file is
+compressed the same way at shutdown. Segments older than AUDIT_LOG_RETENTION_DAYS are
+deleted (0 = keep them all).
+
+Config:
+  AUDIT_LOG=on | off
+  AUDIT_LOG_DIR=data/audit
+  AUDIT_LOG_MAX_BYTES=52428800
+  AUDIT_LOG_ROTATE_SECONDS=86400
+  AUDIT_LOG_RETENTION_DAYS=0
+  AUDIT_LOG_QUEUE=10000
+"""
+
+import atexit
+import calendar
+import functools
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import shutil
+import sys
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from marketplace import metrics
+from marketplace.context import JobContext
+from marketplace.queued_log import QueuedLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_LOG = os.environ.get("AUDIT_LOG", "on").lower() == "on"
+AUDIT_LOG_DIR = os.environ.get("AUDIT_LOG_DIR", "data/audit")
+AUDIT_LOG_MAX_BYTES = int(os.environ.get("AUDIT_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+AUDIT_LOG_ROTATE_SECONDS = float(os.environ.get("AUDIT_LOG_ROTATE_SECONDS", "86400"))
+AUDIT_LOG_RETENTION_DAYS = float(os.environ.get("AUDIT_LOG_RETENTION_DAYS", "0"))
+AUDIT_LOG_QUEUE = int(os.environ.get("AUDIT_LOG_QUEUE", "10000"))
+
+FILE_PREFIX = "audit"
+STAMP = "%Y%m%dT%H%M%SZ"
+SEGMENT_PATTERN = re.compile(r"^(?P<worker>.+)-(?P<first>\d{8}T\d{6}Z)-(?P<last>\d{8}T\d{6}Z)(?:-\d+)?\.jsonl\.gz$")
+
+# Error messages are cut to this length; they can quote upstream responses.
+MAX_ERROR_CHARS = 300
+
+
+# ── RECORDS ─────────────────────────────────────────────────────────────────
+
+def template_hash(*templates: str) -> str:
+    """Short hash of the prompt text a job is built from, so records can be split by prompt version."""
+    return hashlib.sha256("\0".join(templates).encode()).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def agent_template_hash(module_name: str, job_type: str) -> Optional[str]:
+    """template_hash of an agent module's SYSTEM_PROMPT, JOB_PROMPTS and JOB_PARTS for a job type."""
+    module = sys.modules.get(module_name)
+    if module is None or not hasattr(module, "SYSTEM_PROMPT"):
+        return None
+    return template_hash(
+        module.SYSTEM_PROMPT,
+        getattr(module, "JOB_PROMPTS", {}).get(job_type, ""),
+        repr(getattr(module, "JOB_PARTS", {}).get(job_type) or ""),
+    )
+
+
+def job_record(ctx: JobContext, company_id: str, job_type: str, status: str, *,
+               model: Optional[str], template: Optional[str], client_name: Optional[str],
+               stages: Dict[str, Optional[float]], error: Optional[str] = None,
+               **fields: Any) -> Dict[str, Any]:
+    """The audit record of a finished job. `stages` are seconds; they are written as whole ms."""
+    return {
+        "ts":            round(time.time(), 3),
+        "job_id":        ctx.job_id,
+        "company_id":    company_id,
+        "job_type":      job_type,
+        "client":        client_name or "Anonymous",
+        "status":        status,
+        "cancel_reason": ctx.cancel_reason,
+        "error":         error[:MAX_ERROR_CHARS] if error else None,
+        "model":         model,
+        "template_hash": template,
+        "model_calls":   ctx.model_calls,
+        "input_tokens":  ctx.input_tokens,
+        "output_tokens": ctx.output_tokens,
+        "cached_tokens": ctx.cached_tokens,
+        "tokens_used":   ctx.tokens_used,
+        "tokens_saved":  ctx.tokens_saved,
+        **fields,
+        "stages_ms":     {name: None if s is None else int(s * 1000) for name, s in stages.items()},
+    }
+
+
+# ── SEGMENTED FILES ─────────────────────────────────────────────────────────
+
+def _stamp(ts: float) -> str:
+    return time.strftime(STAMP, time.gmtime(ts))
+
+
+def segment_span(path: str) -> Optional[Tuple[float, float]]:
+    """(first, last) unix times covered by a compressed segment, from its name; None if it isn't one."""
+    found = SEGMENT_PATTERN.match(os.path.basename(path))
+    if not found:
+        return None
+    first = calendar.timegm(time.strptime(found["first"], STAMP))
+    last = calendar.timegm(time.strptime(found["last"], STAMP))
+    return first, last + 1          # names are truncated to the second
+
+
+def _first_ts(path: str) -> float:
+    """Time of the first record in a file, or its mtime if that can't be read."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return float(json.loads(f.readline())["ts"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return os.path.getmtime(path)
+
+
+class SegmentedFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    Appends lines to <directory>/<name>.jsonl and rolls it over by size or age into a
+    gzipped <name>-<first>-<last>.jsonl.gz segment. Rollovers and compression run on the
+    thread that writes (the audit listener), never on the caller's.
+    """
+
+    def __init__(self, directory: str, name: str, max_bytes: int = 0, max_seconds: float = 0,
+                 retention_seconds: float = 0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_name = name
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.retention_seconds = retention_seconds
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        path = os.path.join(directory, f"{name}.jsonl")
+        super().__init__(path, "a", encoding="utf-8", delay=True)
+        if os.path.exists(path) and os.path.getsize(path):
+            # Left behind by a crashed process with the same pid.
+            self.first, self.last = _first_ts(path), os.path.getmtime(path)
+            self.doRollover()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.first is None:
+            return False
+        if self.max_seconds and record.created - self.first >= self.max_seconds:
+            return True
+        if self.max_bytes:
+            if self.stream is None:
+                self.stream = self._open()
+            return self.stream.tell() + len(record.getMessage()) + 1 > self.max_bytes
+        return False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write one line, unflushed: the listener flushes once the queue is empty."""
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(record.getMessage() + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+        if self.first is None:
+            self.first = record.created
+        self.last = record.created
+
+    def doRollover(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if self.first is not None and os.path.exists(self.baseFilename):
+            self._compress(self.baseFilename, self.first, self.last or self.first)
+        self.first = self.last = None
+        self._prune()
+
+    def _compress(self, source: str, first: float, last: float) -> None:
+        base = os.path.join(self.directory, f"{self.segment_name}-{_stamp(first)}-{_stamp(last)}")
+        target, n = f"{base}.jsonl.gz", 1
+        while os.path.exists(target):
+            target, n = f"{base}-{n}.jsonl.gz", n + 1
+        partial = target + ".part"          # readers skip it until it is complete
+        with open(source, "rb") as src, gzip.open(partial, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(partial, target)
+        os.remove(source)
+
+    def _prune(self) -> None:
+        if not self.retention_seconds:
+            return
+        cutoff = time.time() - self.retention_seconds
+        for path in glob.glob(os.path.join(self.directory, "*.jsonl.gz")):
+            span = segment_span(path)
+            if span and span[1] < cutoff:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass                    # pruned by another worker
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            if self.first is not None:
+                self.doRollover()
+        except Exception:
+            logger.exception("Compressing the audit log at shutdown failed")
+        finally:
+            self.release()
+        super().close()
+
+
+# ── AUDIT LOG ───────────────────────────────────────────────────────────────
+
+class AuditLog:
+    def __init__(self, directory: str = AUDIT_LOG_DIR, enabled: bool = AUDIT_LOG):
+        self.directory = directory
+        self.enabled = enabled
+        self._log = QueuedLog(f"{__name__}.records", self._handler, max_queue=AUDIT_LOG_QUEUE,
+                              on_drop=lambda: metrics.incr("audit_records_dropped"))
+
+    def _handler(self) -> logging.Handler:
+        return SegmentedFileHandler(
+            self.directory, f"{FILE_PREFIX}-{os.getpid()}", max_bytes=AUDIT_LOG_MAX_BYTES,
+            max_seconds=AUDIT_LOG_ROTATE_SECONDS, retention_seconds=AUDIT_LOG_RETENTION_DAYS * 86400,
+        )
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """Queue one job's record (see job_record). Best-effort: never raises into the request path."""
+        if not self.enabled:
+            return
+        try:
+            self._log.write(json.dumps(entry, separators=(",", ":"), default=str))
+        except Exception:
+            logger.exception("Audit record failed for job %s", entry.get("job_id"))
+
+    def close(self) -> None:
+        """Write out queued records and compress the open file."""
+        self._log.close()
+
+
+audit = AuditLog()
+atexit.register(audit.close)
@@ -0,0 +1,98 @@
+"""
+TechCrossIT Marketplace — Workload Capture
+Opt-in recording of the *shape* of real traffic, for replay with tools/replay.py.
+
+One JSON line per job arriving at the dispatcher: arrival time, company, job type, option
+fields and the size and hash of each free-text field. Brief, context and client name are
+never written — only their lengths and truncated SHA-256 hashes (hashes keep repeats and
+per-client bursts visible without the content).
+
+Lines are handed to a background thread (QueueHandler → QueueListener), so the request path
+does no file I/O. Each worker writes its own file, rotated by size.
+
+Config:
+  WORKLOAD_CAPTURE=off | on
+  WORKLOAD_CAPTURE_DIR=data/capture
+  WORKLOAD_CAPTURE_MAX_BYTES=52428800
+  WORKLOAD_CAPTURE_BACKUPS=10
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import time
+from typing import Any, Dict, Optional
+
+from marketplace.models import JobIntake
+from marketplace.queued_log import QueuedLog
+
+logger = logging.getLogger(__name__)
+
+WORKLOAD_CAPTURE = os.environ.get("WORKLOAD_CAPTURE", "off").lower() == "on"
+WORKLOAD_CAPTURE_DIR = os.environ.get("WORKLOAD_CAPTURE_DIR", "data/capture")
+WORKLOAD_CAPTURE_MAX_BYTES = int(os.environ.get("WORKLOAD_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+WORKLOAD_CAPTURE_BACKUPS = int(os.environ.get("WORKLOAD_CAPTURE_BACKUPS", "10"))
+
+FILE_PREFIX = "workload"
+
+
+def _digest(value: Optional[str]) -> Optional[str]:
+    return hashlib.sha256(value.encode()).hexdigest()[:16] if value else None
+
+
+def describe(intake: JobIntake, job_id: str, arrived: float) -> Dict[str, Any]:
+    """Content-free description of one submission."""
+    return {
+        "ts":               round(arrived, 3),
+        "job_id":           job_id,
+        "company_id":       intake.company_id,
+        "job_type":         intake.job_type,
+        "brief_chars":      len(intake.brief),
+        "brief_hash":       _digest(intake.brief),
+        "context_chars":    len(intake.context or ""),
+        "context_hash":     _digest(intake.context),
+        "client_hash":      _digest(intake.client_name),
+        "tone":             intake.tone,
+        "output_format":    intake.output_format,
+        "priority":         intake.priority,
+        "deadline_seconds": intake.deadline_seconds,
+        "extra_keys":       sorted((intake.extra or {}).keys()),
+    }
+
+
+class WorkloadCapture:
+    def __init__(self, directory: str = WORKLOAD_CAPTURE_DIR, enabled: bool = WORKLOAD_CAPTURE):
+        self.directory = directory
+        self.enabled = enabled
+        self._log = QueuedLog(f"{__name__}.records", self._handler)
+
+    def _handler(self) -> logging.Handler:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{FILE_PREFIX}-{os.getpid()}.jsonl")
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=WORKLOAD_CAPTURE_MAX_BYTES, backupCount=WORKLOAD_CAPTURE_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        return handler
+
+    def record(self, intake: JobIntake, job_id: str, arrived: Optional[float] = None) -> None:
+        """Queue one arrival. Best-effort: never raises into the request path."""
+        if not self.enabled:
+            return
+        try:
+            line = json.dumps(describe(intake, job_id, arrived or time.time()), separators=(",", ":"))
+            self._log.write(line)
+        except Exception:
+            logger.exception("Workload capture failed for job %s", job_id)
+
+    def close(self) -> None:
+        """Flush queued lines to disk."""
+        self._log.close()
+
+
+capture = WorkloadCapture()
+atexit.register(capture.close)
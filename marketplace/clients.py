@@ -0,0 +1,60 @@
+"""
+TechCrossIT Marketplace — Client API Keys
+Who is calling. A client authenticates with X-API-Key: <key> or Authorization: Bearer <key>,
+checked against CLIENT_API_KEYS; anything else — no key, or a key that isn't listed — is an
+unauthenticated caller.
+
+Only an authenticated client name is trusted for anything that separates one client from
+another (rate-limit buckets, credit, job history). Routes that start jobs replace any
+client_name sent in the request with the authenticated name, or None for an unauthenticated
+caller, whose usage is billed to the shared Anonymous account.
+
+Config:
+  CLIENT_API_KEYS={"acme": "<key>", "globex": "<key>"}     # client name -> key (JSON)
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _load_keys() -> Dict[str, str]:
+    """key digest -> client name. Keys are held hashed, so lookups don't compare secrets."""
+    raw = os.environ.get("CLIENT_API_KEYS", "").strip()
+    if not raw:
+        return {}
+    try:
+        entries = json.loads(raw)
+    except ValueError:
+        raise ValueError("CLIENT_API_KEYS must be a JSON object of client name -> API key")
+    if not isinstance(entries, dict) or not all(isinstance(v, str) and v for v in entries.values()):
+        raise ValueError("CLIENT_API_KEYS must be a JSON object of client name -> API key")
+    return {_digest(key): name for name, key in entries.items()}
+
+
+_KEYS = _load_keys()
+
+
+def presented_key(headers: Dict[bytes, bytes]) -> Optional[str]:
+    """The key sent as X-API-Key or Authorization: Bearer, if any (raw ASGI headers)."""
+    token = headers.get(b"x-api-key", b"").decode("latin-1").strip()
+    if not token:
+        scheme, _, value = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        token = value.strip() if scheme.lower() == "bearer" else ""
+    return token or None
+
+
+def authenticate(headers: Dict[bytes, bytes]) -> Optional[str]:
+    """The client name for a valid key, else None."""
+    key = presented_key(headers)
+    return _KEYS.get(_digest(key)) if key else None
+
+
+def client_of(connection) -> Optional[str]:
+    """authenticate() for a Starlette Request or WebSocket."""
+    return authenticate(dict(connection.scope["headers"]))
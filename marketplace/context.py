@@ -0,0 +1,264 @@
+"""
+TechCrossIT Marketplace — Job Context
+Per-job state that travels with a job into the agent thread (via contextvars) without
+changing every agent's run(intake) signature: the server-assigned job id, an optional
+callback that receives streamed output text as it is generated, the time the job spent
+holding upstream call slots (used by admission control), and its cancellation state.
+
+Cancellation: a job is cancelled when its deadline passes, its client disconnects, or
+it is cancelled by id (DELETE /marketplace/jobs/{id}). Model calls check for it between
+streamed chunks and register a closer, so a blocked upstream read is interrupted too;
+the agent thread then unwinds with JobCancelled.
+
+Jobs that make several calls at once (map-reduce, multi-part deliverables) run each in a
+child context (run_concurrently): cancelling the job stops every call, and when one call
+fails its siblings are cancelled on their own, without cancelling the job.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+
+from marketplace.shared import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+# How often the watcher thread enforces deadlines and picks up cancels sent to other workers.
+WATCH_SECONDS = 0.5
+# Running-job markers in shared state outlive a crashed worker by at most this long.
+RUNNING_TTL_SECONDS = 3600
+
+T = TypeVar("T")
+
+
+def generate_job_id() -> str:
+    return str(uuid.uuid4())[:12]
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside the agent thread when its job is cancelled. A BaseException (like
+    asyncio.CancelledError) so agents' `except Exception` failure handling doesn't turn
+    it into an ordinary failed job.
+    """
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(f"Job cancelled: {reason}")
+
+
+@dataclass
+class JobContext:
+    job_id:   str                                   = ""
+    on_delta: Optional[Callable[[str], None]]       = None    # called from the agent thread
+    on_start: Optional[Callable[[], None]]          = None    # called on the loop once admitted
+    call_seconds: float                             = 0.0     # summed over this job's model calls
+    deadline: Optional[float]                       = None    # time.monotonic() value
+    tokens_used:  int                               = 0       # every model call, finished or not
+    tokens_saved: int                               = 0       # estimated output not generated after cancel
+    input_tokens:  int                              = 0       # tokens_used by kind, for the audit log
+    output_tokens: int                              = 0
+    cached_tokens: int                              = 0       # input read from the prompt cache
+    model_calls:   int                              = 0
+    cancel_reason: Optional[str]                    = None
+    parent:   Optional["JobContext"]                = field(default=None, repr=False)   # see child()
+    _cancelled: threading.Event                     = field(default_factory=threading.Event, repr=False)
+    _closers:   List[Callable[[], None]]            = field(default_factory=list, repr=False)
+    _lock:      threading.Lock                      = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        self.job_id = self.job_id or generate_job_id()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str) -> bool:
+        """Cancel the job and interrupt its in-progress model calls. False if already cancelled."""
+        with self._lock:
+            if self._cancelled.is_set():
+                return False
+            self.cancel_reason = reason
+            self._cancelled.set()
+            closers = list(self._closers)
+        for close in closers:
+            try:
+                close()
+            except Exception:
+                logger.debug("Closing a call for cancelled job %s failed", self.job_id, exc_info=True)
+        return True
+
+    def check(self) -> None:
+        """Raise JobCancelled if the job was cancelled or its deadline has passed."""
+        if self.deadline is not None and not self.cancelled and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        if self.cancelled:
+            raise JobCancelled(self.cancel_reason)
+
+    def account(self, tokens_used: int = 0, tokens_saved: int = 0, call_seconds: float = 0.0,
+                input_tokens: int = 0, output_tokens: int = 0, cached_tokens: int = 0, calls: int = 0) -> None:
+        """Add a model call's usage. Thread-safe: map-reduce jobs make calls in parallel."""
+        if self.parent is not None:
+            self.parent.account(tokens_used, tokens_saved, call_seconds, input_tokens, output_tokens,
+                                cached_tokens, calls)
+            return
+        with self._lock:
+            self.tokens_used += tokens_used
+            self.tokens_saved += tokens_saved
+            self.call_seconds += call_seconds
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cached_tokens += cached_tokens
+            self.model_calls += calls
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def add_closer(self, close: Callable[[], None]) -> None:
+        """Register a callback that aborts an in-progress call; runs at once if already cancelled."""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._closers.append(close)
+                return
+        close()
+
+    def remove_closer(self, close: Callable[[], None]) -> None:
+        with self._lock:
+            if close in self._closers:
+                self._closers.remove(close)
+
+    def child(self) -> "JobContext":
+        """
+        A context for one of this job's concurrent calls. Cancelling the job (or reaching its
+        deadline) cancels the child; cancelling the child stops only its own call. Usage is
+        accounted to the job. Call detach() once the child's call has finished.
+        """
+        child = JobContext(job_id=self.job_id, on_delta=self.on_delta, deadline=self.deadline, parent=self)
+        self.add_closer(child._follow_parent)
+        return child
+
+    def detach(self) -> None:
+        if self.parent is not None:
+            self.parent.remove_closer(self._follow_parent)
+
+    def _follow_parent(self) -> None:
+        self.cancel(self.parent.cancel_reason)
+
+
+current_job: contextvars.ContextVar[Optional[JobContext]] = contextvars.ContextVar("current_job", default=None)
+
+
+def new_job_id() -> str:
+    """Job id for an agent run: the dispatcher's id when there is one, else a fresh one."""
+    ctx = current_job.get()
+    return ctx.job_id if ctx else generate_job_id()
+
+
+def run_in_context(ctx: JobContext, fn: Callable, *args):
+    """Call fn(*args) with `ctx` as the current job. Use as the target of run_in_executor."""
+    context = contextvars.copy_context()
+    context.run(current_job.set, ctx)
+    return context.run(fn, *args)
+
+
+def run_concurrently(calls: Sequence[Callable[[], T]], max_workers: int) -> List[T]:
+    """
+    Run calls on their own thread pool, each in a child of the current job, and return their
+    results in order. When one raises, calls not yet started are dropped and running ones are
+    cancelled (so the rest of their output is neither generated nor billed), then that first
+    exception is raised. Each call runs in a copy of the caller's contextvars.
+    """
+    parent = current_job.get()
+    children = [parent.child() if parent else JobContext() for _ in calls]
+    executor = ThreadPoolExecutor(max_workers=max(1, min(len(calls), max_workers)))
+    try:
+        futures = []
+        for child, call in zip(children, calls):
+            context = contextvars.copy_context()
+            context.run(current_job.set, child)
+            futures.append(executor.submit(context.run, call))
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = next((f for f in futures if f in done and f.exception() is not None), None)
+        if failed is None:
+            return [f.result() for f in futures]
+        for future in pending:
+            future.cancel()
+        for child in children:
+            child.cancel(parent.cancel_reason if parent and parent.cancelled else "sibling_failed")
+        raise failed.exception()
+    finally:
+        executor.shutdown(wait=True)        # cancelled calls unwind within a poll interval
+        for child in children:
+            child.detach()
+
+
+# ── RUNNING JOBS ────────────────────────────────────────────────────────────
+
+class RunningJobs:
+    """
+    Jobs running in this worker, plus markers in shared state so a cancel sent to any
+    worker reaches the one running the job. A watcher thread enforces deadlines (even while
+    a call is blocked waiting for its first token) and polls for cross-worker cancels.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, JobContext] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, ctx: JobContext) -> bool:
+        """Track a starting job. False if a job with this id is already running on any worker."""
+        if not get_shared_state().add(f"running:{ctx.job_id}", True, ttl=RUNNING_TTL_SECONDS):
+            return False
+        with self._lock:
+            self._jobs[ctx.job_id] = ctx
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name="job-watch", daemon=True)
+                self._thread.start()
+        return True
+
+    def unregister(self, ctx: JobContext) -> None:
+        with self._lock:
+            self._jobs.pop(ctx.job_id, None)
+        state = get_shared_state()
+        state.delete(f"running:{ctx.job_id}")
+        state.delete(f"cancel:{ctx.job_id}")
+
+    def cancel(self, job_id: str, reason: str) -> bool:
+        """Cancel a running job on whichever worker runs it. False if it isn't running."""
+        ctx = self._jobs.get(job_id)
+        if ctx is not None:
+            ctx.cancel(reason)
+            return True
+        state = get_shared_state()
+        if not state.get(f"running:{job_id}"):
+            return False
+        state.set(f"cancel:{job_id}", reason, ttl=RUNNING_TTL_SECONDS)
+        return True
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(WATCH_SECONDS)
+            try:
+                with self._lock:
+                    jobs = list(self._jobs.values())
+                state = get_shared_state()
+                for ctx in jobs:
+                    if ctx.cancelled:
+                        continue
+                    if ctx.deadline is not None and time.monotonic() >= ctx.deadline:
+                        ctx.cancel("deadline")
+                    elif state.cross_process:
+                        reason = state.get(f"cancel:{ctx.job_id}")
+                        if reason:
+                            ctx.cancel(reason)
+            except Exception:
+                logger.exception("Job watcher pass failed")
+
+
+running_jobs = RunningJobs()
@@ -0,0 +1,113 @@
+"""
+TechCrossIT Marketplace — Idempotency Keys
+At-most-once job execution for clients that retry POST /marketplace/submit.
+
+The first request with a key runs the job. Concurrent requests with the same key attach to
+that execution (in-process via a shared future, across workers by polling shared state), and
+later requests get the stored JobResult back until the retention window expires.
+Failed jobs are not remembered, so a retry after a failure runs again.
+
+Config:
+  IDEMPOTENCY_TTL_SECONDS=86400     how long a completed result is replayed
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from marketplace.models import JobIntake, JobResult, JobStatus
+from marketplace.shared import SharedState, get_shared_state
+
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+
+# A claim outlives the longest job; if its worker dies the key frees itself after this.
+CLAIM_TTL_SECONDS = 900
+# How often a request waiting on another worker's execution re-checks shared state.
+POLL_SECONDS = 0.5
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(ValueError):
+    """The key was already used with a different request body."""
+
+
+def fingerprint(intake: JobIntake) -> str:
+    return hashlib.sha256(intake.model_dump_json().encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, state: Optional[SharedState] = None, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self._state = state
+        self._ttl = ttl
+        self._running: Dict[str, Tuple[str, asyncio.Future]] = {}   # key -> (fingerprint, future)
+
+    @property
+    def state(self) -> SharedState:
+        return self._state or get_shared_state()
+
+    def claimed(self, key: str) -> bool:
+        """True if a request with this key is running or has a result to replay."""
+        return key in self._running or self.state.get(f"idem:{key}") is not None
+
+    async def run(self, key: str, intake: JobIntake, execute: Callable[[], Awaitable[JobResult]],
+                  before_claim: Optional[Callable[[], Awaitable[None]]] = None) -> Tuple[JobResult, bool]:
+        """
+        Return (result, replayed). `replayed` is True when this request did not run the job.
+        before_claim runs only when this request is about to claim the key and run the job,
+        not for replays; raising from it refuses the request without claiming the key.
+        """
+        fp = fingerprint(intake)
+        name = f"idem:{key}"
+        deadline = time.monotonic() + CLAIM_TTL_SECONDS
+
+        while True:
+            local = self._running.get(key)
+            if local:
+                self._check(fp, local[0])
+                return await asyncio.shield(local[1]), True
+
+            entry = self.state.get(name)
+            if entry:
+                self._check(fp, entry["fingerprint"])
+                if entry["status"] == "done":
+                    return JobResult.model_validate(entry["result"]), True
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for the original request with key '{key}'")
+                await asyncio.sleep(POLL_SECONDS)       # running on another worker
+                continue
+
+            if before_claim:
+                await before_claim()
+            if self.state.add(name, {"status": "running", "fingerprint": fp}, ttl=CLAIM_TTL_SECONDS):
+                break
+
+        future = asyncio.get_running_loop().create_future()
+        self._running[key] = (fp, future)
+        try:
+            result = await execute()
+        except BaseException as e:
+            self.state.delete(name)
+            future.set_exception(e)
+            future.exception()       # mark retrieved — attached requests may not exist
+            raise
+        finally:
+            self._running.pop(key, None)
+
+        if result.status == JobStatus.DONE:
+            self.state.set(name, {"status": "done", "fingerprint": fp,
+                                  "result": result.model_dump(mode="json")}, ttl=self._ttl)
+        else:
+            self.state.delete(name)
+        future.set_result(result)
+        return result, False
+
+    @staticmethod
+    def _check(fp: str, stored: str) -> None:
+        if fp != stored:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request body.")
+
+
+idempotency = IdempotencyStore()
@@ -0,0 +1,268 @@
+"""
+TechCrossIT Marketplace — Usage & Credit Ledger
+Write-behind accounting of tokens and job counts.
+
+Each finished job is added to an in-memory aggregate keyed by
+(client, company, job_type, model) — no I/O on the request path. A background thread
+flushes the aggregates in one transaction every LEDGER_FLUSH_SECONDS, or sooner once
+LEDGER_FLUSH_MAX_KEYS distinct keys are pending. Usage is stored per UTC day.
+
+Summaries read the durable totals plus this worker's unflushed aggregates, so they never
+force a flush; other workers' usage shows up within LEDGER_FLUSH_SECONDS.
+
+Credits are denominated in tokens. When CREDIT_CHECK=on, jobs from clients whose cached
+balance (durable balance minus this worker's unflushed usage) is exhausted are refused
+before any model call is made.
+
+Config:
+  LEDGER_PATH=data/ledger.db
+  LEDGER_FLUSH_SECONDS=5
+  LEDGER_FLUSH_MAX_KEYS=500
+  CREDIT_CHECK=off | on
+  CREDIT_CACHE_SECONDS=30
+"""
+
+import atexit
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEDGER_PATH = os.environ.get("LEDGER_PATH", "data/ledger.db")
+LEDGER_FLUSH_SECONDS = float(os.environ.get("LEDGER_FLUSH_SECONDS", "5"))
+LEDGER_FLUSH_MAX_KEYS = int(os.environ.get("LEDGER_FLUSH_MAX_KEYS", "500"))
+CREDIT_CHECK = os.environ.get("CREDIT_CHECK", "off").lower() == "on"
+CREDIT_CACHE_SECONDS = float(os.environ.get("CREDIT_CACHE_SECONDS", "30"))
+
+ANONYMOUS = "Anonymous"
+
+UsageKey = Tuple[str, str, str, str, str]     # (day, client, company, job_type, model)
+
+GROUP_COLUMNS = ("day", "client_name", "company_id", "job_type", "model")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day          TEXT NOT NULL,
+    client_name  TEXT NOT NULL,
+    company_id   TEXT NOT NULL,
+    job_type     TEXT NOT NULL,
+    model        TEXT NOT NULL,
+    jobs         INTEGER NOT NULL DEFAULT 0,
+    tokens       INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, client_name, company_id, job_type, model)
+);
+CREATE INDEX IF NOT EXISTS idx_usage_client ON usage(client_name, day);
+CREATE TABLE IF NOT EXISTS credits (
+    client_name  TEXT PRIMARY KEY,
+    balance      INTEGER NOT NULL,
+    updated_at   REAL NOT NULL
+);
+"""
+
+
+class Ledger:
+    def __init__(self, path: str = LEDGER_PATH, flush_seconds: float = LEDGER_FLUSH_SECONDS,
+                 flush_max_keys: int = LEDGER_FLUSH_MAX_KEYS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.flush_max_keys = flush_max_keys
+        self._pending: Dict[UsageKey, List[int]] = defaultdict(lambda: [0, 0])   # key -> [jobs, tokens]
+        self._pending_by_client: Dict[str, int] = defaultdict(int)
+        self._flushing_by_client: Dict[str, int] = {}                          # being written right now
+        self._balances: Dict[str, Tuple[Optional[int], float]] = {}            # client -> (balance, fetched_at)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+
+    # ── storage ──
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # ── hot path ──
+
+    def record(self, client_name: Optional[str], company_id: str, job_type: str,
+               model: Optional[str], tokens: Optional[int]) -> None:
+        """Add one finished job to the in-memory aggregate. O(1), no I/O."""
+        client = client_name or ANONYMOUS
+        day = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+        with self._lock:
+            entry = self._pending[(day, client, company_id, job_type, model or "unknown")]
+            entry[0] += 1
+            entry[1] += tokens or 0
+            self._pending_by_client[client] += tokens or 0
+            full = len(self._pending) >= self.flush_max_keys
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def balance(self, client_name: Optional[str]) -> Optional[int]:
+        """Cached remaining credit in tokens, or None if the client has no credit account."""
+        client = client_name or ANONYMOUS
+        cached = self._balances.get(client)
+        if cached is None or time.monotonic() - cached[1] > CREDIT_CACHE_SECONDS:
+            row = self._conn().execute("SELECT balance FROM credits WHERE client_name = ?", (client,)).fetchone()
+            cached = (row[0] if row else None, time.monotonic())
+            self._balances[client] = cached
+        if cached[0] is None:
+            return None
+        with self._lock:
+            return cached[0] - self._pending_by_client.get(client, 0) - self._flushing_by_client.get(client, 0)
+
+    def has_credit(self, client_name: Optional[str]) -> bool:
+        if not CREDIT_CHECK:
+            return True
+        remaining = self.balance(client_name)
+        return remaining is not None and remaining > 0
+
+    # ── write-behind ──
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._loop, name="ledger-flush", daemon=True)
+                    self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Ledger flush failed; usage kept in memory for the next attempt")
+
+    def flush(self) -> int:
+        """Write pending aggregates in one transaction. Returns the number of keys written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+                by_client, self._pending_by_client = self._pending_by_client, defaultdict(int)
+                self._flushing_by_client = by_client
+            if not pending:
+                return 0
+            try:
+                conn = self._conn()
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.executemany(
+                        "INSERT INTO usage (day, client_name, company_id, job_type, model, jobs, tokens) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(day, client_name, company_id, job_type, model) "
+                        "DO UPDATE SET jobs = jobs + excluded.jobs, tokens = tokens + excluded.tokens",
+                        [(*key, jobs, tokens) for key, (jobs, tokens) in pending.items()],
+                    )
+                    conn.executemany(
+                        "UPDATE credits SET balance = balance - ?, updated_at = ? WHERE client_name = ?",
+                        [(tokens, time.time(), client) for client, tokens in by_client.items() if tokens],
+                    )
+            except Exception:
+                with self._lock:           # put it back so nothing is lost
+                    for key, (jobs, tokens) in pending.items():
+                        self._pending[key][0] += jobs
+                        self._pending[key][1] += tokens
+                    for client, tokens in by_client.items():
+                        self._pending_by_client[client] += tokens
+                    self._flushing_by_client = {}
+                raise
+            with self._lock:
+                for client in by_client:
+                    self._balances.pop(client, None)
+                self._flushing_by_client = {}
+            return len(pending)
+
+    # ── queries ──
+
+    def summary(self, filters: Dict[str, Any], group_by: List[str]) -> List[Dict[str, Any]]:
+        """Durable totals plus this worker's unflushed usage, grouped by group_by."""
+        where, params = [], []
+        for column in ("client_name", "company_id", "job_type", "model"):
+            if filters.get(column):
+                where.append(f"{column} = ?")
+                params.append(filters[column])
+        if filters.get("since"):
+            where.append("day >= ?")
+            params.append(filters["since"])
+        if filters.get("until"):
+            where.append("day <= ?")
+            params.append(filters["until"])
+
+        columns = [c for c in group_by if c in GROUP_COLUMNS]
+        select = ", ".join(columns + ["SUM(jobs)", "SUM(tokens)"])
+        sql = f"SELECT {select} FROM usage"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if columns:
+            sql += f" GROUP BY {', '.join(columns)}"
+        with self._flush_lock:         # so a flush can't land between the two reads
+            rows = self._conn().execute(sql, params).fetchall()
+            unflushed = self._unflushed()
+        totals: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0])
+        for row in rows:
+            if row[-2] is not None:
+                totals[tuple(row[:-2])] = [row[-2], row[-1]]
+        for key, (jobs, tokens) in unflushed:
+            entry = dict(zip(GROUP_COLUMNS, key))
+            if self._matches(entry, filters):
+                total = totals[tuple(entry[c] for c in columns)]
+                total[0] += jobs
+                total[1] += tokens
+        if not totals and not columns:
+            totals[()] = [0, 0]
+        return sorted(
+            ({**dict(zip(columns, group)), "jobs": jobs, "tokens": tokens} for group, (jobs, tokens) in totals.items()),
+            key=lambda r: r["tokens"], reverse=True,
+        )
+
+    def _unflushed(self) -> List[Tuple[UsageKey, Tuple[int, int]]]:
+        with self._lock:
+            return [(key, (jobs, tokens)) for key, (jobs, tokens) in self._pending.items()]
+
+    @staticmethod
+    def _matches(entry: Dict[str, str], filters: Dict[str, Any]) -> bool:
+        if any(filters.get(c) and entry[c] != filters[c] for c in ("client_name", "company_id", "job_type", "model")):
+            return False
+        if filters.get("since") and entry["day"] < filters["since"]:
+            return False
+        return not (filters.get("until") and entry["day"] > filters["until"])
+
+    def grant(self, client_name: str, tokens: int) -> int:
+        """Add credit (tokens may be negative to debit). Returns the new durable balance."""
+        conn = self._conn()
+        row = conn.execute(
+            "INSERT INTO credits (client_name, balance, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(client_name) DO UPDATE SET balance = balance + excluded.balance, "
+            "updated_at = excluded.updated_at RETURNING balance",
+            (client_name, tokens, time.time()),
+        ).fetchone()
+        self._balances.pop(client_name, None)
+        return row[0]
+
+
+ledger = Ledger()
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    try:
+        ledger.flush()
+    except Exception:
+        logger.exception("Final ledger flush failed")
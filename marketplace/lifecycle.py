@@ -0,0 +1,56 @@
+"""
+TechCrossIT Marketplace — Worker Lifecycle
+Tracks in-flight jobs so a worker can drain gracefully on deploy: once draining starts,
+new jobs are refused and shutdown waits for running jobs up to a deadline.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from marketplace import metrics
+
+logger = logging.getLogger(__name__)
+
+# How long shutdown waits for in-flight jobs before exiting anyway.
+SHUTDOWN_DRAIN_SECONDS = float(os.environ.get("SHUTDOWN_DRAIN_SECONDS", "120"))
+
+
+class Drain:
+    def __init__(self):
+        self.in_flight = 0
+        self.draining = False
+        self._lock = threading.Lock()
+
+    def begin(self) -> None:
+        if not self.draining:
+            self.draining = True
+            logger.info("Draining: refusing new jobs, %d in flight", self.in_flight)
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def wait_idle(self, timeout: float = SHUTDOWN_DRAIN_SECONDS) -> bool:
+        """Wait until no jobs are in flight. Returns False if the deadline passed first."""
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.25)
+        if self.in_flight:
+            logger.warning("Drain deadline reached with %d jobs still in flight", self.in_flight)
+            return False
+        return True
+
+
+drain = Drain()
+# Summed over live workers at scrape time (no shared write per job, nothing left behind by a crash).
+metrics.gauge("jobs_in_flight", lambda: drain.in_flight)
@@ -0,0 +1,123 @@
+"""
+TechCrossIT Marketplace — Model Calls
+Shared helper for calling Claude through the upstream pool (marketplace/upstream.py), which
+caps concurrent calls per API key / endpoint and routes around unhealthy ones.
+Calls made for a dispatched job are streamed so they can be abandoned the moment the job is
+cancelled (deadline, client disconnect, explicit cancel), which stops upstream generation.
+"""
+
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from marketplace.context import JobCancelled, JobContext, current_job
+from marketplace.upstream import RETRYABLE, Member, pool
+
+
+MODEL = "claude-sonnet-4-6"
+
+# Attempts per call. Retryable failures (429, 5xx, 529, connection) move to another pool
+# member, unless output has already been streamed to the job's listener.
+UPSTREAM_MAX_ATTEMPTS = 3
+
+# Sent with every call so a local stand-in (tools/fake_model_server.py) can apply per-job-type
+# profiles. The Anthropic SDK reads ANTHROPIC_BASE_URL, which is how the stand-in is selected.
+JOB_TYPE_HEADER = "X-AgentHire-Job-Type"
+
+# Rough size of a token, for estimating the output of a call abandoned mid-stream.
+CHARS_PER_TOKEN = 4
+
+# Typical output tokens per job type (EWMA), to estimate what a cancel saved.
+_typical_output: Dict[str, float] = {}
+
+
+def complete(system: str, prompt: str, max_tokens: int = 4096,
+             job_type: Optional[str] = None, on_delta: Optional[Callable[[str], None]] = None) -> Tuple[str, int]:
+    """
+    Run one messages call on the upstream pool's least-loaded healthy member.
+    Returns (text, tokens_used).
+    Inside a dispatched job the call is streamed: text goes to the job's on_delta listener
+    (or to `on_delta`, when given) as it arrives, and the stream is closed as soon as the
+    job is cancelled (JobCancelled).
+    """
+    ctx = current_job.get()
+    request = dict(
+        model=MODEL,
+        max_tokens=max_tokens,
+        system=system,
+        messages=[{"role": "user", "content": prompt}],
+        extra_headers={JOB_TYPE_HEADER: job_type} if job_type else None,
+    )
+    if ctx:
+        ctx.check()
+
+    failed: List[str] = []
+    for attempt in range(1, UPSTREAM_MAX_ATTEMPTS + 1):
+        streamed = [0]
+        with pool.lease(ctx, exclude=failed) as member:
+            started = time.monotonic()
+            try:
+                if ctx is None:
+                    response = member.client.messages.create(**request)
+                else:
+                    response = _stream(ctx, member, request, job_type or "", streamed, on_delta or ctx.on_delta)
+            except Exception as e:
+                if ctx:
+                    ctx.check()       # timed out at the deadline, or closed by a cancel
+                kind = pool.record_failure(member, e)
+                if kind not in RETRYABLE or streamed[0] or attempt == UPSTREAM_MAX_ATTEMPTS:
+                    raise
+                failed.append(member.name)
+                continue
+            finally:
+                if ctx:
+                    ctx.account(call_seconds=time.monotonic() - started)
+            pool.record_success(member, time.monotonic() - started)
+        break
+
+    usage = response.usage
+    tokens = usage.input_tokens + usage.output_tokens
+    if ctx:
+        ctx.account(tokens_used=tokens, input_tokens=usage.input_tokens, output_tokens=usage.output_tokens,
+                    cached_tokens=getattr(usage, "cache_read_input_tokens", None) or 0, calls=1)
+    if job_type:
+        previous = _typical_output.get(job_type, usage.output_tokens)
+        _typical_output[job_type] = previous + 0.2 * (usage.output_tokens - previous)
+    return response.content[0].text, tokens
+
+
+def _stream(ctx: JobContext, member: Member, request: dict, job_type: str, streamed: List[int],
+            on_delta: Optional[Callable[[str], None]]):
+    client = member.client
+    remaining = ctx.remaining()
+    if remaining is not None:
+        # Bounds the wait for the first byte, before the stream can be closed from outside.
+        client = client.with_options(timeout=max(1.0, remaining))
+    generated = 0
+    with client.messages.stream(**request) as stream:
+        ctx.add_closer(stream.close)
+        try:
+            try:
+                for text in stream.text_stream:
+                    generated += len(text)
+                    streamed[0] = generated
+                    if on_delta:
+                        on_delta(text)
+                    ctx.check()
+                return stream.get_final_message()
+            except Exception:
+                # A stream closed under us by a cancel, or a timeout at the deadline, is a cancel.
+                ctx.check()
+                raise
+        except JobCancelled:
+            # Input is billed regardless; count what was generated and estimate what wasn't.
+            try:
+                input_tokens = stream.current_message_snapshot.usage.input_tokens
+            except Exception:
+                input_tokens = 0        # cancelled before the first event arrived
+            output_tokens = generated // CHARS_PER_TOKEN
+            typical = _typical_output.get(job_type, request["max_tokens"] / 2)
+            ctx.account(tokens_used=input_tokens + output_tokens, tokens_saved=max(0, int(typical) - output_tokens),
+                        input_tokens=input_tokens, output_tokens=output_tokens, calls=1)
+            raise
+        finally:
+            ctx.remove_closer(stream.close)
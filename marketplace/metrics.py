@@ -0,0 +1,70 @@
+"""
+TechCrossIT Marketplace — Metrics
+Named counters kept in shared state, so /marketplace/metrics reports totals across all workers.
+
+Gauges (values that go up and down, like jobs in flight) are not counters: each worker
+publishes its own current value every GAUGE_SECONDS from a background thread, with a TTL, and
+a scrape sums the live workers' values. A worker that dies stops counting once its value
+expires, instead of leaving a shared total permanently off.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from marketplace.shared import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = "metrics:"
+_GAUGE_PREFIX = "gauge:"
+
+# How often each worker publishes its gauges; a value outlives its worker by at most 3× this.
+GAUGE_SECONDS = 2.0
+
+_gauges: Dict[str, Callable[[], float]] = {}
+_gauge_lock = threading.Lock()
+_gauge_thread: Optional[threading.Thread] = None
+
+
+def incr(name: str, amount: float = 1) -> None:
+    """Add to a counter. Metrics are best-effort and never raise into the request path."""
+    try:
+        get_shared_state().incr(_PREFIX + name, amount)
+    except Exception:
+        logger.exception("Failed to record metric %s", name)
+
+
+def gauge(name: str, read: Callable[[], float]) -> None:
+    """Report read() as this worker's value of gauge `name` from now on."""
+    global _gauge_thread
+    with _gauge_lock:
+        _gauges[name] = read
+        if _gauge_thread is None:
+            _gauge_thread = threading.Thread(target=_publish_gauges, name="metrics-gauges", daemon=True)
+            _gauge_thread.start()
+
+
+def _publish_gauges() -> None:
+    pid = os.getpid()
+    while True:
+        try:
+            state = get_shared_state()
+            for name, read in list(_gauges.items()):
+                state.set(f"{_GAUGE_PREFIX}{name}:{pid}", read(), ttl=3 * GAUGE_SECONDS)
+        except Exception:
+            logger.exception("Failed to publish gauges")
+        time.sleep(GAUGE_SECONDS)
+
+
+def snapshot() -> Dict[str, float]:
+    """Counters, plus each gauge summed over live workers (this worker's value read live)."""
+    state = get_shared_state()
+    totals = {k[len(_PREFIX):]: v for k, v in state.counters(_PREFIX).items()}
+    own = f":{os.getpid()}"
+    for name, read in list(_gauges.items()):
+        others = state.values(f"{_GAUGE_PREFIX}{name}:")
+        totals[name] = read() + sum(v for k, v in others.items() if not k.endswith(own))
+    return dict(sorted(totals.items()))
@@ -23,6 +23,7 @@ class JobStatus(str, Enum):
     RUNNING     = "running"
     DONE        = "done"
     FAILED      = "failed"
+    CANCELLED   = "cancelled"
 
 
 # ── JOB INTAKE (universal) ──────────────────────────────────────────────────
@@ -33,11 +34,14 @@ class JobIntake(BaseModel):
     job_type:     str                  = Field(..., description="Specific job template key")
     brief:        str                  = Field(..., description="Plain-English description of the work")
     context:      Optional[str]        = Field(None, description="Background info, existing files, URLs etc.")
-    client_name:  Optional[str]        = Field(None, description="Client / requester name")
+    client_name:  Optional[str]        = Field(None, description="Set from the caller's API key; a value sent here is ignored")
     tone:         Optional[str]        = Field("professional", description="Tone: formal | casual | technical | friendly")
     output_format: Optional[str]       = Field("text", description="Output format: text | markdown | json | html")
     priority:     Optional[str]        = Field("normal", description="normal | urgent | scheduled")
+    deadline_seconds: Optional[int]    = Field(None, gt=0, description="Refuse the job (503) if it can't finish within this many seconds, and cancel it if it runs longer")
     extra:        Optional[Dict[str, Any]] = Field(default_factory=dict, description="Company-specific extra fields")
+    callback_url: Optional[str]        = Field(None, max_length=2048, pattern=r"^https?://[^\s/]+\S*$",
+                                               description="POST the signed JobResult here when the job finishes; submit then returns 202 at once")
 
     class Config:
         use_enum_values = True
@@ -58,6 +62,28 @@ class JobResult(BaseModel):
     tokens_used:  Optional[int]  = None
 
 
+# ── JOB HISTORY ─────────────────────────────────────────────────────────────
+
+class JobSummary(BaseModel):
+    """Listing row for a stored job — everything except the output body."""
+    job_id:       str
+    created_at:   float                 # unix seconds
+    client_name:  Optional[str] = None
+    company_id:   str
+    job_type:     str
+    status:       JobStatus
+    duration_ms:  Optional[int] = None
+    tokens_used:  Optional[int] = None
+    output_size:  int           = 0     # characters; fetch /marketplace/jobs/{job_id} for the body
+    error:        Optional[str] = None
+
+
+class JobPage(BaseModel):
+    """One page of job history. Pass next_cursor back to get the following page."""
+    items:        List[JobSummary]
+    next_cursor:  Optional[str] = None
+
+
 # ── COMPANY CARD (for marketplace listing) ──────────────────────────────────
 
 class CompanyCard(BaseModel):
@@ -71,3 +97,27 @@ class CompanyCard(BaseModel):
     icon:         str                   # emoji or URL
     colour:       str                   # hex accent colour
     price_from:   str                   # "£0.50 / job" or "Subscription"
+
+
+# ── PIPELINES (multi-step jobs) ─────────────────────────────────────────────
+
+class PipelineStep(BaseModel):
+    """One job in a pipeline. Briefs may reference earlier outputs: {{steps.<id>.output}}."""
+    id:           str                  = Field(..., description="Step id, unique within the pipeline", pattern=r"^[A-Za-z0-9_\-]+$")
+    intake:       JobIntake
+    depends_on:   List[str]            = Field(default_factory=list, description="Step ids that must finish first")
+
+
+class PipelineRequest(BaseModel):
+    """A DAG of job steps submitted in one call."""
+    steps:        List[PipelineStep]   = Field(..., min_length=1)
+
+
+class PipelineRun(BaseModel):
+    """State of a pipeline run — returned on submit, re-run and lookup."""
+    pipeline_id:  str
+    status:       JobStatus
+    steps:        Dict[str, JobResult] = Field(default_factory=dict)   # step id -> latest result
+    skipped:      List[str]            = Field(default_factory=list)   # not run because a dependency failed
+    duration_ms:  Optional[int]        = None
+    tokens_used:  Optional[int]        = None
@@ -0,0 +1,101 @@
+"""
+TechCrossIT Marketplace — Multi-Part Jobs
+Job types whose deliverable is several independent pieces (5 social posts, a 3-email
+campaign, ...) declare them as parts in their agent's JOB_PARTS. Each part is generated
+by its own model call, and the calls run concurrently. Every call gets the same system
+prompt and job prompt, followed by the one part it should write. The parts are then
+assembled under their headings, in order. Wall-clock time tracks the longest part rather
+than the sum of all of them. The shared prompt is sent once per part, so input tokens
+grow with the part count; outputs are about the same size.
+
+Streamed output stays in document order: the first unfinished part streams live and later
+parts are held back until it completes.
+
+Config:
+  PARALLEL_PARTS=on | off
+"""
+
+import functools
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from marketplace import llm
+from marketplace.context import current_job, run_concurrently
+from marketplace.upstream import pool
+
+PARALLEL_PARTS = os.environ.get("PARALLEL_PARTS", "on").lower() == "on"
+
+PART_PROMPT = """
+
+You are writing part {index} of {total} of this deliverable. The other parts are being written separately.
+Write ONLY this part: {instruction}
+Start directly with its content — no heading for the part, no preamble, and no mention of the other parts."""
+
+
+@dataclass(frozen=True)
+class Part:
+    title:       str     # heading in the assembled output
+    instruction: str     # what this part's call should write
+
+
+def heading(part: Part) -> str:
+    return f"## {part.title}\n\n"
+
+
+class _OrderedRelay:
+    """Forwards parts' streamed text to the job's listener in document order."""
+
+    def __init__(self, emit: Callable[[str], None], parts: Sequence[Part]):
+        self._emit = emit
+        self._parts = parts
+        self._held: List[List[str]] = [[] for _ in parts]
+        self._finished = [False] * len(parts)
+        self._current = 0
+        self._lock = threading.Lock()
+        self._emit(heading(parts[0]))
+
+    def listener(self, index: int) -> Callable[[str], None]:
+        def on_delta(text: str) -> None:
+            with self._lock:
+                if index == self._current:
+                    self._emit(text)
+                else:
+                    self._held[index].append(text)
+        return on_delta
+
+    def finish(self, index: int) -> None:
+        with self._lock:
+            self._finished[index] = True
+            while self._current < len(self._parts) and self._finished[self._current]:
+                self._current += 1
+                if self._current < len(self._parts):
+                    self._emit("\n\n" + heading(self._parts[self._current]) + "".join(self._held[self._current]))
+                    self._held[self._current] = []
+
+
+def complete_parts(system: str, prompt: str, parts: Sequence[Part],
+                   job_type: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Generate each part concurrently and assemble them. Returns (output, tokens_used).
+    The calls belong to the current job, so a cancel or deadline stops all of them; if any
+    part fails, the other parts' calls are stopped at once and the job fails as it would for
+    a single call.
+    """
+    ctx = current_job.get()
+    relay = _OrderedRelay(ctx.on_delta, parts) if ctx and ctx.on_delta else None
+    total = len(parts)
+
+    def write(index: int) -> Tuple[str, int]:
+        part_prompt = prompt + PART_PROMPT.format(index=index + 1, total=total, instruction=parts[index].instruction)
+        text, tokens = llm.complete(system, part_prompt, job_type=job_type,
+                                    on_delta=relay.listener(index) if relay else None)
+        if relay:
+            relay.finish(index)
+        return text.strip(), tokens
+
+    written = run_concurrently([functools.partial(write, i) for i in range(total)], int(pool.capacity()))
+
+    output = "\n\n".join(heading(part) + text for part, (text, _) in zip(parts, written))
+    return output, sum(tokens for _, tokens in written)
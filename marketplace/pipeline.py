@@ -0,0 +1,195 @@
+"""
+TechCrossIT Marketplace — Job Pipelines
+Runs a DAG of JobIntake steps: independent branches run concurrently, and earlier
+outputs are templated into later briefs with {{steps.<id>.output}}.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from marketplace.context import generate_job_id
+from marketplace.models import JobIntake, JobResult, JobStatus, PipelineRequest, PipelineRun
+from marketplace.shared import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+Dispatch = Callable[[JobIntake], Awaitable[JobResult]]
+
+# {{steps.research.output}} / {{ steps.research.job_id }}
+_STEP_REF = re.compile(r"\{\{\s*steps\.([A-Za-z0-9_\-]+)\.(output|job_id)\s*\}\}")
+
+# How long finished runs stay available for lookups and partial re-runs. Runs live in shared
+# state, so a re-run can land on any worker.
+PIPELINE_TTL_SECONDS = float(os.environ.get("PIPELINE_TTL_SECONDS", str(24 * 3600)))
+
+
+class PipelineError(ValueError):
+    """Raised for an invalid pipeline definition (unknown dependency, cycle, duplicate id)."""
+
+
+def _references(intake: JobIntake) -> Set[str]:
+    text = f"{intake.brief}\n{intake.context or ''}"
+    return {m.group(1) for m in _STEP_REF.finditer(text)}
+
+
+def plan(request: PipelineRequest) -> Dict[str, List[str]]:
+    """
+    Validate the DAG and return {step_id: dependency ids} in topological order.
+    Steps referenced from a template are implicit dependencies.
+    """
+    ids = [s.id for s in request.steps]
+    duplicates = {i for i in ids if ids.count(i) > 1}
+    if duplicates:
+        raise PipelineError(f"Duplicate step ids: {sorted(duplicates)}")
+
+    deps = {s.id: sorted(set(s.depends_on) | _references(s.intake)) for s in request.steps}
+    for step_id, step_deps in deps.items():
+        unknown = [d for d in step_deps if d not in deps]
+        if unknown:
+            raise PipelineError(f"Step '{step_id}' depends on unknown steps: {unknown}")
+        if step_id in step_deps:
+            raise PipelineError(f"Step '{step_id}' depends on itself")
+
+    # Kahn's algorithm — keeps submission order among steps that are ready together.
+    remaining = {k: set(v) for k, v in deps.items()}
+    ordered: Dict[str, List[str]] = {}
+    while remaining:
+        ready = [k for k in ids if k in remaining and not remaining[k]]
+        if not ready:
+            raise PipelineError(f"Pipeline has a cycle between steps: {sorted(remaining)}")
+        for k in ready:
+            ordered[k] = deps[k]
+            del remaining[k]
+        for v in remaining.values():
+            v.difference_update(ready)
+    return ordered
+
+
+def render_intake(intake: JobIntake, results: Dict[str, JobResult]) -> JobIntake:
+    """Substitute {{steps.<id>.output|job_id}} in brief and context with earlier results."""
+    def sub(match: re.Match) -> str:
+        result = results[match.group(1)]
+        return (result.output or "") if match.group(2) == "output" else result.job_id
+
+    return intake.model_copy(update={
+        "brief":   _STEP_REF.sub(sub, intake.brief),
+        "context": _STEP_REF.sub(sub, intake.context) if intake.context else intake.context,
+    })
+
+
+class PipelineRunner:
+    """Executes pipelines through a dispatch coroutine and remembers recent runs for re-runs."""
+
+    def __init__(self, dispatch: Dispatch, state: Optional[SharedState] = None,
+                 ttl: float = PIPELINE_TTL_SECONDS):
+        self._dispatch = dispatch
+        self._state = state
+        self._ttl = ttl
+
+    @property
+    def state(self) -> SharedState:
+        return self._state or get_shared_state()
+
+    def _load(self, pipeline_id: str) -> Optional[Tuple[PipelineRequest, PipelineRun]]:
+        entry = self.state.get(f"pipeline:{pipeline_id}")
+        if entry is None:
+            return None
+        return PipelineRequest.model_validate(entry["request"]), PipelineRun.model_validate(entry["run"])
+
+    def _save(self, request: PipelineRequest, run: PipelineRun) -> None:
+        self.state.set(f"pipeline:{run.pipeline_id}", {
+            "request": request.model_dump(mode="json"),
+            "run":     run.model_dump(mode="json"),
+        }, ttl=self._ttl)
+
+    def get(self, pipeline_id: str) -> Optional[PipelineRun]:
+        entry = self._load(pipeline_id)
+        return entry[1] if entry else None
+
+    async def submit(self, request: PipelineRequest) -> PipelineRun:
+        run = PipelineRun(pipeline_id=str(uuid.uuid4())[:12], status=JobStatus.RUNNING)
+        await self._execute(request, run, rerun=set(plan(request)))
+        return run
+
+    async def rerun(self, pipeline_id: str, from_step: Optional[str] = None,
+                    client_name: Optional[str] = None) -> PipelineRun:
+        """
+        Re-run a stored pipeline from `from_step` (or from every step that did not finish)
+        plus everything downstream of it. Completed upstream results are reused as-is.
+        The re-run steps are billed to client_name, the client asking for the re-run.
+        """
+        entry = self._load(pipeline_id)
+        if entry is None:
+            raise KeyError(pipeline_id)
+        request, previous = entry
+        for step in request.steps:
+            step.intake.client_name = client_name
+        deps = plan(request)
+        if from_step is not None and from_step not in deps:
+            raise PipelineError(f"Unknown step: {from_step}")
+
+        starts = {from_step} if from_step else {
+            k for k in deps if k not in previous.steps or previous.steps[k].status != JobStatus.DONE
+        }
+        rerun = set(starts)
+        for step_id, step_deps in deps.items():          # topological order → one pass suffices
+            if rerun.intersection(step_deps):
+                rerun.add(step_id)
+
+        run = previous.model_copy(deep=True)
+        run.status = JobStatus.RUNNING
+        await self._execute(request, run, rerun=rerun)
+        return run
+
+    async def _execute(self, request: PipelineRequest, run: PipelineRun, rerun: Set[str]) -> None:
+        start = time.time()
+        deps = plan(request)
+        steps = {s.id: s for s in request.steps}
+        results: Dict[str, JobResult] = {k: v for k, v in run.steps.items() if k not in rerun}
+        skipped: Set[str] = set()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step_id: str) -> None:
+            await asyncio.gather(*(tasks[d] for d in deps[step_id] if d in tasks))
+            if any(d in skipped or d not in results or results[d].status != JobStatus.DONE
+                   for d in deps[step_id]):
+                skipped.add(step_id)
+                results.pop(step_id, None)
+                return
+            intake = render_intake(steps[step_id].intake, results)
+            try:
+                results[step_id] = await self._dispatch(intake)
+            except Exception as e:
+                # Refused (503 overload / draining, 402 credit, 409) or crashed: the step fails,
+                # its dependents are skipped, and the run is kept so it can be re-run.
+                if not isinstance(e, HTTPException):
+                    logger.exception("Pipeline %s step %s failed", run.pipeline_id, step_id)
+                results[step_id] = JobResult(
+                    job_id=generate_job_id(), company_id=intake.company_id, job_type=intake.job_type,
+                    status=JobStatus.FAILED, error=getattr(e, "detail", None) or str(e),
+                    metadata={"http_status": e.status_code} if isinstance(e, HTTPException) else {},
+                )
+
+        try:
+            for step_id in deps:                          # deps come first in topological order
+                if step_id in rerun:
+                    tasks[step_id] = asyncio.create_task(run_step(step_id))
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()                             # no-op for finished steps
+            run.steps = {k: results[k] for k in deps if k in results}
+            run.skipped = [k for k in deps if k in skipped]
+            failed = run.skipped or len(run.steps) < len(deps) or \
+                any(r.status != JobStatus.DONE for r in run.steps.values())
+            run.status = JobStatus.FAILED if failed else JobStatus.DONE
+            run.duration_ms = int((time.time() - start) * 1000)
+            run.tokens_used = sum(r.tokens_used or 0 for r in run.steps.values())
+            self._save(request, run)
@@ -0,0 +1,170 @@
+"""
+TechCrossIT Marketplace — Sampling Profiler
+Low-overhead, on-demand profiling for production diagnosis (see api/debug_routes.py).
+
+A background thread snapshots the Python stacks of the watched threads every few
+milliseconds (sys._current_frames) and counts identical stacks. Nothing is instrumented
+and nothing runs while no profile is active. Output is the collapsed-stack format read by
+flamegraph.pl, speedscope and inferno:
+
+    MainThread;base_events.py:BaseEventLoop.run_forever;...;json/encoder.py:encode 42
+
+Per-request profiles (X-Debug-Profile on /marketplace/submit) watch the event-loop thread
+plus the executor thread that runs the job. Event-loop samples include any other requests
+served concurrently.
+
+Config:
+  DEBUG_TOKEN=          (unset = debug surface disabled)
+"""
+
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN") or None
+
+DEFAULT_INTERVAL = 0.005
+# Per-request profiles kept for GET /marketplace/debug/profiles/{id}.
+KEEP_PROFILES = 20
+
+# Leaf frames that mean "waiting", left out of the hot-frame summary (not the stacks).
+_IDLE_LEAVES = {
+    "threading.py:Condition.wait", "threading.py:Event.wait", "threading.py:Semaphore.acquire",
+    "queue.py:Queue.get", "selectors.py:EpollSelector.select", "selectors.py:KqueueSelector.select",
+    "threading.py:Thread._wait_for_tstate_lock", "thread.py:_worker",
+    "profiling.py:profile_window", "context.py:RunningJobs._watch",
+}
+
+
+def _label(code) -> str:
+    parts = code.co_filename.replace("\\", "/").split("/")
+    return f"{'/'.join(parts[-2:]) if parts[-1] == '__init__.py' else parts[-1]}:{code.co_qualname}"
+
+
+class Sampler:
+    """Counts collapsed stacks of `thread_ids` (None = every thread but its own)."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread_ids: Optional[Iterable[int]] = None):
+        self.interval = interval
+        self.thread_ids: Optional[Set[int]] = set(thread_ids) if thread_ids is not None else None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = self.stopped = 0.0
+        self._cpu_started = self._cpu_stopped = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, thread_id: int) -> None:
+        if self.thread_ids is not None:
+            self.thread_ids.add(thread_id)
+
+    def start(self) -> "Sampler":
+        self.started, self._cpu_started = time.perf_counter(), time.process_time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        if self._stop.is_set():
+            return self
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped, self._cpu_stopped = time.perf_counter(), time.process_time()
+        return self
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        """Wall / process-CPU time and the hottest leaf frames, ignoring idle waits."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if leaf not in _IDLE_LEAVES:
+                leaves[leaf] += count
+        busy = sum(leaves.values())
+        return {
+            "wall_ms":  round((self.stopped - self.started) * 1000, 1),
+            "cpu_ms":   round((self._cpu_stopped - self._cpu_started) * 1000, 1),
+            "samples":  self.samples,
+            "busy":     busy,
+            "top":      [[frame, count] for frame, count in leaves.most_common(top)],
+        }
+
+
+# ── ON-DEMAND WINDOW ────────────────────────────────────────────────────────
+
+_window_lock = threading.Lock()
+
+
+def profile_window(seconds: float, interval: float = DEFAULT_INTERVAL) -> Optional[Sampler]:
+    """Sample every thread for `seconds` (blocking). None if another window is running."""
+    if not _window_lock.acquire(blocking=False):
+        return None
+    try:
+        sampler = Sampler(interval).start()
+        time.sleep(seconds)
+        return sampler.stop()
+    finally:
+        _window_lock.release()
+
+
+# ── PER-REQUEST ─────────────────────────────────────────────────────────────
+
+current_profile: contextvars.ContextVar[Optional[Sampler]] = contextvars.ContextVar("current_profile", default=None)
+
+_recent: "OrderedDict[str, str]" = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def follow(fn: Callable) -> Callable:
+    """
+    Wrap an executor target so the request's profile also samples the thread it runs on.
+    Returns fn unchanged when the request isn't being profiled.
+    """
+    sampler = current_profile.get()
+    if sampler is None:
+        return fn
+
+    @functools.wraps(fn)
+    def followed(*args, **kwargs):
+        sampler.watch(threading.get_ident())
+        return fn(*args, **kwargs)
+    return followed
+
+
+def keep(sampler: Sampler) -> str:
+    """Store a finished per-request profile's stacks; returns its id."""
+    profile_id = uuid.uuid4().hex[:12]
+    with _recent_lock:
+        _recent[profile_id] = sampler.collapsed()
+        while len(_recent) > KEEP_PROFILES:
+            _recent.popitem(last=False)
+    return profile_id
+
+
+def get_kept(profile_id: str) -> Optional[str]:
+    with _recent_lock:
+        return _recent.get(profile_id)
@@ -0,0 +1,85 @@
+"""
+TechCrossIT Marketplace — Queued Log Writer
+A logger whose records are written to disk by a background thread (QueueHandler →
+QueueListener), so the request path does no file I/O. Used by the workload capture and the
+job audit log.
+
+The queue is unbounded by default. With a size limit, a record that doesn't fit is dropped
+(and on_drop called) rather than blocking the caller.
+"""
+
+import logging
+import logging.handlers
+import queue
+import threading
+from typing import Callable, Optional
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, records: queue.Queue, on_drop: Optional[Callable[[], None]]):
+        super().__init__(records)
+        self.on_drop = on_drop
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record                       # messages are finished lines with no args to merge
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.on_drop:
+                self.on_drop()
+
+
+class _Listener(logging.handlers.QueueListener):
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        if self.queue.empty():              # one flush per burst of records, not one per record
+            for handler in self.handlers:
+                handler.flush()
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)      # waits for room: a bounded queue can be full at shutdown
+
+
+class QueuedLog:
+    """
+    Builds its handler (make_handler) and listener thread on first use. close() writes out
+    the queued records and closes the handler; the next record starts them again.
+    """
+
+    def __init__(self, name: str, make_handler: Callable[[], logging.Handler], max_queue: int = 0,
+                 on_drop: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.make_handler = make_handler
+        self.max_queue = max_queue
+        self.on_drop = on_drop
+        self._logger: Optional[logging.Logger] = None
+        self._listener: Optional[_Listener] = None
+        self._lock = threading.Lock()
+
+    def write(self, line: str) -> None:
+        self._get_logger().info(line)
+
+    def _get_logger(self) -> logging.Logger:
+        with self._lock:
+            if self._logger is None:
+                records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=self.max_queue)
+                self._listener = _Listener(records, self.make_handler())
+                self._listener.start()
+                records_logger = logging.getLogger(self.name)
+                records_logger.propagate = False
+                records_logger.setLevel(logging.INFO)
+                records_logger.handlers.clear()
+                records_logger.addHandler(_QueueHandler(records, self.on_drop))
+                self._logger = records_logger
+            return self._logger
+
+    def close(self) -> None:
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+                self._listener = None
+                self._logger = None
@@ -0,0 +1,297 @@
+"""
+TechCrossIT Marketplace — Inbound Rate Limiting
+Per-client request limits at the edge, before any route runs.
+
+Each request is matched to one rule, the most specific by path prefix, then method.
+Each rule has its own GCRA bucket per client: `limit` requests per `seconds`, spread evenly,
+with bursts of up to `limit`. Buckets live in shared state (apart from its other keys), so
+with SHARED_STATE=sqlite every worker enforces the same limit. A single worker keeps them in
+memory (a dict update per request).
+
+Clients are identified by the first of RATE_LIMIT_KEYS present on the request:
+  api_key      a valid client API key (X-API-Key / Authorization: Bearer, see clients.py);
+               a key that isn't in CLIENT_API_KEYS is ignored, so rotating made-up keys
+               doesn't buy fresh buckets
+  client_name  ?client_name=..., or "client_name" in a JSON body of up to 64 KB
+  ip           the peer address, or the RATE_LIMIT_PROXY_HOPS-th entry from the right of
+               X-Forwarded-For when behind that many trusted proxies
+so by default an authenticated client has its own buckets and everyone else is limited by IP.
+client_name is self-declared — a caller gets fresh buckets by changing it — so it is not
+used by default. Add it only behind a gateway that authenticates client names.
+
+WebSocket connections aren't HTTP requests, so the middleware doesn't see their frames:
+ws_routes checks each "submit" frame against the POST /marketplace/submit rule with
+check_websocket().
+
+Every limited response carries RateLimit-Limit / -Remaining / -Reset / -Policy; a refusal
+is a 429 with Retry-After.
+
+Config:
+  RATE_LIMIT=on | off
+  RATE_LIMITS="POST /marketplace/submit=30/60, * /marketplace=600/60"   # METHOD PATH=LIMIT/SECONDS, ...
+  RATE_LIMIT_KEYS=api_key,ip
+  RATE_LIMIT_PROXY_HOPS=0
+"""
+
+import json
+import logging
+import math
+import os
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from fastapi.concurrency import run_in_threadpool
+
+from marketplace import metrics
+from marketplace.clients import authenticate
+from marketplace.shared import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMITS = ", ".join([
+    "POST /marketplace/submit=30/60",
+    "POST /marketplace/pipelines=10/60",
+    "POST /marketplace/sales/enrich=10/3600",
+    "* /marketplace/support=120/60",
+    "* /marketplace=600/60",
+])
+
+RATE_LIMIT = os.environ.get("RATE_LIMIT", "on").lower() == "on"
+RATE_LIMITS = os.environ.get("RATE_LIMITS", DEFAULT_RATE_LIMITS)
+RATE_LIMIT_KEYS = [k.strip() for k in os.environ.get("RATE_LIMIT_KEYS", "api_key,ip").split(",") if k.strip()]
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get("RATE_LIMIT_PROXY_HOPS", "0"))
+
+# JSON bodies up to this size are read ahead to find client_name (the route reads them anyway).
+PEEK_BODY_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Rule:
+    method:  str        # "*" = any
+    path:    str        # prefix
+    limit:   int
+    seconds: float
+
+    @property
+    def interval(self) -> float:
+        return self.seconds / self.limit
+
+    @property
+    def policy(self) -> str:
+        return f"{self.limit};w={self.seconds:g}"
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method in ("*", method)
+                and (path == self.path or path.startswith(self.path.rstrip("/") + "/")))
+
+
+def parse_rules(spec: str) -> List[Rule]:
+    """'POST /marketplace/submit=30/60, * /marketplace=600/60' → rules, most specific first."""
+    rules = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        try:
+            target, rate = entry.rsplit("=", 1)
+            method, path = target.split()
+            limit, seconds = rate.split("/")
+            rule = Rule(method.upper(), path, int(limit), float(seconds))
+        except ValueError:
+            raise ValueError(f"Bad RATE_LIMITS entry {entry!r}: expected 'METHOD /path=LIMIT/SECONDS'")
+        if rule.limit < 1 or rule.seconds <= 0:
+            raise ValueError(f"Bad RATE_LIMITS entry {entry!r}: limit and seconds must be positive")
+        rules.append(rule)
+    return sorted(rules, key=lambda r: (-len(r.path), r.method == "*"))
+
+
+def match(rules: Iterable[Rule], method: str, path: str) -> Optional[Rule]:
+    return next((r for r in rules if r.matches(method, path)), None)
+
+
+# ── CLIENT IDENTITY ─────────────────────────────────────────────────────────
+
+def _ip(scope, headers: dict) -> str:
+    if RATE_LIMIT_PROXY_HOPS:
+        forwarded = [h.strip() for h in headers.get(b"x-forwarded-for", b"").decode("latin-1").split(",") if h.strip()]
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    return scope["client"][0] if scope.get("client") else "unknown"
+
+
+def _query_client_name(scope) -> Optional[str]:
+    return parse_qs(scope.get("query_string", b"").decode("latin-1")).get("client_name", [None])[0]
+
+
+def _client_name_from_body(body: bytes) -> Optional[str]:
+    try:
+        value = json.loads(body).get("client_name")
+    except (ValueError, AttributeError):
+        return None
+    return value if isinstance(value, str) and value else None
+
+
+# ── MIDDLEWARE ──────────────────────────────────────────────────────────────
+
+class RateLimitMiddleware:
+    """Pure ASGI. Requests outside every rule pass through untouched."""
+
+    def __init__(self, app, rules: Optional[List[Rule]] = None, keys: Optional[List[str]] = None):
+        self.app = app
+        self.rules = parse_rules(RATE_LIMITS) if rules is None else rules
+        self.keys = RATE_LIMIT_KEYS if keys is None else keys
+
+    async def __call__(self, scope, receive, send):
+        rule = match(self.rules, scope["method"], scope["path"]) if scope["type"] == "http" and RATE_LIMIT else None
+        if rule is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        identity, receive = await self._identify(scope, receive)
+        try:
+            allowed, reset = await self._throttle(f"rl:{rule.method} {rule.path}:{identity}", rule)
+        except Exception:
+            logger.exception("Rate limit check failed; letting the request through")
+            await self.app(scope, receive, send)
+            return
+
+        remaining = max(0, math.floor((rule.interval * rule.limit - reset) / rule.interval)) if allowed else 0
+        headers = [
+            (b"ratelimit-limit", str(rule.limit).encode()),
+            (b"ratelimit-remaining", str(remaining).encode()),
+            (b"ratelimit-reset", str(math.ceil(reset)).encode()),
+            (b"ratelimit-policy", rule.policy.encode()),
+        ]
+        if not allowed:
+            metrics.incr("requests_rate_limited")
+            retry_after = _retry_after(rule, reset)
+            await self._refuse(send, rule, retry_after, headers)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    async def _throttle(self, key: str, rule: Rule) -> Tuple[bool, float]:
+        return await _throttle(key, rule)
+
+    async def _identify(self, scope, receive):
+        """(identity, receive). `receive` replays the body if it had to be read to find client_name."""
+        headers = dict(scope["headers"])
+        for kind in self.keys:
+            if kind == "api_key":
+                client = authenticate(headers)
+                if client:
+                    return f"key:{client}", receive
+            elif kind == "client_name":
+                name = _query_client_name(scope)
+                if not name and self._peekable(headers):
+                    body, receive = await _read_body(receive)
+                    name = _client_name_from_body(body)
+                if name:
+                    return f"client:{name}", receive
+            elif kind == "ip":
+                return f"ip:{_ip(scope, headers)}", receive
+        return "anonymous", receive
+
+    @staticmethod
+    def _peekable(headers: dict) -> bool:
+        if b"json" not in headers.get(b"content-type", b""):
+            return False
+        try:
+            return 0 < int(headers.get(b"content-length", b"0")) <= PEEK_BODY_BYTES
+        except ValueError:
+            return False
+
+    @staticmethod
+    async def _refuse(send, rule: Rule, retry_after: int, headers: list) -> None:
+        body = json.dumps({"detail": _refusal(rule, retry_after)}).encode()
+        await send({"type": "http.response.start", "status": 429, "headers": headers + [
+            (b"retry-after", str(retry_after).encode()),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def _throttle(key: str, rule: Rule) -> Tuple[bool, float]:
+    state = get_shared_state()
+    if state.cross_process:
+        return await run_in_threadpool(state.throttle, key, rule.interval, rule.limit)
+    return state.throttle(key, rule.interval, rule.limit)
+
+
+def _retry_after(rule: Rule, reset: float) -> int:
+    return max(1, math.ceil(reset - (rule.limit - 1) * rule.interval))
+
+
+def _refusal(rule: Rule, retry_after: int) -> str:
+    return (f"Rate limit exceeded: {rule.limit} requests per {rule.seconds:g}s "
+            f"for {rule.method} {rule.path}. Retry in {retry_after}s.")
+
+
+# ── WEBSOCKET FRAMES ────────────────────────────────────────────────────────
+
+_websocket_rules: Optional[List[Rule]] = None
+
+
+def _frame_identity(scope, keys: List[str]) -> str:
+    headers = dict(scope["headers"])
+    for kind in keys:
+        if kind == "api_key":
+            client = authenticate(headers)
+            if client:
+                return f"key:{client}"
+        elif kind == "client_name":
+            name = _query_client_name(scope)
+            if name:
+                return f"client:{name}"
+        elif kind == "ip":
+            return f"ip:{_ip(scope, headers)}"
+    return "anonymous"
+
+
+async def check_websocket(scope, method: str, path: str, keys: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Count one WebSocket frame as a `method path` request from the connection's client, in
+    the same bucket as the HTTP route. Returns the refusal message, or None if allowed.
+    A body can't be peeked here, so client_name only comes from the query string.
+    """
+    global _websocket_rules
+    if not RATE_LIMIT:
+        return None
+    if _websocket_rules is None:
+        _websocket_rules = parse_rules(RATE_LIMITS)
+    rule = match(_websocket_rules, method, path)
+    if rule is None:
+        return None
+
+    identity = _frame_identity(scope, RATE_LIMIT_KEYS if keys is None else keys)
+    try:
+        allowed, reset = await _throttle(f"rl:{rule.method} {rule.path}:{identity}", rule)
+    except Exception:
+        logger.exception("Rate limit check failed; letting the frame through")
+        return None
+    if allowed:
+        return None
+    metrics.incr("requests_rate_limited")
+    return _refusal(rule, _retry_after(rule, reset))
+
+
+async def _read_body(receive):
+    """Read the whole request body, and return it with a receive() that replays it."""
+    chunks, messages = [], []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+
+    return b"".join(chunks), replay
@@ -0,0 +1,186 @@
+"""
+TechCrossIT Marketplace — Output Rendering
+Converts raw model output (markdown) to the JobIntake.output_format the client asked for:
+
+  html  — markdown → HTML; fenced code blocks get Pygments syntax highlighting (CSS classes).
+          Raw HTML in the output is escaped and links/images keep only http(s), mailto or
+          relative URLs: output echoes client briefs, so it is never trusted markup.
+  json  — markdown tables → structured JSON (finance statements, reports); numeric and
+          currency cells become numbers
+  text / markdown — returned unchanged
+
+Rendering is CPU-bound, so it runs in a process pool and never blocks the event loop.
+Rendered artifacts are cached by (output hash, format, company).
+
+Config:
+  RENDER_WORKERS=2
+  RENDER_CACHE_MAX_BYTES=67108864
+"""
+
+import asyncio
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "2"))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+RENDERED_FORMATS = {"html", "json"}
+
+
+# ── RENDERERS (run in the worker processes) ─────────────────────────────────
+
+SAFE_URL_SCHEMES = {"http", "https", "mailto"}
+_URL_IGNORED = re.compile(r"[\x00-\x20\x7f]")     # browsers drop these when reading a scheme
+
+
+def _safe_url(url: str) -> bool:
+    # Markdown keeps character references in attributes as written; the browser decodes them.
+    scheme, sep, _ = _URL_IGNORED.sub("", html.unescape(url)).lower().partition(":")
+    return not sep or scheme in SAFE_URL_SCHEMES or any(c in scheme for c in "/?#")
+
+
+class _StripUnsafeUrls:
+    """Markdown tree processor: drops href/src values with a script-capable scheme."""
+
+    def run(self, root) -> None:
+        for element in root.iter():
+            for attr in ("href", "src"):
+                if attr in element.attrib and not _safe_url(element.attrib[attr]):
+                    del element.attrib[attr]
+
+
+def to_html(output: str, highlight: bool) -> str:
+    import markdown
+
+    extensions = ["fenced_code", "tables", "sane_lists"]
+    config: Dict[str, Dict[str, Any]] = {}
+    if highlight:
+        extensions.append("codehilite")
+        config["codehilite"] = {"css_class": "highlight", "guess_lang": False}
+    md = markdown.Markdown(extensions=extensions, extension_configs=config)
+    # Without these, raw HTML passes through untouched; now it is escaped as text.
+    md.preprocessors.deregister("html_block")
+    md.inlinePatterns.deregister("html")
+    md.treeprocessors.register(_StripUnsafeUrls(), "strip_unsafe_urls", 0)
+    return md.convert(output)
+
+
+_TABLE_ROW = re.compile(r"^\s*\|?(.+?)\|?\s*$")
+_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+_NUMBER = re.compile(r"^(?P<neg>-|\()?\s*[£$€]?\s*(?P<num>\d[\d,]*(?:\.\d+)?)\s*\)?$")
+
+
+def _cells(line: str) -> List[str]:
+    return [c.strip().strip("*").strip() for c in _TABLE_ROW.match(line).group(1).split("|")]
+
+
+def _value(cell: str) -> Any:
+    """'£12,500.00' → 12500.0, '(1,200)' / '-£300' → negative, anything else stays a string."""
+    match = _NUMBER.match(cell)
+    if not match:
+        return cell
+    number = float(match.group("num").replace(",", ""))
+    return -number if match.group("neg") else number
+
+
+def tables_to_json(output: str) -> str:
+    """Extract every markdown pipe table, titled by the nearest heading above it."""
+    lines = output.splitlines()
+    tables, title, i = [], None, 0
+    while i < len(lines):
+        heading = _HEADING.match(lines[i])
+        if heading:
+            title = heading.group(1)
+        if "|" in lines[i] and i + 1 < len(lines) and _SEPARATOR.match(lines[i + 1]):
+            headers = _cells(lines[i])
+            rows, i = [], i + 2
+            while i < len(lines) and "|" in lines[i] and lines[i].strip():
+                cells = _cells(lines[i]) + [""] * len(headers)
+                rows.append({h or f"col{n}": _value(cells[n]) for n, h in enumerate(headers)})
+                i += 1
+            tables.append({"title": title, "columns": headers, "rows": rows})
+            continue
+        i += 1
+    return json.dumps({"tables": tables, "markdown": output}, ensure_ascii=False)
+
+
+def render(output: str, fmt: str, company_id: str) -> str:
+    if fmt == "html":
+        return to_html(output, highlight=company_id == "dev_shop")
+    if fmt == "json":
+        return tables_to_json(output)
+    return output
+
+
+# ── POOL + CACHE ────────────────────────────────────────────────────────────
+
+class RenderCache:
+    """LRU of rendered artifacts, bounded by total size (characters ≈ bytes for this content)."""
+
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[str]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[str, str, str], value: str) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+cache = RenderCache()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def render_async(output: str, fmt: str, company_id: str) -> Tuple[str, bool]:
+    """Render off the event loop. Returns (rendered, cache_hit)."""
+    if fmt not in RENDERED_FORMATS:
+        return output, False
+    key = (hashlib.sha256(output.encode()).hexdigest(), fmt, company_id)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(_get_pool(), render, output, fmt, company_id)
+    cache.put(key, rendered)
+    return rendered, False
@@ -0,0 +1,336 @@
+"""
+TechCrossIT Marketplace — Shared State
+Small key/value + counter + lease store for state that must be shared by every worker
+process (pipeline runs, metrics, upstream concurrency budget, rate limits, ...).
+
+Two backends with the same interface:
+  MemorySharedState  — in-process; used when running a single worker
+  SQLiteSharedState  — a local SQLite file (WAL) that all workers on the host open
+
+Config:
+  SHARED_STATE=memory | sqlite      (default: sqlite when WEB_CONCURRENCY > 1, else memory)
+  SHARED_STATE_PATH=data/shared.db
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class SharedState:
+    """Interface. Values are JSON-serialisable; ttl is in seconds (None = no expiry)."""
+
+    cross_process = False
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set only if the key is absent (or expired). Returns True if this call set it."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def values(self, prefix: str) -> Dict[str, Any]:
+        """Every unexpired key/value entry whose key starts with `prefix`."""
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: float = 1) -> float:
+        """Atomically add to a counter (created at 0) and return the new value."""
+        raise NotImplementedError
+
+    def counters(self, prefix: str = "") -> Dict[str, float]:
+        raise NotImplementedError
+
+    def acquire(self, name: str, holder: str, limit: int, lease: float) -> bool:
+        """Take one of `limit` slots for `lease` seconds. Expired leases are reclaimed."""
+        raise NotImplementedError
+
+    def release(self, name: str, holder: str) -> None:
+        raise NotImplementedError
+
+    def throttle(self, key: str, interval: float, burst: int) -> Tuple[bool, float]:
+        """
+        GCRA: one request per `interval` seconds on average, up to `burst` at once.
+        Returns (allowed, seconds until the bucket is full again); after a refusal the
+        request may be retried once that exceeds (burst - 1) * interval.
+        Buckets are stored apart from the key/value entries, so any number of them can't
+        crowd out pipeline runs, idempotency claims or running-job markers.
+        """
+        raise NotImplementedError
+
+
+def _gcra(tat: Optional[float], now: float, interval: float, burst: int) -> Tuple[bool, float]:
+    """(allowed, new theoretical arrival time) for a request at `now`."""
+    tat = max(tat or now, now)
+    if tat - now > (burst - 1) * interval:
+        return False, tat
+    return True, tat + interval
+
+
+# ── MEMORY BACKEND ──────────────────────────────────────────────────────────
+
+class MemorySharedState(SharedState):
+    """
+    Single-process backend. Keys are capped at `max_keys` and rate-limit buckets, kept
+    separately, at `max_buckets` (oldest evicted first; an evicted bucket is a full one).
+    """
+
+    def __init__(self, max_keys: int = 100_000, max_buckets: int = 100_000):
+        self._max_keys = max_keys
+        self._max_buckets = max_buckets
+        self._values: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (value, expires_at)
+        self._buckets: "OrderedDict[str, float]" = OrderedDict()  # key -> theoretical arrival time
+        self._counters: Dict[str, float] = {}
+        self._leases: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> Optional[tuple]:
+        entry = self._values.get(key)
+        if entry and entry[1] is not None and entry[1] <= now:
+            del self._values[key]
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else default
+
+    def _put(self, key: str, value: Any, ttl: Optional[float], now: float) -> None:
+        """Insert under the lock held by the caller."""
+        self._values[key] = (value, now + ttl if ttl else None)
+        self._values.move_to_end(key)
+        while len(self._values) > self._max_keys:
+            self._values.popitem(last=False)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._put(key, value, ttl, time.time())
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            if self._live(key, now):
+                return False
+            self._put(key, value, ttl, now)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def values(self, prefix):
+        now = time.time()
+        with self._lock:
+            return {k: entry[0] for k, entry in self._values.items()
+                    if k.startswith(prefix) and (entry[1] is None or entry[1] > now)}
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            return self._counters[key]
+
+    def counters(self, prefix=""):
+        with self._lock:
+            return {k: v for k, v in self._counters.items() if k.startswith(prefix)}
+
+    def acquire(self, name, holder, limit, lease):
+        now = time.time()
+        with self._lock:
+            holders = self._leases.setdefault(name, {})
+            for h in [h for h, expires in holders.items() if expires <= now]:
+                del holders[h]
+            if len(holders) >= limit:
+                return False
+            holders[holder] = now + lease
+            return True
+
+    def release(self, name, holder):
+        with self._lock:
+            self._leases.get(name, {}).pop(holder, None)
+
+    def throttle(self, key, interval, burst):
+        now = time.time()
+        with self._lock:
+            allowed, tat = _gcra(self._buckets.get(key), now, interval, burst)
+            if allowed:
+                self._buckets[key] = tat
+                self._buckets.move_to_end(key)
+                while len(self._buckets) > self._max_buckets:
+                    self._buckets.popitem(last=False)
+        return allowed, tat - now
+
+
+# ── SQLITE BACKEND ──────────────────────────────────────────────────────────
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key         TEXT PRIMARY KEY,
+    value       TEXT NOT NULL,
+    expires_at  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_kv_expires ON kv(expires_at);
+CREATE TABLE IF NOT EXISTS counters (
+    key         TEXT PRIMARY KEY,
+    value       REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    key         TEXT PRIMARY KEY,
+    tat         REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name        TEXT NOT NULL,
+    holder      TEXT NOT NULL,
+    expires_at  REAL NOT NULL,
+    PRIMARY KEY (name, holder)
+);
+"""
+
+# Expired kv rows (and full rate-limit buckets) are swept once every this many writes.
+_SWEEP_EVERY = 1000
+
+
+class SQLiteSharedState(SharedState):
+    """Cross-process backend on a local SQLite file. One connection per thread."""
+
+    cross_process = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._throttles = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _wrote(self) -> None:
+        self._writes += 1
+        if self._writes % _SWEEP_EVERY == 0:
+            self._conn().execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl else None),
+        )
+        self._wrote()
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None),
+            ).rowcount
+        self._wrote()
+        return bool(inserted)
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def values(self, prefix):
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, prefix + "\uffff", time.time()),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def incr(self, key, amount=1):
+        row = self._conn().execute(
+            "INSERT INTO counters (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value RETURNING value",
+            (key, amount),
+        ).fetchone()
+        return row[0]
+
+    def counters(self, prefix=""):
+        rows = self._conn().execute(
+            "SELECT key, value FROM counters WHERE key >= ? AND key < ?", (prefix, prefix + "\uffff"),
+        ).fetchall()
+        return dict(rows)
+
+    def acquire(self, name, holder, limit, lease):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM leases WHERE name = ? AND expires_at <= ?", (name, now))
+            held = conn.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (name,)).fetchone()[0]
+            if held >= limit:
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                         (name, holder, now + lease))
+            return True
+
+    def release(self, name, holder):
+        self._conn().execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def throttle(self, key, interval, burst):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tat FROM buckets WHERE key = ?", (key,)).fetchone()
+            allowed, tat = _gcra(row[0] if row else None, now, interval, burst)
+            if allowed:
+                conn.execute("INSERT OR REPLACE INTO buckets (key, tat) VALUES (?, ?)", (key, tat))
+        if allowed:
+            self._throttles += 1
+            if self._throttles % _SWEEP_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE tat <= ?", (now,))
+        return allowed, tat - now
+
+
+# ── FACTORY ─────────────────────────────────────────────────────────────────
+
+_state: Optional[SharedState] = None
+_state_lock = threading.Lock()
+
+
+def worker_count() -> int:
+    return max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+
+
+def get_shared_state() -> SharedState:
+    """Process-wide shared state, built from the environment on first use."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            default = "sqlite" if worker_count() > 1 else "memory"
+            backend = os.environ.get("SHARED_STATE", default).lower()
+            if backend == "sqlite":
+                _state = SQLiteSharedState(os.environ.get("SHARED_STATE_PATH", "data/shared.db"))
+            elif backend == "memory":
+                _state = MemorySharedState()
+            else:
+                raise ValueError(f"Unknown SHARED_STATE backend: {backend}")
+        return _state
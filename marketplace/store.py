@@ -0,0 +1,320 @@
+"""
+TechCrossIT Marketplace — Job History Store
+Persists every JobResult so clients can list and re-read past jobs.
+
+The default backend is a local SQLite database in WAL mode. Row metadata and output bodies
+live in separate tables, so listing queries never touch (or load) large outputs.
+Outputs are stored gzip-compressed and content-addressed by SHA-256: byte-identical
+deliverables are kept once, and are only decompressed when actually read.
+Pagination is keyset-based (created_at, job_id) and a retention policy bounds disk use.
+
+Config:
+  JOB_STORE=sqlite | none           (default sqlite)
+  JOB_STORE_PATH=data/jobs.db
+  JOB_RETENTION_DAYS=30             (0 = keep forever)
+  JOB_RETENTION_MAX_ROWS=100000     (0 = unlimited)
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from marketplace.models import JobIntake, JobPage, JobResult, JobSummary
+
+logger = logging.getLogger(__name__)
+
+# Run the retention sweep once every this many saves.
+PRUNE_EVERY = 500
+
+# Outputs smaller than this are stored as-is; gzip framing would outweigh the saving.
+COMPRESS_MIN_BYTES = 256
+
+
+class ResultStore:
+    """Interface every history backend implements. The base class stores nothing."""
+
+    def save(self, result: JobResult, intake: Optional[JobIntake] = None) -> None:
+        """Record a finished job. A job id that is already stored is never overwritten."""
+        pass
+
+    def get(self, job_id: str) -> Optional[JobResult]:
+        return None
+
+    def exists(self, job_id: str) -> bool:
+        return False
+
+    def client_name(self, job_id: str) -> Optional[str]:
+        """The client a stored job belongs to; None if it has none or isn't stored."""
+        return None
+
+    def get_output_blob(self, job_id: str) -> Optional[Tuple[str, bytes]]:
+        """Stored output as (codec, bytes) without decompressing — codec is "gzip" or "identity"."""
+        return None
+
+    def list(self, filters: Dict[str, Any], limit: int = 50, cursor: Optional[str] = None) -> JobPage:
+        return JobPage(items=[], next_cursor=None)
+
+    def prune(self) -> int:
+        return 0
+
+
+# ── CURSORS ─────────────────────────────────────────────────────────────────
+
+def encode_cursor(created_at: float, job_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at!r}|{job_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, job_id = raw.split("|", 1)
+        return float(created_at), job_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+# ── BLOBS ───────────────────────────────────────────────────────────────────
+
+def encode_blob(text: str) -> Tuple[str, str, int, bytes]:
+    """Return (sha256, codec, raw_size, data). The hash is over the uncompressed bytes."""
+    raw = text.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return digest, "identity", len(raw), raw
+    # mtime=0 keeps the compressed bytes deterministic, so they can be served as-is.
+    return digest, "gzip", len(raw), gzip.compress(raw, compresslevel=6, mtime=0)
+
+
+def decode_blob(codec: str, data: bytes) -> str:
+    return (gzip.decompress(data) if codec == "gzip" else bytes(data)).decode("utf-8")
+
+
+# ── SQLITE BACKEND ──────────────────────────────────────────────────────────
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id       TEXT PRIMARY KEY,
+    created_at   REAL NOT NULL,
+    client_name  TEXT,
+    company_id   TEXT NOT NULL,
+    job_type     TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    duration_ms  INTEGER,
+    tokens_used  INTEGER,
+    output_size  INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    metadata     TEXT NOT NULL DEFAULT '{}',
+    output_hash  TEXT
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256       TEXT PRIMARY KEY,
+    codec        TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    data         BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_client  ON jobs(client_name, created_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_company ON jobs(company_id, created_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_type    ON jobs(job_type, created_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status  ON jobs(status, created_at, job_id);
+"""
+
+# Created after _migrate() so databases from before output_hash existed get the column first.
+_OUTPUT_HASH_INDEX = "CREATE INDEX IF NOT EXISTS idx_jobs_output ON jobs(output_hash)"
+
+_SUMMARY_COLUMNS = ("job_id, created_at, client_name, company_id, job_type, status, "
+                    "duration_ms, tokens_used, output_size, error")
+
+FILTER_COLUMNS = ("client_name", "company_id", "job_type", "status")
+
+
+class SQLiteResultStore(ResultStore):
+    """SQLite (WAL) backend. One connection per thread; safe to call from executor threads."""
+
+    def __init__(self, path: str, retention_days: float = 30, max_rows: int = 100_000):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._saves = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        self._migrate(conn)
+        conn.execute(_OUTPUT_HASH_INDEX)
+        self.prune()
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Move outputs from the original uncompressed job_outputs table into blobs."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "output_hash" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN output_hash TEXT")
+        legacy = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_outputs'").fetchone()
+        if not legacy:
+            return
+        with conn:
+            conn.execute("BEGIN")
+            for job_id, output in conn.execute("SELECT job_id, output FROM job_outputs").fetchall():
+                digest = self._put_blob(conn, output)
+                conn.execute("UPDATE jobs SET output_hash = ? WHERE job_id = ?", (digest, job_id))
+            conn.execute("DROP TABLE job_outputs")
+        logger.info("Job store migrated outputs to compressed blobs")
+
+    @staticmethod
+    def _put_blob(conn: sqlite3.Connection, text: str) -> str:
+        digest, codec, size, data = encode_blob(text)
+        conn.execute("INSERT OR IGNORE INTO blobs (sha256, codec, size, data) VALUES (?, ?, ?, ?)",
+                     (digest, codec, size, data))
+        return digest
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, result: JobResult, intake: Optional[JobIntake] = None) -> None:
+        client_name = intake.client_name if intake else result.metadata.get("client")
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                digest = self._put_blob(conn, result.output) if result.output is not None else None
+                conn.execute(
+                    "INSERT INTO jobs (job_id, created_at, client_name, company_id, job_type, status, "
+                    "duration_ms, tokens_used, output_size, error, metadata, output_hash) "
+                    "VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (result.job_id, time.time(), client_name, result.company_id, result.job_type,
+                     getattr(result.status, "value", result.status), result.duration_ms, result.tokens_used,
+                     len(result.output or ""), result.error, json.dumps(result.metadata, default=str), digest),
+                )
+        except sqlite3.IntegrityError:
+            # Client-chosen ids (X-Job-Id) can repeat; the first job to finish keeps its row.
+            logger.warning("Job %s is already stored; not overwriting it", result.job_id)
+            return
+
+        with self._lock:
+            self._saves += 1
+            due = self._saves % PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def exists(self, job_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def client_name(self, job_id: str) -> Optional[str]:
+        row = self._conn().execute("SELECT client_name FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, job_id: str) -> Optional[JobResult]:
+        row = self._conn().execute(
+            "SELECT j.job_id, j.company_id, j.job_type, j.status, b.codec, b.data, j.metadata, j.error, "
+            "j.duration_ms, j.tokens_used FROM jobs j LEFT JOIN blobs b ON b.sha256 = j.output_hash "
+            "WHERE j.job_id = ?", (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return JobResult(
+            job_id=row[0], company_id=row[1], job_type=row[2], status=row[3],
+            output=decode_blob(row[4], row[5]) if row[5] is not None else None,
+            metadata=json.loads(row[6]), error=row[7], duration_ms=row[8], tokens_used=row[9],
+        )
+
+    def get_output_blob(self, job_id: str) -> Optional[Tuple[str, bytes]]:
+        row = self._conn().execute(
+            "SELECT b.codec, b.data FROM jobs j JOIN blobs b ON b.sha256 = j.output_hash WHERE j.job_id = ?",
+            (job_id,),
+        ).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def list(self, filters: Dict[str, Any], limit: int = 50, cursor: Optional[str] = None) -> JobPage:
+        """Newest first. Only summary columns are read; outputs stay on disk."""
+        where, params = [], []
+        for column in FILTER_COLUMNS:
+            if filters.get(column) is not None:
+                where.append(f"{column} = ?")
+                params.append(filters[column])
+        if filters.get("since") is not None:
+            where.append("created_at >= ?")
+            params.append(filters["since"])
+        if filters.get("until") is not None:
+            where.append("created_at < ?")
+            params.append(filters["until"])
+        if cursor:
+            created_at, job_id = decode_cursor(cursor)
+            where.append("(created_at, job_id) < (?, ?)")
+            params.extend([created_at, job_id])
+
+        sql = f"SELECT {_SUMMARY_COLUMNS} FROM jobs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, job_id DESC LIMIT ?"
+        rows = self._conn().execute(sql, (*params, limit + 1)).fetchall()
+
+        items = [JobSummary(
+            job_id=r[0], created_at=r[1], client_name=r[2], company_id=r[3], job_type=r[4], status=r[5],
+            duration_ms=r[6], tokens_used=r[7], output_size=r[8], error=r[9],
+        ) for r in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return JobPage(items=items, next_cursor=next_cursor)
+
+    def prune(self) -> int:
+        """Apply the retention policy. Returns the number of jobs removed."""
+        conn = self._conn()
+        removed = 0
+        with conn:
+            conn.execute("BEGIN")
+            if self.retention_days:
+                cutoff = time.time() - self.retention_days * 86400
+                removed += conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,)).rowcount
+            if self.max_rows:
+                removed += conn.execute(
+                    "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs "
+                    "ORDER BY created_at DESC, job_id DESC LIMIT -1 OFFSET ?)", (self.max_rows,),
+                ).rowcount
+            if removed:
+                # Blobs are shared between jobs; drop only those no remaining job points at.
+                conn.execute("DELETE FROM blobs WHERE sha256 NOT IN "
+                             "(SELECT output_hash FROM jobs WHERE output_hash IS NOT NULL)")
+        if removed:
+            logger.info("Job store retention removed %d jobs", removed)
+        return removed
+
+
+# ── FACTORY ─────────────────────────────────────────────────────────────────
+
+_store: Optional[ResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ResultStore:
+    """Process-wide store, built from the environment on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.environ.get("JOB_STORE", "sqlite").lower()
+            if backend == "sqlite":
+                _store = SQLiteResultStore(
+                    os.environ.get("JOB_STORE_PATH", "data/jobs.db"),
+                    retention_days=float(os.environ.get("JOB_RETENTION_DAYS", "30")),
+                    max_rows=int(os.environ.get("JOB_RETENTION_MAX_ROWS", "100000")),
+                )
+            elif backend == "none":
+                _store = ResultStore()
+            else:
+                raise ValueError(f"Unknown JOB_STORE backend: {backend}")
+        return _store
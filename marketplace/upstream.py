@@ -0,0 +1,263 @@
+"""
+TechCrossIT Marketplace — Upstream Pool
+Spreads model calls over several API key / base-URL pairs ("members"), each with its own
+concurrency limit, request-rate budget and health state.
+
+Selection: the least-loaded eligible member (in_flight ÷ max_concurrent, then lowest
+latency). A member is eligible when it is healthy, under its concurrency limit, has rate
+budget left and is not cooling down after a 429.
+
+Health: UPSTREAM_EJECT_AFTER consecutive failures (5xx, 529, connection errors, timeouts)
+— or a single 401 / 403, since a revoked or wrong key won't start working on a retry —
+eject a member for UPSTREAM_EJECT_SECONDS, doubling on each repeat up to
+UPSTREAM_MAX_EJECT_SECONDS. When that expires, the member is on probation: it gets a single
+live request as a probe. If the probe succeeds the member is re-admitted; if it fails the
+member is ejected again. A 429 only pauses a member for its Retry-After and is not counted
+as a failure.
+
+Concurrency limits are shared by all workers (leases in shared state, as before). Health and
+rate budgets are tracked per worker, and `rpm` is split evenly across workers.
+
+Config:
+  UPSTREAM_POOL='[{"name": "a", "api_key_env": "ANTHROPIC_API_KEY_A", "base_url": "https://...",
+                   "max_concurrent": 8, "rpm": 50}, ...]'
+      (unset: one member from ANTHROPIC_API_KEY / ANTHROPIC_BASE_URL, MAX_CONCURRENT_CALLS slots)
+  UPSTREAM_EJECT_AFTER=3
+  UPSTREAM_EJECT_SECONDS=30
+  UPSTREAM_MAX_EJECT_SECONDS=300
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+import anthropic
+from anthropic import Anthropic
+
+from marketplace.context import JobContext
+from marketplace.shared import get_shared_state, worker_count
+
+# Default member's limit on simultaneous upstream calls (all companies, all jobs).
+MAX_CONCURRENT_CALLS = int(os.environ.get("MAX_CONCURRENT_CALLS", "8"))
+UPSTREAM_EJECT_AFTER = int(os.environ.get("UPSTREAM_EJECT_AFTER", "3"))
+UPSTREAM_EJECT_SECONDS = float(os.environ.get("UPSTREAM_EJECT_SECONDS", "30"))
+UPSTREAM_MAX_EJECT_SECONDS = float(os.environ.get("UPSTREAM_MAX_EJECT_SECONDS", "300"))
+
+# A crashed worker's slots are reclaimed after this long.
+CALL_LEASE_SECONDS = 600
+# Pause after a 429 that carries no Retry-After.
+DEFAULT_RETRY_AFTER = 5.0
+
+HEALTHY, EJECTED, PROBING = "healthy", "ejected", "probing"
+
+# Failure kinds worth retrying on another member.
+RETRYABLE = {"rate_limited", "overloaded", "server_error", "connection_error", "auth_error"}
+# ...of which these eject the member on the first occurrence.
+EJECT_AT_ONCE = {"auth_error"}
+
+
+def classify(exc: BaseException) -> str:
+    if isinstance(exc, anthropic.RateLimitError):
+        return "rate_limited"
+    if isinstance(exc, anthropic.APIStatusError):
+        if exc.status_code == 529:
+            return "overloaded"
+        if exc.status_code in (401, 403):
+            return "auth_error"             # the member's key, not the request
+        return "server_error" if exc.status_code >= 500 else "client_error"
+    if isinstance(exc, anthropic.APIConnectionError):       # includes timeouts
+        return "connection_error"
+    return "other"
+
+
+class Member:
+    def __init__(self, name: str, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_concurrent: int = MAX_CONCURRENT_CALLS, rpm: Optional[float] = None):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrent = max_concurrent
+        self.rpm = rpm / worker_count() if rpm else None
+        self.in_flight = 0
+        self.state = HEALTHY
+        self.failures = 0                 # consecutive
+        self.ejections = 0                # consecutive, for backoff
+        self.available_at = 0.0           # monotonic; ejected / rate-limited until
+        self.latency_ms: Optional[float] = None
+        self.stats: Counter = Counter()
+        self._budget = self.rpm or 0.0
+        self._refilled = time.monotonic()
+        self._client: Optional[Anthropic] = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> Anthropic:
+        """One client per member, reused so connections stay warm. Retries are done by the pool."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = Anthropic(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._client
+
+    def _refill(self, now: float) -> None:
+        if self.rpm:
+            self._budget = min(self.rpm, self._budget + (now - self._refilled) * self.rpm / 60)
+            self._refilled = now
+
+    def eligible(self, now: float) -> bool:
+        if now < self.available_at or self.in_flight >= self.max_concurrent:
+            return False
+        if self.state == PROBING:
+            return False                  # one probe at a time
+        self._refill(now)
+        return not self.rpm or self._budget >= 1
+
+    def load(self) -> float:
+        return self.in_flight / self.max_concurrent
+
+    def describe(self) -> Dict[str, Any]:
+        key = self.api_key or os.environ.get("ANTHROPIC_API_KEY") or ""
+        return {
+            "name":           self.name,
+            "base_url":       self.base_url or os.environ.get("ANTHROPIC_BASE_URL") or "default",
+            "api_key":        f"…{key[-4:]}" if key else None,
+            "state":          self.state,
+            "in_flight":      self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "rpm":            self.rpm,
+            "available_in_s": round(max(0.0, self.available_at - time.monotonic()), 1),
+            "latency_ms":     round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            **self.stats,
+        }
+
+
+class UpstreamPool:
+    def __init__(self, members: Iterable[Member]):
+        self.members: List[Member] = list(members)
+        if not self.members:
+            raise ValueError("Upstream pool needs at least one member.")
+        self._lock = threading.Lock()
+
+    def capacity(self) -> float:
+        """Call slots across members that aren't ejected."""
+        with self._lock:
+            return float(sum(m.max_concurrent for m in self.members if m.state != EJECTED) or 1)
+
+    def _reserve(self, exclude: Iterable[str]) -> Optional[Member]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [m for m in self.members if m.eligible(now)]
+            preferred = [m for m in candidates if m.name not in exclude] or candidates
+            if not preferred:
+                return None
+            member = min(preferred, key=lambda m: (m.load(), m.latency_ms or 0.0))
+            member.in_flight += 1
+            if member.rpm:
+                member._budget -= 1
+            if member.state == EJECTED:
+                member.state = PROBING
+                member.stats["probes"] += 1
+            return member
+
+    def _unreserve(self, member: Member) -> None:
+        with self._lock:
+            member.in_flight -= 1
+            if member.rpm:
+                member._budget += 1
+            if member.state == PROBING:
+                member.state = EJECTED    # the probe never ran; stay out until the next one
+
+    @contextmanager
+    def lease(self, ctx: Optional[JobContext] = None, exclude: Iterable[str] = ()):
+        """Hold a call slot on the best available member, waiting (and honouring cancels) if none is free."""
+        state = get_shared_state()
+        holder = f"{os.getpid()}:{uuid.uuid4().hex[:12]}"
+        while True:
+            member = self._reserve(exclude)
+            if member is not None:
+                if not state.cross_process or state.acquire(f"upstream_calls:{member.name}", holder,
+                                                             member.max_concurrent, CALL_LEASE_SECONDS):
+                    break
+                self._unreserve(member)   # slot taken by another worker
+            if ctx:
+                ctx.check()
+            time.sleep(0.05)
+        try:
+            yield member
+        finally:
+            with self._lock:
+                member.in_flight -= 1
+                if member.state == PROBING:
+                    member.state = EJECTED    # probe ended without a verdict (e.g. job cancelled)
+            if state.cross_process:
+                state.release(f"upstream_calls:{member.name}", holder)
+
+    def record_success(self, member: Member, seconds: float) -> None:
+        with self._lock:
+            member.stats["requests"] += 1
+            member.stats["ok"] += 1
+            member.failures = 0
+            if member.state == PROBING:
+                member.state, member.ejections = HEALTHY, 0
+            ms = seconds * 1000
+            member.latency_ms = ms if member.latency_ms is None else member.latency_ms + 0.2 * (ms - member.latency_ms)
+
+    def record_failure(self, member: Member, exc: BaseException) -> str:
+        """Count a failed call against the member; eject it if it keeps failing. Returns the failure kind."""
+        kind = classify(exc)
+        now = time.monotonic()
+        with self._lock:
+            member.stats["requests"] += 1
+            member.stats[kind] += 1
+            if kind == "rate_limited":
+                retry_after = getattr(getattr(exc, "response", None), "headers", {}).get("retry-after")
+                try:
+                    pause = float(retry_after)
+                except (TypeError, ValueError):
+                    pause = DEFAULT_RETRY_AFTER
+                member.available_at = max(member.available_at, now + pause)
+                if member.state == PROBING:
+                    member.state = EJECTED
+            elif kind in RETRYABLE:
+                member.failures += 1
+                if member.state == PROBING or member.failures >= UPSTREAM_EJECT_AFTER or kind in EJECT_AT_ONCE:
+                    member.ejections += 1
+                    member.state = EJECTED
+                    member.failures = 0
+                    member.available_at = now + min(UPSTREAM_MAX_EJECT_SECONDS,
+                                                    UPSTREAM_EJECT_SECONDS * 2 ** (member.ejections - 1))
+                    member.stats["ejections"] += 1
+            elif member.state == PROBING:
+                member.state, member.ejections = HEALTHY, 0      # it answered; the request was the problem
+        return kind
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [m.describe() for m in self.members]
+
+
+# ── CONFIG ──────────────────────────────────────────────────────────────────
+
+def pool_from_env() -> UpstreamPool:
+    raw = os.environ.get("UPSTREAM_POOL")
+    if not raw:
+        return UpstreamPool([Member("default")])
+    members = []
+    for i, entry in enumerate(json.loads(raw)):
+        api_key = entry.get("api_key") or (os.environ.get(entry["api_key_env"]) if entry.get("api_key_env") else None)
+        members.append(Member(
+            name=entry.get("name") or f"upstream-{i}",
+            api_key=api_key,
+            base_url=entry.get("base_url"),
+            max_concurrent=int(entry.get("max_concurrent", MAX_CONCURRENT_CALLS)),
+            rpm=entry.get("rpm"),
+        ))
+    return UpstreamPool(members)
+
+
+pool = pool_from_env()
@@ -0,0 +1,367 @@
+"""
+TechCrossIT Marketplace — Webhook Callbacks
+Delivers finished jobs to JobIntake.callback_url, so integrations don't have to poll.
+
+Job workers only append to an in-memory queue. A dedicated delivery thread, with its own
+event loop and HTTP client, POSTs the results. Deliveries for the same URL that are ready
+together go out as one request, and each URL has at most one request in flight, so a slow
+receiver only delays its own callbacks. Failed requests (network error, timeout, 408, 429,
+5xx) are retried with exponential backoff and jitter, honouring Retry-After. After
+WEBHOOK_MAX_ATTEMPTS, or on any other 4xx, the deliveries are appended to the dead-letter
+JSONL file with the last error.
+
+Request body:
+  {"deliveries": [{"id": "...", "event": "job.done", "created_at": 1767225600.0, "attempt": 1,
+                   "job": {...JobResult...}}]}
+Headers:
+  X-AgentHire-Signature: t=<unix seconds>,v1=<hex HMAC-SHA256 of "<t>.<body>" with WEBHOOK_SECRET>
+  X-AgentHire-Delivery:  comma-separated delivery ids
+Receivers should check the signature (see verify_signature) and de-duplicate on delivery
+id: a delivery whose response was lost is sent again.
+
+Unless WEBHOOK_ALLOW_PRIVATE is on, the receiver's hostname is resolved once per request,
+every address must be public, and the request is sent to the checked address (with the
+original Host header and TLS server name), so a DNS answer that changes between the check
+and the connection can't redirect the signed POST to an internal address.
+
+Config:
+  WEBHOOK_SECRET=                          # required: submits with a callback_url are refused without it
+  WEBHOOK_TIMEOUT_SECONDS=10
+  WEBHOOK_MAX_ATTEMPTS=6
+  WEBHOOK_BACKOFF_SECONDS=2                # doubles per attempt, up to WEBHOOK_MAX_BACKOFF_SECONDS
+  WEBHOOK_MAX_BACKOFF_SECONDS=300
+  WEBHOOK_BATCH_SIZE=50
+  WEBHOOK_BATCH_SECONDS=0.2                # wait this long for more deliveries to the same URL
+  WEBHOOK_CONCURRENCY=16                   # receivers called at once
+  WEBHOOK_MAX_PENDING=10000
+  WEBHOOK_DEAD_LETTER_PATH=data/webhook_dead_letter.jsonl
+  WEBHOOK_ALLOW_PRIVATE=off                # on = allow loopback / private addresses (local testing)
+"""
+
+import asyncio
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+
+from marketplace import metrics
+from marketplace.models import JobResult
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_TIMEOUT_SECONDS = float(os.environ.get("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "6"))
+WEBHOOK_BACKOFF_SECONDS = float(os.environ.get("WEBHOOK_BACKOFF_SECONDS", "2"))
+WEBHOOK_MAX_BACKOFF_SECONDS = float(os.environ.get("WEBHOOK_MAX_BACKOFF_SECONDS", "300"))
+WEBHOOK_BATCH_SIZE = int(os.environ.get("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_BATCH_SECONDS = float(os.environ.get("WEBHOOK_BATCH_SECONDS", "0.2"))
+WEBHOOK_CONCURRENCY = int(os.environ.get("WEBHOOK_CONCURRENCY", "16"))
+WEBHOOK_MAX_PENDING = int(os.environ.get("WEBHOOK_MAX_PENDING", "10000"))
+WEBHOOK_DEAD_LETTER_PATH = os.environ.get("WEBHOOK_DEAD_LETTER_PATH", "data/webhook_dead_letter.jsonl")
+WEBHOOK_ALLOW_PRIVATE = os.environ.get("WEBHOOK_ALLOW_PRIVATE", "off").lower() == "on"
+
+SIGNATURE_HEADER = "X-AgentHire-Signature"
+DELIVERY_HEADER = "X-AgentHire-Delivery"
+USER_AGENT = "AgentHire-Webhooks/1.0"
+# Signatures older than this are rejected by verify_signature.
+SIGNATURE_TOLERANCE_SECONDS = 300
+
+RETRYABLE_STATUS = {408, 425, 429}
+
+
+def sign(body: bytes, secret: str = WEBHOOK_SECRET, timestamp: Optional[int] = None) -> str:
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(body: bytes, header: str, secret: str = WEBHOOK_SECRET,
+                     tolerance: float = SIGNATURE_TOLERANCE_SECONDS) -> bool:
+    """For receivers: True if `header` is a current signature of `body` under `secret`."""
+    try:
+        fields = dict(part.split("=", 1) for part in header.split(","))
+        timestamp = int(fields["t"])
+    except (ValueError, KeyError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(body, secret, timestamp), f"t={timestamp},v1={fields.get('v1', '')}")
+
+
+@dataclass
+class Delivery:
+    url:        str
+    job:        Dict[str, Any]
+    id:         str   = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = field(default_factory=time.time)
+    attempts:   int   = 0
+    last_error: Optional[str] = None
+
+    def envelope(self) -> Dict[str, Any]:
+        return {"id": self.id, "event": f"job.{self.job.get('status')}", "created_at": self.created_at,
+                "attempt": self.attempts, "job": self.job}
+
+
+class _Rejected(Exception):
+    """The receiver refused the deliveries permanently (or its address isn't allowed)."""
+
+
+class WebhookDispatcher:
+    def __init__(self, dead_letter_path: str = WEBHOOK_DEAD_LETTER_PATH):
+        self.dead_letter_path = dead_letter_path
+        self._incoming: Deque[Delivery] = deque()
+        self._pending = 0                                       # queued, waiting or in flight
+        self._lock = threading.Lock()
+        self._dead_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Owned by the delivery loop:
+        self._waiting: Dict[str, List[Delivery]] = defaultdict(list)
+        self._retries: List[Tuple[float, int, Delivery]] = []   # (due, seq, delivery) heap
+        self._busy: Set[str] = set()
+        self._sending: Dict[asyncio.Task, List[Delivery]] = {}
+        self._seq = 0
+
+    # ── job workers ──
+
+    def enqueue(self, url: str, result: JobResult) -> None:
+        """Queue a finished job for delivery. O(1), never blocks on the network."""
+        delivery = Delivery(url, result.model_dump(mode="json"))
+        if not WEBHOOK_SECRET:
+            # Submits are refused without a secret (see api.dispatch); never send unsigned.
+            delivery.last_error = "WEBHOOK_SECRET is not set"
+            self._dead_letter([delivery])
+            return
+        with self._lock:
+            full = self._pending >= WEBHOOK_MAX_PENDING
+            if not full:
+                self._pending += 1
+                self._incoming.append(delivery)
+        if full:
+            metrics.incr("webhooks_overflow")
+            delivery.last_error = "delivery queue full"
+            self._dead_letter([delivery])
+            return
+        metrics.incr("webhooks_queued")
+        self._ensure_thread()
+        self._loop.call_soon_threadsafe(self._wake.set)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Deliver what's ready within `timeout`; dead-letter anything still undelivered."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(timeout), self._loop)
+        try:
+            future.result(timeout + 5)
+        except Exception:
+            logger.exception("Webhook shutdown failed")
+
+    # ── delivery loop ──
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._ready.clear()
+                    self._thread = threading.Thread(target=self._main, name="webhooks", daemon=True)
+                    self._thread.start()
+        self._ready.wait()
+
+    def _main(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._wake = asyncio.Event()
+        self._ready.set()
+        self._loop.run_until_complete(self._run())
+
+    async def _run(self) -> None:
+        slots = asyncio.Semaphore(WEBHOOK_CONCURRENCY)
+        limits = httpx.Limits(max_connections=WEBHOOK_CONCURRENCY, max_keepalive_connections=WEBHOOK_CONCURRENCY)
+        async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT_SECONDS, limits=limits,
+                                     headers={"User-Agent": USER_AGENT}, follow_redirects=False) as client:
+            self._client = client
+            while True:
+                timeout = max(0.0, self._retries[0][0] - time.monotonic()) if self._retries else None
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                    # Give deliveries finishing at about the same time a chance to share a request.
+                    await asyncio.sleep(WEBHOOK_BATCH_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                self._collect()
+                for url in [u for u in self._waiting if u not in self._busy]:
+                    batch = self._waiting[url][:WEBHOOK_BATCH_SIZE]
+                    del self._waiting[url][:WEBHOOK_BATCH_SIZE]
+                    if not self._waiting[url]:
+                        del self._waiting[url]
+                    self._busy.add(url)
+                    task = asyncio.create_task(self._send(slots, url, batch))
+                    self._sending[task] = batch
+                    task.add_done_callback(self._sending.pop)
+
+    def _collect(self) -> None:
+        with self._lock:
+            incoming, self._incoming = self._incoming, deque()
+        for delivery in incoming:
+            self._waiting[delivery.url].append(delivery)
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now:
+            delivery = heapq.heappop(self._retries)[2]
+            self._waiting[delivery.url].append(delivery)
+
+    async def _send(self, slots: asyncio.Semaphore, url: str, batch: List[Delivery]) -> None:
+        retry_after = None
+        try:
+            async with slots:
+                for delivery in batch:
+                    delivery.attempts += 1
+                target, headers, extensions = await self._resolve(url)
+                body = json.dumps({"deliveries": [d.envelope() for d in batch]}, default=str).encode()
+                headers.update({"Content-Type": "application/json", DELIVERY_HEADER: ",".join(d.id for d in batch),
+                                SIGNATURE_HEADER: sign(body)})
+                metrics.incr("webhooks_requests")
+                response = await self._client.post(target, content=body, headers=headers, extensions=extensions)
+            if response.is_success:
+                metrics.incr("webhooks_delivered", len(batch))
+                self._done(len(batch))
+                return
+            error = f"HTTP {response.status_code}"
+            if response.status_code < 500 and response.status_code not in RETRYABLE_STATUS:
+                raise _Rejected(error)
+            retry_after = _retry_after(response.headers.get("Retry-After"))
+        except _Rejected as e:
+            self._fail(batch, str(e), retryable=False)
+            return
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        except Exception as e:
+            logger.exception("Webhook delivery to %s failed unexpectedly", url)
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            self._busy.discard(url)
+            if self._waiting.get(url):
+                self._wake.set()
+        self._fail(batch, error, retryable=True, retry_after=retry_after)
+
+    async def _resolve(self, url: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """
+        (url to connect to, headers, request extensions). Resolves the host once, refuses it
+        if any address isn't public, and pins the request to the first checked address.
+        """
+        if WEBHOOK_ALLOW_PRIVATE:
+            return url, {}, {}
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpx.ConnectError(f"cannot resolve {host}: {e}")
+        addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+        for address in addresses:
+            if not address.is_global:
+                raise _Rejected(f"{host} resolves to a non-public address ({address})")
+        if not addresses:
+            raise httpx.ConnectError(f"cannot resolve {host}")
+
+        pinned = addresses[0]
+        netloc = f"[{pinned}]" if pinned.version == 6 else str(pinned)
+        if parts.port:
+            netloc += f":{parts.port}"
+        if "@" in parts.netloc:
+            netloc = parts.netloc.rsplit("@", 1)[0] + "@" + netloc
+        host_header = f"[{host}]" if ":" in host else host
+        headers = {"Host": f"{host_header}:{parts.port}" if parts.port else host_header}
+        extensions = {}
+        if parts.scheme == "https":
+            extensions["sni_hostname"] = host
+            # Pooled connections are keyed by address, not name: don't let another receiver on
+            # the same address reuse this one's TLS session.
+            headers["Connection"] = "close"
+        return urlunsplit((parts.scheme, netloc, parts.path, parts.query, "")), headers, extensions
+
+    def _fail(self, batch: List[Delivery], error: str, retryable: bool, retry_after: Optional[float] = None) -> None:
+        dead = []
+        jitter = random.uniform(0.8, 1.2)      # one draw per batch, so its retries stay together
+        for delivery in batch:
+            delivery.last_error = error
+            if not retryable or delivery.attempts >= WEBHOOK_MAX_ATTEMPTS:
+                dead.append(delivery)
+                continue
+            delay = min(WEBHOOK_MAX_BACKOFF_SECONDS, WEBHOOK_BACKOFF_SECONDS * 2 ** (delivery.attempts - 1))
+            delay = max(delay * jitter, retry_after or 0)
+            self._seq += 1
+            heapq.heappush(self._retries, (time.monotonic() + delay, self._seq, delivery))
+            self._wake.set()            # recompute the loop's sleep for the new due time
+            metrics.incr("webhooks_retries")
+        if dead:
+            self._dead_letter(dead)
+            self._done(len(dead))
+        logger.warning("Webhook delivery of %d job(s) to %s failed: %s", len(batch), batch[0].url, error)
+
+    def _done(self, count: int) -> None:
+        with self._lock:
+            self._pending -= count
+
+    def _dead_letter(self, deliveries: List[Delivery]) -> None:
+        metrics.incr("webhooks_dead_lettered", len(deliveries))
+        lines = "".join(json.dumps({
+            "id": d.id, "url": d.url, "failed_at": time.time(), "attempts": d.attempts,
+            "error": d.last_error, "job": d.job,
+        }, default=str) + "\n" for d in deliveries)
+        try:
+            with self._dead_lock:
+                if os.path.dirname(self.dead_letter_path):
+                    os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError:
+            logger.exception("Could not write %d webhook(s) to the dead-letter log", len(deliveries))
+
+    async def _shutdown(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        self._wake.set()
+        while (self._incoming or self._waiting or self._busy) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        # Requests still in flight at the deadline are abandoned, and their batches dead-lettered.
+        in_flight = [d for batch in self._sending.values() for d in batch]
+        for delivery in in_flight:
+            delivery.last_error = "request still in flight"
+        for task in list(self._sending):
+            task.cancel()
+        await asyncio.gather(*self._sending, return_exceptions=True)
+        self._collect()
+        remaining = in_flight + [d for batch in self._waiting.values() for d in batch] + [r[2] for r in self._retries]
+        self._waiting.clear()
+        self._retries.clear()
+        for delivery in remaining:
+            delivery.last_error = f"undelivered at shutdown ({delivery.last_error or 'not attempted'})"
+        if remaining:
+            self._dead_letter(remaining)
+            self._done(len(remaining))
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return min(float(value), WEBHOOK_MAX_BACKOFF_SECONDS) if value else None
+    except ValueError:
+        return None
+
+
+webhooks = WebhookDispatcher()
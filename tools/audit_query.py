@@ -0,0 +1,226 @@
+"""
+TechCrossIT Marketplace — Audit Log Query
+Summarises the job audit log (marketplace/audit.py) for capacity and cost analysis: jobs,
+outcomes, model calls, input / output / cached tokens and stage-time percentiles, grouped
+by any record field (or by day / hour), or prints the matching records as JSONL.
+
+Scans stay cheap on months of data:
+  - compressed segments are skipped by the time range in their names, open files by mtime
+  - --where filters are matched as raw text before a line is parsed as JSON
+  - files are scanned in parallel (--workers), and decompressed as a stream
+
+Usage:
+  python -m tools.audit_query data/audit/ --since 7d --by company_id,job_type
+  python -m tools.audit_query data/audit/ --since 2026-10-19T08:00 --until 2026-10-19T12:00 --by hour
+  python -m tools.audit_query data/audit/ --where status=failed --where company_id=dev_shop --records
+"""
+
+import argparse
+import datetime
+import glob
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from marketplace.audit import segment_span
+from tools.loadtest import percentile
+
+TOKEN_FIELDS = ("model_calls", "input_tokens", "output_tokens", "cached_tokens", "tokens_used")
+STAGE_FIELDS = ("total", "model", "queue")
+TIME_KEYS = {"day": "%Y-%m-%d", "hour": "%Y-%m-%dT%H:00"}
+
+Where = List[Tuple[str, str]]
+
+
+@dataclass
+class Totals:
+    jobs:     int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+    tokens:   Dict[str, int] = field(default_factory=lambda: dict.fromkeys(TOKEN_FIELDS, 0))
+    stages:   Dict[str, List[int]] = field(default_factory=lambda: {s: [] for s in STAGE_FIELDS})
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.jobs += 1
+        self.statuses[record.get("status")] = self.statuses.get(record.get("status"), 0) + 1
+        for name in TOKEN_FIELDS:
+            self.tokens[name] += record.get(name) or 0
+        stages = record.get("stages_ms") or {}
+        for name in STAGE_FIELDS:
+            if stages.get(name) is not None:
+                self.stages[name].append(stages[name])
+
+    def merge(self, other: "Totals") -> None:
+        self.jobs += other.jobs
+        for status, n in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + n
+        for name in TOKEN_FIELDS:
+            self.tokens[name] += other.tokens[name]
+        for name in STAGE_FIELDS:
+            self.stages[name].extend(other.stages[name])
+
+
+# ── SCAN ────────────────────────────────────────────────────────────────────
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    """Unix seconds, an age like 90m / 24h / 7d, or an ISO-8601 time (naive = UTC)."""
+    if not value:
+        return None
+    age = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", value)
+    if age:
+        return time.time() - float(age[1]) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[age[2]]
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+
+
+def select_files(paths: List[str], since: Optional[float] = None, until: Optional[float] = None) -> List[str]:
+    """Audit files that can hold records in [since, until)."""
+    selected = []
+    for path in paths:
+        candidates = (sorted(glob.glob(os.path.join(path, "*.jsonl")) + glob.glob(os.path.join(path, "*.jsonl.gz")))
+                      if os.path.isdir(path) else [path])
+        for candidate in candidates:
+            span = segment_span(candidate)
+            if span is None:            # a worker's open file: written up to its mtime
+                if since is not None and os.path.getmtime(candidate) < since:
+                    continue
+            elif (since is not None and span[1] < since) or (until is not None and span[0] >= until):
+                continue
+            selected.append(candidate)
+    return selected
+
+
+def _matches(record: Dict[str, Any], where: Where) -> bool:
+    return all(str(record.get(name)) == value for name, value in where)
+
+
+def scan(path: str, since: Optional[float] = None, until: Optional[float] = None,
+         where: Where = ()) -> Iterator[Dict[str, Any]]:
+    """Records in one file within [since, until) that match every `where` (field, value)."""
+    # Every value appears in a matching line as written by json.dumps, so lines without it are skipped unparsed.
+    needles = [json.dumps(value)[1:-1].encode() for _, value in where]
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for line in f:
+            if not all(needle in line for needle in needles):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue                 # a line cut short by a crash
+            ts = record.get("ts", 0)
+            if (since is None or ts >= since) and (until is None or ts < until) and _matches(record, where):
+                yield record
+
+
+def _group(record: Dict[str, Any], by: List[str]) -> Tuple[str, ...]:
+    return tuple(time.strftime(TIME_KEYS[key], time.gmtime(record.get("ts", 0))) if key in TIME_KEYS
+                 else str(record.get(key)) for key in by)
+
+
+def summarise_file(path: str, since: Optional[float], until: Optional[float], where: Where,
+                   by: List[str]) -> Dict[Tuple[str, ...], Totals]:
+    groups: Dict[Tuple[str, ...], Totals] = {}
+    for record in scan(path, since, until, where):
+        groups.setdefault(_group(record, by), Totals()).add(record)
+    return groups
+
+
+def summarise(files: List[str], since: Optional[float], until: Optional[float], where: Where,
+              by: List[str], workers: int = 1) -> Dict[Tuple[str, ...], Totals]:
+    """Totals per group over every file, scanning up to `workers` files at once."""
+    jobs = [(path, since, until, where, by) for path in files]
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+            partials = list(executor.map(summarise_file, *zip(*jobs)))
+    else:
+        partials = [summarise_file(*job) for job in jobs]
+    merged: Dict[Tuple[str, ...], Totals] = {}
+    for partial in partials:
+        for key, totals in partial.items():
+            merged.setdefault(key, Totals()).merge(totals)
+    return merged
+
+
+# ── REPORT ──────────────────────────────────────────────────────────────────
+
+def report(groups: Dict[Tuple[str, ...], Totals], by: List[str]) -> List[Dict[str, Any]]:
+    rows = []
+    for key, totals in sorted(groups.items(), key=lambda item: -item[1].tokens["tokens_used"]):
+        row: Dict[str, Any] = dict(zip(by, key))
+        row.update(jobs=totals.jobs, statuses=dict(sorted(totals.statuses.items(), key=str)), **totals.tokens)
+        row["tokens_per_job"] = round(totals.tokens["tokens_used"] / totals.jobs) if totals.jobs else 0
+        for name in STAGE_FIELDS:
+            row[f"{name}_ms"] = {f"p{p}": percentile(totals.stages[name], p) for p in (50, 95, 99)}
+        rows.append(row)
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]], by: List[str]) -> None:
+    header = [*by, "jobs", "failed", "cancel", "calls", "input", "output", "cached", "tok/job",
+              "total p50", "total p95", "model p95", "queue p95"]
+    table = [[*(str(row[k]) for k in by), str(row["jobs"]),
+              str(row["statuses"].get("failed", 0)), str(row["statuses"].get("cancelled", 0)),
+              *(str(row[k]) for k in TOKEN_FIELDS[:-1]), str(row["tokens_per_job"]),
+              *(_ms(row[f"{s}_ms"][p]) for s, p in (("total", "p50"), ("total", "p95"), ("model", "p95"), ("queue", "p95")))]
+             for row in rows]
+    widths = [max(len(cell) for cell in column) for column in zip(header, *table)]
+    for line in [header, *table]:
+        print("  ".join(cell.ljust(w) if i < len(by) else cell.rjust(w) for i, (cell, w) in enumerate(zip(line, widths))))
+
+
+def _ms(value: Optional[int]) -> str:
+    return "-" if value is None else f"{value / 1000:.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise or search the job audit log.")
+    parser.add_argument("paths", nargs="+", help="Audit files or directories")
+    parser.add_argument("--since", help="Start of the window (unix seconds, ISO time in UTC, or an age: 24h, 7d)")
+    parser.add_argument("--until", help="End of the window (exclusive)")
+    parser.add_argument("--where", action="append", default=[], metavar="FIELD=VALUE",
+                        help="Only records whose field equals the value; repeat to combine")
+    parser.add_argument("--by", default="", help="Group by these fields (comma-separated), or day / hour")
+    parser.add_argument("--records", action="store_true", help="Print matching records as JSONL instead")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Files scanned in parallel")
+    parser.add_argument("--json-out", help="Write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    since, until = _timestamp(args.since), _timestamp(args.until)
+    where = [tuple(w.split("=", 1)) for w in args.where]
+    if any(len(w) != 2 for w in where):
+        sys.exit("--where takes FIELD=VALUE")
+    by = [k.strip() for k in args.by.split(",") if k.strip()]
+
+    files = select_files(args.paths, since, until)
+    if not files:
+        sys.exit("No audit files in the selected paths / window.")
+
+    if args.records:
+        for path in files:
+            for record in scan(path, since, until, where):
+                print(json.dumps(record, separators=(",", ":")))
+        return
+
+    rows = report(summarise(files, since, until, where, by, args.workers), by)
+    if not rows:
+        sys.exit("No audit records match.")
+    print(f"{sum(r['jobs'] for r in rows)} jobs from {len(files)} files\n")
+    print_report(rows, by)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+TechCrossIT Marketplace — Fake Model Server
+Local stand-in for the Anthropic Messages endpoint, for load tests that spend no tokens.
+
+Every behaviour is configurable per job type (agents send it in the X-AgentHire-Job-Type header):
+time to first token, streaming chunk cadence, output length, and injected 429 / 529 / timeout rates.
+
+Usage:
+  python -m tools.fake_model_server --port 9000 [--config profiles.json] [--time-scale 0.1]
+  export ANTHROPIC_BASE_URL=http://localhost:9000 ANTHROPIC_API_KEY=fake
+  python main.py
+
+profiles.json (every key optional; job-type entries are merged over "default"):
+  {
+    "seed": 42,
+    "time_scale": 1.0,
+    "default":   {"ttft_ms": {"median": 800, "p95": 2500}, "tokens_per_second": 60},
+    "job_types": {"triage_ticket": {"output_tokens": {"min": 80, "max": 200},
+                                    "error_rates": {"429": 0.05}}}
+  }
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+JOB_TYPE_HEADER = "x-agenthire-job-type"
+
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "ttft_ms":           {"median": 800, "p95": 2500},   # log-normal time to first token
+    "tokens_per_second": 60,                              # generation speed after the first token
+    "chunk_tokens":      4,                               # tokens per streamed text delta
+    "output_tokens":     {"min": 300, "max": 1500},       # uniform, capped by the request's max_tokens
+    "error_rates":       {"429": 0.0, "529": 0.0, "timeout": 0.0},
+    "timeout_s":         120,                             # how long an injected timeout hangs
+}
+
+_WORDS = ("the agent drafts a clear concise deliverable for each client brief with structured "
+          "sections tables code examples and next steps ensuring accuracy tone and format").split()
+
+
+# ── PROFILES ────────────────────────────────────────────────────────────────
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(base)
+    for key, value in override.items():
+        merged[key] = _merge(base[key], value) if isinstance(value, dict) and isinstance(base.get(key), dict) else value
+    return merged
+
+
+class Profiles:
+    """Per-job-type behaviour with a seeded RNG so scenarios are reproducible."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.time_scale = float(config.get("time_scale", 1.0))
+        self.default = _merge(DEFAULT_PROFILE, config.get("default", {}))
+        self.job_types = {k: _merge(self.default, v) for k, v in config.get("job_types", {}).items()}
+        self._rng = random.Random(config.get("seed"))
+        self._lock = threading.Lock()
+
+    def for_job(self, job_type: Optional[str]) -> Dict[str, Any]:
+        return self.job_types.get(job_type or "", self.default)
+
+    def sample(self, profile: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+        with self._lock:
+            roll = self._rng.random()
+            outcome, cumulative = "ok", 0.0
+            for kind in ("429", "529", "timeout"):
+                cumulative += profile["error_rates"].get(kind, 0.0)
+                if roll < cumulative:
+                    outcome = kind
+                    break
+
+            ttft = profile["ttft_ms"]
+            mu = math.log(max(ttft["median"], 1))
+            sigma = max(math.log(max(ttft["p95"], ttft["median"], 1)) - mu, 0.0) / 1.645
+            bounds = profile["output_tokens"]
+            return {
+                "outcome":       outcome,
+                "ttft_s":        self._rng.lognormvariate(mu, sigma) / 1000 * self.time_scale,
+                "output_tokens": min(self._rng.randint(bounds["min"], bounds["max"]), max_tokens),
+                "seed":          self._rng.getrandbits(32),
+            }
+
+
+# ── SERVER ──────────────────────────────────────────────────────────────────
+
+def _error(status: int, kind: str, message: str) -> JSONResponse:
+    headers = {"retry-after": "1"} if status == 429 else {}
+    return JSONResponse(status_code=status, headers=headers,
+                        content={"type": "error", "error": {"type": kind, "message": message}})
+
+
+def _chunks(seed: int, total_tokens: int, chunk_tokens: int):
+    """Yield (text, tokens) deltas; one word ≈ one token."""
+    rng = random.Random(seed)
+    sent = 0
+    while sent < total_tokens:
+        n = min(chunk_tokens, total_tokens - sent)
+        yield " ".join(rng.choice(_WORDS) for _ in range(n)) + " ", n
+        sent += n
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_app(profiles: Profiles) -> FastAPI:
+    app = FastAPI(title="Fake Anthropic Messages API", docs_url=None, redoc_url=None)
+    stats: Dict[str, Counter] = defaultdict(Counter)
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        job_type = request.headers.get(JOB_TYPE_HEADER)
+        profile = profiles.for_job(job_type)
+        plan = profiles.sample(profile, int(body.get("max_tokens", 4096)))
+        stats[job_type or "unknown"][plan["outcome"]] += 1
+
+        if plan["outcome"] == "429":
+            return _error(429, "rate_limit_error", "Injected rate limit.")
+        if plan["outcome"] == "529":
+            return _error(529, "overloaded_error", "Injected overload.")
+        if plan["outcome"] == "timeout":
+            await asyncio.sleep(profile["timeout_s"] * profiles.time_scale)
+            return _error(504, "timeout_error", "Injected timeout.")
+
+        prompt_chars = len(str(body.get("system", ""))) + len(json.dumps(body.get("messages", [])))
+        usage = {"input_tokens": max(1, prompt_chars // 4), "output_tokens": plan["output_tokens"]}
+        message_id = f"msg_fake_{uuid.uuid4().hex[:16]}"
+        chunk_delay = profile["chunk_tokens"] / profile["tokens_per_second"] * profiles.time_scale
+
+        if not body.get("stream"):
+            await asyncio.sleep(plan["ttft_s"] + plan["output_tokens"] / profile["tokens_per_second"] * profiles.time_scale)
+            text = "".join(t for t, _ in _chunks(plan["seed"], plan["output_tokens"], profile["chunk_tokens"]))
+            return {
+                "id": message_id, "type": "message", "role": "assistant", "model": body.get("model"),
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn", "stop_sequence": None, "usage": usage,
+            }
+
+        async def events():
+            yield _sse("message_start", {"type": "message_start", "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": body.get("model"),
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 0}}})
+            sent = 0
+            try:
+                await asyncio.sleep(plan["ttft_s"])
+                yield _sse("content_block_start", {"type": "content_block_start", "index": 0,
+                                                   "content_block": {"type": "text", "text": ""}})
+                for text, n in _chunks(plan["seed"], plan["output_tokens"], profile["chunk_tokens"]):
+                    yield _sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                       "delta": {"type": "text_delta", "text": text}})
+                    sent += n
+                    await asyncio.sleep(chunk_delay)
+            except (asyncio.CancelledError, GeneratorExit):
+                # The caller closed the stream (e.g. a cancelled job): count what it didn't take.
+                stats[job_type or "unknown"]["aborted"] += 1
+                stats[job_type or "unknown"]["tokens_not_generated"] += plan["output_tokens"] - sent
+                raise
+            yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield _sse("message_delta", {"type": "message_delta",
+                                         "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                         "usage": {"output_tokens": usage["output_tokens"]}})
+            yield _sse("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        """Outcome counts per job type since start-up (plus streams aborted by the caller)."""
+        return {job_type: dict(counts) for job_type, counts in stats.items()}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Anthropic Messages API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--config", help="JSON file with default and per-job-type profiles")
+    parser.add_argument("--time-scale", type=float, help="Multiply every delay (0.1 = 10x faster)")
+    parser.add_argument("--seed", type=int, help="RNG seed for reproducible scenarios")
+    args = parser.parse_args()
+
+    config: Dict[str, Any] = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    if args.time_scale is not None:
+        config["time_scale"] = args.time_scale
+    if args.seed is not None:
+        config["seed"] = args.seed
+
+    import uvicorn
+    uvicorn.run(create_app(Profiles(config)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
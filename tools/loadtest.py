@@ -0,0 +1,182 @@
+"""
+TechCrossIT Marketplace — Load Test Harness
+Drives job endpoints at a target request rate and reports throughput, latency percentiles
+and error rates. Pair with tools/fake_model_server.py for reproducible, token-free runs.
+
+Usage:
+  python -m tools.loadtest --rps 20 --duration 60
+  python -m tools.loadtest --rps 5 --duration 30 --mix support_desk:triage_ticket=3,dev_shop:fix_bug=1
+  python -m tools.loadtest --path /marketplace/pipelines --body pipeline.json --json-out report.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from marketplace.registry import COMPANY_CARDS
+
+
+@dataclass
+class Sample:
+    status:   str                # HTTP status code or exception class name
+    latency:  float              # seconds, request start → body fully read
+    ttfb:     Optional[float]    # seconds, request start → first body byte
+
+
+@dataclass
+class Scenario:
+    base_url:  str
+    path:      str
+    rps:       float
+    duration:  float
+    timeout:   float
+    poisson:   bool
+    mix:       List[Tuple[str, str, float]]
+    brief_chars: Tuple[int, int]
+    body:      Optional[Dict[str, Any]] = None
+    seed:      Optional[int] = None
+    samples:   List[Sample] = field(default_factory=list)
+
+
+# ── PAYLOADS ────────────────────────────────────────────────────────────────
+
+def parse_mix(spec: Optional[str]) -> List[Tuple[str, str, float]]:
+    """'company:job_type=weight,...' → [(company, job_type, weight)]. Default: every job, equal weight."""
+    if not spec:
+        return [(cid, job["key"], 1.0) for cid, card in COMPANY_CARDS.items() for job in card.jobs]
+    mix = []
+    for item in spec.split(","):
+        target, _, weight = item.partition("=")
+        company_id, _, job_type = target.strip().partition(":")
+        mix.append((company_id, job_type, float(weight or 1)))
+    return mix
+
+
+def make_intake(rng: random.Random, scenario: Scenario) -> Dict[str, Any]:
+    company_id, job_type, _ = rng.choices(scenario.mix, weights=[w for *_, w in scenario.mix])[0]
+    size = rng.randint(*scenario.brief_chars)
+    words = "load test brief for the marketplace describing the client task in detail".split()
+    brief = " ".join(rng.choice(words) for _ in range(size // 6 + 1))[:size]
+    return {"company_id": company_id, "job_type": job_type, "brief": brief, "client_name": "loadtest"}
+
+
+# ── DRIVER ──────────────────────────────────────────────────────────────────
+
+async def send_one(client: httpx.AsyncClient, scenario: Scenario, payload: Dict[str, Any]) -> None:
+    start = time.perf_counter()
+    ttfb = None
+    try:
+        async with client.stream("POST", scenario.path, json=payload) as response:
+            async for _ in response.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+            status = str(response.status_code)
+    except Exception as e:  # timeouts, connection resets — counted, never fatal
+        status = type(e).__name__
+    scenario.samples.append(Sample(status, time.perf_counter() - start, ttfb))
+
+
+async def run(scenario: Scenario) -> float:
+    """Open-loop arrivals: requests are sent on schedule regardless of how many are in flight."""
+    rng = random.Random(scenario.seed)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=scenario.base_url, timeout=scenario.timeout, limits=limits) as client:
+        tasks, start, next_at = [], time.perf_counter(), 0.0
+        while next_at < scenario.duration:
+            delay = start + next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            payload = scenario.body if scenario.body is not None else make_intake(rng, scenario)
+            tasks.append(asyncio.create_task(send_one(client, scenario, payload)))
+            next_at += rng.expovariate(scenario.rps) if scenario.poisson else 1 / scenario.rps
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+
+# ── REPORT ──────────────────────────────────────────────────────────────────
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def summarise(scenario: Scenario, wall: float) -> Dict[str, Any]:
+    ok = [s for s in scenario.samples if s.status.startswith("2")]
+    latencies = [s.latency for s in ok]
+    ttfbs = [s.ttfb for s in ok if s.ttfb is not None]
+    total = len(scenario.samples)
+    statuses = Counter(s.status for s in scenario.samples)
+
+    def pcts(values: List[float]) -> Dict[str, Optional[float]]:
+        return {f"p{p}": percentile(values, p) for p in (50, 90, 95, 99)} | {"max": max(values, default=None)}
+
+    return {
+        "target_rps":      scenario.rps,
+        "offered":         total,
+        "succeeded":       len(ok),
+        "wall_s":          round(wall, 3),
+        "throughput_rps":  round(len(ok) / wall, 3) if wall else 0.0,
+        "error_rate":      round(1 - len(ok) / total, 4) if total else 0.0,
+        "statuses":        dict(statuses),
+        "latency_s":       pcts(latencies),
+        "ttfb_s":          pcts(ttfbs),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nOffered {report['offered']} requests at {report['target_rps']} rps "
+          f"over {report['wall_s']}s — {report['succeeded']} succeeded")
+    print(f"THROUGHPUT: {report['throughput_rps']} rps    ERROR RATE: {report['error_rate']:.2%}")
+    print(f"STATUSES:   {report['statuses']}")
+    for name in ("latency_s", "ttfb_s"):
+        row = "  ".join(f"{k}={v:.3f}" if v is not None else f"{k}=-" for k, v in report[name].items())
+        print(f"{name.upper():<11} {row}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test for the marketplace API.")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--path", default="/marketplace/submit")
+    parser.add_argument("--rps", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Per-request timeout (s)")
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times")
+    parser.add_argument("--mix", help="company:job_type=weight,... (default: all jobs equally)")
+    parser.add_argument("--brief-chars", default="200-2000", help="Brief size range, e.g. 200-2000")
+    parser.add_argument("--body", help="JSON file sent verbatim instead of generated intakes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json-out", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    low, _, high = args.brief_chars.partition("-")
+    body = None
+    if args.body:
+        with open(args.body) as f:
+            body = json.load(f)
+
+    scenario = Scenario(
+        base_url=args.base_url, path=args.path, rps=args.rps, duration=args.duration,
+        timeout=args.timeout, poisson=args.poisson, mix=parse_mix(args.mix),
+        brief_chars=(int(low), int(high or low)), body=body, seed=args.seed,
+    )
+    wall = asyncio.run(run(scenario))
+    report = summarise(scenario, wall)
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["succeeded"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+TechCrossIT Marketplace — Request Hot-Path Microbenchmarks
+Measures everything on the /marketplace/submit path except the model call itself:
+JobIntake validation, registry lookups, prompt formatting, JobResult construction,
+response serialization, and the full in-process framework round-trip.
+
+Usage:
+  python -m tools.microbench                          # run and print
+  python -m tools.microbench --save --note "..."      # run and store as the baseline
+  python -m tools.microbench --compare                # run and flag regressions vs the baseline
+  python -m tools.microbench --compare --threshold 0.15 --filter intake
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+# The framework round-trip keeps the rate limiter on the measured path, with a limit the
+# benchmark can't reach. Limits are read when marketplace.ratelimit is imported, so this
+# has to be set before any marketplace import.
+os.environ["RATE_LIMITS"] = "* /marketplace=1000000000/1"
+# Everything the round-trip writes (ledger, job store, audit log, ...) goes to a scratch
+# directory instead of the real data/.
+_SCRATCH = tempfile.mkdtemp(prefix="microbench-")
+atexit.register(shutil.rmtree, _SCRATCH, ignore_errors=True)
+for _name, _path in {
+    "LEDGER_PATH":              "ledger.db",
+    "JOB_STORE_PATH":           "jobs.db",
+    "SHARED_STATE_PATH":        "shared.db",
+    "AUDIT_LOG_DIR":            "audit",
+    "WORKLOAD_CAPTURE_DIR":     "capture",
+    "SUPPORT_KB_PATH":          "support_kb.db",
+    "TRIAGE_EXAMPLES_PATH":     "triage_examples.db",
+    "WEBHOOK_DEAD_LETTER_PATH": "webhook_dead_letter.jsonl",
+}.items():
+    os.environ[_name] = os.path.join(_SCRATCH, _path)
+
+from marketplace.models import JobIntake, JobResult, JobStatus
+from marketplace.registry import get_card, get_job_types
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "microbench_baseline.json")
+
+# Realistic context sizes: none, a paragraph, a couple of files, a large codebase paste.
+SIZES = {"200B": 200, "5KB": 5_000, "100KB": 100_000, "1MB": 1_000_000}
+
+
+def _text(n: int) -> str:
+    line = "def handler(request):  # validate payload, call service, return response\n"
+    return (line * (n // len(line) + 1))[:n]
+
+
+def _payload(context_size: int) -> Dict:
+    return {
+        "company_id": "dev_shop",
+        "job_type": "code_review",
+        "brief": "Review the checkout service for security and performance issues.",
+        "context": _text(context_size),
+        "client_name": "Acme Corp",
+        "tone": "technical",
+        "output_format": "markdown",
+    }
+
+
+def _result(output_size: int) -> JobResult:
+    return JobResult(
+        job_id="a1b2c3d4e5f6", company_id="dev_shop", job_type="code_review", status=JobStatus.DONE,
+        output=_text(output_size), metadata={"client": "Acme Corp", "tone": "technical", "model": "claude-sonnet-4-6"},
+        duration_ms=61234, tokens_used=5120,
+    )
+
+
+# ── CASES ───────────────────────────────────────────────────────────────────
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from companies.dev_shop.agent import JOB_PROMPTS
+
+    cases: Dict[str, Callable[[], object]] = {
+        "registry.get_card":      lambda: get_card("finance_office"),
+        "registry.get_job_types": lambda: get_job_types("finance_office"),
+    }
+    for label, size in SIZES.items():
+        payload = _payload(size)
+        raw = json.dumps(payload).encode()
+        intake = JobIntake.model_validate(payload)
+        result = _result(size)
+        cases[f"intake.validate_python[{label}]"] = lambda p=payload: JobIntake.model_validate(p)
+        cases[f"intake.validate_json[{label}]"]   = lambda r=raw: JobIntake.model_validate_json(r)
+        cases[f"prompt.format[{label}]"] = lambda i=intake: JOB_PROMPTS["code_review"].format(
+            brief=i.brief, context=i.context or "No additional context provided.")
+        cases[f"result.construct[{label}]"] = lambda s=result.output: JobResult(
+            job_id="a1b2c3d4e5f6", company_id="dev_shop", job_type="code_review", status=JobStatus.DONE,
+            output=s, metadata={"client": "Acme Corp", "tone": "technical"}, duration_ms=61234, tokens_used=5120)
+        cases[f"result.model_dump_json[{label}]"] = lambda r=result: r.model_dump_json()
+        cases[f"result.jsonable_response[{label}]"] = lambda r=result: JSONResponse(jsonable_encoder(r)).body
+
+    cases.update(_framework_cases())
+    return cases
+
+
+def _framework_cases() -> Dict[str, Callable[[], object]]:
+    """Full ASGI round-trip of POST /marketplace/submit with the agent stubbed out."""
+    import httpx
+    import api.dispatch as dispatch
+    from marketplace.context import new_job_id
+    from main import app
+
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    cases = {}
+    for label in ("200B", "100KB"):
+        size = SIZES[label]
+        result = _result(size)
+        # Like a real agent, each run returns its job's own id; the store keeps ids unique.
+        stub = lambda intake, r=result: r.model_copy(update={"job_id": new_job_id()})
+
+        def call(body=_payload(size), stub=stub):
+            original = dispatch.RUNNERS["dev_shop"]
+            dispatch.RUNNERS["dev_shop"] = stub
+            try:
+                response = loop.run_until_complete(client.post("/marketplace/submit", json=body))
+            finally:
+                dispatch.RUNNERS["dev_shop"] = original
+            assert response.status_code == 200, response.text
+            return response
+        cases[f"framework.submit_roundtrip[{label}]"] = call
+    return cases
+
+
+# ── RUNNER ──────────────────────────────────────────────────────────────────
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float) -> Tuple[float, float]:
+    """Return (median, best) seconds per call across `repeat` runs of an auto-ranged loop."""
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    runs = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return statistics.median(runs), min(runs)
+
+
+def run(filter_: str, repeat: int, min_time: float) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, fn in build_cases().items():
+        if filter_ and filter_ not in name:
+            continue
+        median, best = measure(fn, repeat, min_time)
+        results[name] = {"median_us": round(median * 1e6, 3), "best_us": round(best * 1e6, 3)}
+        print(f"{name:<45} median {median * 1e6:>12.2f} µs   best {best * 1e6:>12.2f} µs")
+    return results
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Names whose median is slower than the baseline by more than `threshold` (0.2 = 20%)."""
+    regressions = []
+    print(f"\n{'case':<45} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, now in current.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"{name:<45} {'-':>12} {now['median_us']:>12.2f}       new")
+            continue
+        change = now["median_us"] / before["median_us"] - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<45} {before['median_us']:>12.2f} {now['median_us']:>12.2f} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the request hot path.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON path")
+    parser.add_argument("--save", action="store_true", help="Store results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed slowdown (0.20 = 20%%)")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing run")
+    parser.add_argument("--note", default="", help="Why the baseline changed (stored with --save)")
+    args = parser.parse_args()
+
+    results = run(args.filter, args.repeat, args.min_time)
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {regressions}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "note": args.note,
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
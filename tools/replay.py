@@ -0,0 +1,144 @@
+"""
+TechCrossIT Marketplace — Workload Replay
+Re-issues a captured workload (WORKLOAD_CAPTURE=on, see marketplace/capture.py) with its
+original arrival pattern, company / job-type mix and brief sizes, compressed in time by
+--speed. Briefs are synthesised to the recorded lengths (identical hashes → identical text),
+so point it at a local instance backed by tools/fake_model_server.py.
+
+Usage:
+  python -m tools.replay data/capture/ --speed 10
+  python -m tools.replay data/capture/ --since 2026-10-12T08:00 --until 2026-10-12T12:00 --speed 4 \\
+      --json-out monday-peak.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+from tools.loadtest import Scenario, print_report, send_one, summarise
+
+_WORDS = "replayed brief for the marketplace describing the client task in detail".split()
+
+
+# ── TRACE ───────────────────────────────────────────────────────────────────
+
+def _files(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(path, "workload-*.jsonl*")))
+        else:
+            yield path
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    """Unix seconds or an ISO-8601 time (naive = UTC)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+
+
+def load_trace(paths: List[str], since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Every captured arrival in [since, until), merged across workers and rotated files, by time."""
+    events = []
+    for path in _files(paths):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue                 # a line cut short by a crash
+                if (since is None or event["ts"] >= since) and (until is None or event["ts"] < until):
+                    events.append(event)
+    events.sort(key=lambda e: e["ts"])
+    return events
+
+
+def _text(digest: Optional[str], chars: int) -> Optional[str]:
+    if not chars:
+        return None
+    rng = random.Random(digest or chars)
+    return " ".join(rng.choice(_WORDS) for _ in range(chars // 6 + 1))[:chars]
+
+
+def make_intake(event: Dict[str, Any]) -> Dict[str, Any]:
+    intake = {
+        "company_id":  event["company_id"],
+        "job_type":    event["job_type"],
+        "brief":       _text(event.get("brief_hash"), event.get("brief_chars", 0)) or "replay",
+        "context":     _text(event.get("context_hash"), event.get("context_chars", 0)),
+        "client_name": f"replay-{event['client_hash']}" if event.get("client_hash") else "replay",
+    }
+    for field in ("tone", "output_format", "priority", "deadline_seconds"):
+        if event.get(field) is not None:
+            intake[field] = event[field]
+    return intake
+
+
+# ── DRIVER ──────────────────────────────────────────────────────────────────
+
+async def replay(events: List[Dict[str, Any]], scenario: Scenario, speed: float) -> float:
+    """Send each event at its recorded offset ÷ speed (open loop, like tools.loadtest)."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=scenario.base_url, timeout=scenario.timeout, limits=limits) as client:
+        tasks, start, first = [], time.perf_counter(), events[0]["ts"]
+        for event in events:
+            delay = start + (event["ts"] - first) / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send_one(client, scenario, make_intake(event))))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured marketplace workload.")
+    parser.add_argument("paths", nargs="+", help="Capture files or directories")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--path", default="/marketplace/submit")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression: 10 = ten times faster")
+    parser.add_argument("--since", help="Start of the window (unix seconds or ISO time, UTC)")
+    parser.add_argument("--until", help="End of the window (exclusive)")
+    parser.add_argument("--limit", type=int, help="Replay at most this many arrivals")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Per-request timeout (s)")
+    parser.add_argument("--json-out", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    events = load_trace(args.paths, _timestamp(args.since), _timestamp(args.until))[:args.limit]
+    if not events:
+        sys.exit("No captured arrivals in the selected files / window.")
+
+    span = max(events[-1]["ts"] - events[0]["ts"], 1e-3) / args.speed
+    print(f"Replaying {len(events)} arrivals over {span:.1f}s ({args.speed}x) — "
+          f"mix: {dict(Counter(e['company_id'] for e in events).most_common())}")
+
+    scenario = Scenario(
+        base_url=args.base_url, path=args.path, rps=round(len(events) / span, 3), duration=span,
+        timeout=args.timeout, poisson=False, mix=[], brief_chars=(0, 0),
+    )
+    wall = asyncio.run(replay(events, scenario, args.speed))
+    report = summarise(scenario, wall) | {"speed": args.speed, "trace_start": events[0]["ts"]}
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["succeeded"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+TechCrossIT Marketplace — Triage Classifier Training
+Fits the Support Desk's local triage model (companies/support_desk/triage.py) on the
+tickets the model has already triaged, and reports what it would take off the model.
+
+The newest examples are split into train / holdout. The holdout report gives per-field
+accuracy, plus coverage (share of tickets confident enough to answer locally) and accuracy
+on the covered tickets at each confidence threshold, so TRIAGE_MIN_CONFIDENCE can be set
+for a target accuracy. The saved model is then refit on every example. Running workers
+pick it up within a minute.
+
+Usage:
+  python -m tools.train_triage                               # train, report, save
+  python -m tools.train_triage --target-accuracy 0.97 --json-out triage-report.json
+  python -m tools.train_triage --dry-run                     # report only
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from companies.support_desk.triage import (
+    FIELDS, HASH_BITS, TRIAGE_EXAMPLES_PATH, TRIAGE_MODEL_PATH, ExampleStore, TriageModel,
+)
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.98]
+
+
+def evaluate(model: TriageModel, texts: Sequence[str], labels: Sequence[Dict[str, Optional[str]]],
+             thresholds: Sequence[float] = THRESHOLDS) -> Dict:
+    """Per-field accuracy, and coverage / accuracy of confident predictions per threshold."""
+    predictions = [model.predict(t) for t in texts]
+    fields = {}
+    for field in FIELDS:
+        pairs = [(p[0][field], l[field]) for p, l in zip(predictions, labels) if l.get(field)]
+        fields[field] = round(sum(a == b for a, b in pairs) / len(pairs), 4) if pairs else None
+
+    # A ticket counts as correct only if every labelled field is right.
+    correct = np.array([all(p[0][f] == l[f] for f in FIELDS if l.get(f)) for p, l in zip(predictions, labels)])
+    confidence = np.array([min(p[1].values()) for p in predictions])
+    curve = []
+    for t in thresholds:
+        covered = confidence >= t
+        curve.append({
+            "threshold": t,
+            "coverage":  round(float(covered.mean()), 4) if len(covered) else 0.0,
+            "accuracy":  round(float(correct[covered].mean()), 4) if covered.any() else None,
+        })
+    return {"examples": len(texts), "field_accuracy": fields,
+            "ticket_accuracy": round(float(correct.mean()), 4) if len(correct) else None, "thresholds": curve}
+
+
+def recommend(curve: List[Dict], target: float) -> Optional[Dict]:
+    """Lowest threshold (most coverage) whose covered accuracy meets the target."""
+    return next((row for row in curve if row["accuracy"] is not None and row["accuracy"] >= target), None)
+
+
+def print_report(report: Dict) -> None:
+    holdout = report["holdout"]
+    print(f"Examples: {report['examples']} (train {report['train']}, holdout {holdout['examples']})")
+    print("Holdout accuracy per field: " + ", ".join(f"{f} {a:.1%}" if a is not None else f"{f} n/a"
+                                                      for f, a in holdout["field_accuracy"].items()))
+    print(f"\n  {'threshold':>9}  {'coverage':>8}  {'accuracy':>8}")
+    for row in holdout["thresholds"]:
+        accuracy = f"{row['accuracy']:.1%}" if row["accuracy"] is not None else "—"
+        print(f"  {row['threshold']:>9.2f}  {row['coverage']:>8.1%}  {accuracy:>8}")
+    best = report.get("recommended")
+    if best:
+        print(f"\nTRIAGE_MIN_CONFIDENCE={best['threshold']} answers {best['coverage']:.0%} of tickets locally "
+              f"at {best['accuracy']:.1%} accuracy (target {report['target_accuracy']:.0%}).")
+    else:
+        print(f"\nNo threshold reaches {report['target_accuracy']:.0%} accuracy — collect more examples.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the Support Desk triage classifier.")
+    parser.add_argument("--examples", default=TRIAGE_EXAMPLES_PATH, help="Training example database")
+    parser.add_argument("--out", default=TRIAGE_MODEL_PATH, help="Model file to write")
+    parser.add_argument("--limit", type=int, help="Use only the newest N examples")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of examples held out for the report")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--bits", type=int, default=HASH_BITS, help="Hash buckets = 2**bits")
+    parser.add_argument("--target-accuracy", type=float, default=0.95)
+    parser.add_argument("--min-examples", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Report only; don't write the model")
+    parser.add_argument("--json-out", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    texts, labels = ExampleStore(args.examples).load(args.limit)
+    if len(texts) < args.min_examples:
+        sys.exit(f"Only {len(texts)} examples in {args.examples}; need at least {args.min_examples}.")
+
+    order = np.random.default_rng(0).permutation(len(texts))
+    cut = int(len(texts) * (1 - args.holdout))
+    train, test = order[:cut], order[cut:]
+
+    started = time.perf_counter()
+    model = TriageModel(args.bits)
+    model.fit([texts[i] for i in train], [labels[i] for i in train], epochs=args.epochs)
+    holdout = evaluate(model, [texts[i] for i in test], [labels[i] for i in test])
+    report = {
+        "examples": len(texts), "train": len(train), "holdout": holdout,
+        "target_accuracy": args.target_accuracy, "recommended": recommend(holdout["thresholds"], args.target_accuracy),
+        "trained_at": time.time(), "bits": args.bits,
+    }
+
+    if not args.dry_run:
+        final = TriageModel(args.bits, meta={k: report[k] for k in ("examples", "trained_at", "recommended")}
+                            | {"holdout": holdout})
+        final.fit(texts, labels, epochs=args.epochs)
+        final.save(args.out)
+    report["train_seconds"] = round(time.perf_counter() - started, 1)
+
+    print_report(report)
+    if not args.dry_run:
+        print(f"Model written to {args.out} ({report['train_seconds']}s)")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()